@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-24 10:03:52
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-24 16:58:20
+
+# Columnar (Arrow IPC / Parquet) export of the organizations' inventory.
+#
+# Rows are read straight from a database cursor, in bounded batches, and each
+# batch is converted into an Arrow record batch and written out before the
+# next one is read, so memory usage doesn't grow with the table size.
+#
+# Usage:
+#   python -m aux.columnar_export --format parquet --output-dir ./export
+#       [--database-url sqlite:///./sql_app.db] [--batch-size 10000]
+
+# general imports
+import argparse
+import os
+from sqlalchemy import Boolean, DateTime, Integer
+from sqlalchemy.orm import Session
+
+# custom imports
+from database.crud import crud
+from aux.exceptions import ColumnarExportUnavailable
+
+# pyarrow is optional. Without it, exports are unavailable
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+ARROW = "arrow"
+PARQUET = "parquet"
+
+EXPORT_FORMATS = [ARROW, PARQUET]
+EXPORT_MEDIA_TYPES = {
+    ARROW: "application/vnd.apache.arrow.stream",
+    PARQUET: "application/vnd.apache.parquet",
+}
+EXPORT_FILE_EXTENSIONS = {
+    ARROW: "arrows",
+    PARQUET: "parquet",
+}
+
+
+def check_columnar_export_available():
+    if pyarrow is None:
+        raise ColumnarExportUnavailable()
+
+
+def _arrow_type(column):
+    if isinstance(column.type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(column.type, Integer):
+        return pyarrow.int64()
+    if isinstance(column.type, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+def arrow_schema(table_name: str):
+    return pyarrow.schema([
+        pyarrow.field(column.name, _arrow_type(column))
+        for column in crud.exportable_columns(table_name)
+    ])
+
+
+def iter_record_batches(db: Session, table_name: str,
+                        batch_size: int = crud.EXPORT_BATCH_SIZE):
+    schema = arrow_schema(table_name)
+    for rows in crud.iter_table_rows(db, table_name, batch_size):
+        columns = list(zip(*rows))
+        yield pyarrow.RecordBatch.from_arrays(
+            [
+                pyarrow.array(column, type=field.type)
+                for column, field in zip(columns, schema)
+            ],
+            schema=schema
+        )
+
+
+# File-like object that keeps what the Arrow writers produce, until it is
+# drained and sent to the client
+class _DrainableSink:
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _open_writer(export_format: str, sink, schema):
+    if export_format == PARQUET:
+        return pyarrow.parquet.ParquetWriter(
+            pyarrow.PythonFile(sink, mode="w"),
+            schema,
+            compression="zstd"
+        )
+    return pyarrow.ipc.new_stream(pyarrow.PythonFile(sink, mode="w"), schema)
+
+
+# Yields the encoded export chunk by chunk. Each record batch becomes an
+# Arrow IPC message, or a Parquet row group
+def iter_export(db: Session, table_name: str, export_format: str = ARROW,
+                batch_size: int = crud.EXPORT_BATCH_SIZE):
+    check_columnar_export_available()
+    schema = arrow_schema(table_name)
+    sink = _DrainableSink()
+    writer = _open_writer(export_format, sink, schema)
+    try:
+        for record_batch in iter_record_batches(db, table_name, batch_size):
+            if export_format == PARQUET:
+                writer.write_table(
+                    pyarrow.Table.from_batches([record_batch]),
+                    row_group_size=batch_size
+                )
+            else:
+                writer.write_batch(record_batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_to_directory(db: Session, output_dir: str,
+                        export_format: str = PARQUET,
+                        batch_size: int = crud.EXPORT_BATCH_SIZE):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for table_name in crud.EXPORTABLE_TABLES:
+        path = os.path.join(
+            output_dir,
+            f"{table_name}.{EXPORT_FILE_EXTENSIONS[export_format]}"
+        )
+        with open(path, "wb") as f:
+            for chunk in iter_export(db, table_name, export_format,
+                                     batch_size):
+                f.write(chunk)
+        paths.append(path)
+    return paths
+
+
+def main(args: list = None):
+    parser = argparse.ArgumentParser(
+        description="Exports organizations, characteristics, time periods " +
+        "and authorized users as Arrow IPC streams or Parquet files"
+    )
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=PARQUET)
+    parser.add_argument("--output-dir", default="./export")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--batch-size", type=int,
+                        default=crud.EXPORT_BATCH_SIZE)
+    parsed_args = parser.parse_args(args)
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database.database import SQLALCHEMY_DATABASE_URL
+
+    engine = create_engine(parsed_args.database_url or SQLALCHEMY_DATABASE_URL)
+    db = sessionmaker(bind=engine)()
+    try:
+        for path in export_to_directory(db, parsed_args.output_dir,
+                                        parsed_args.format,
+                                        parsed_args.batch_size):
+            print(f"Exported {path}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-24 11:30:46
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-24 11:41:02
+
+import logging
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class ColumnarExportUnavailable(Exception):
+
+    def __init__(self):
+        self.reason = "Columnar exports require the 'pyarrow' package, " +\
+            "which is not installed."
+        self.message = f"Impossible to export data (reason='{self.reason}')."
+        logger.error(f"Exception: {self.message}")
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-07 10:14:52
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-07 15:38:20
+
+# Logging of the API.
+#
+# The threads that log (e.g. the event loop's) only put the records in a
+# queue. A background thread takes them from it and hands them to the actual
+# handlers, so that writing the log file, and rotating it, never blocks a
+# request.
+#
+# Values that may be large (organizations, lists of them) should be logged
+# as arguments, wrapped in Truncated, and not formatted in f-strings: they
+# are then only formatted if the record is emitted, and only up to a given
+# length.
+
+# general imports
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Maximum length of a value formatted by Truncated
+DEFAULT_MAX_LENGTH = 1000
+
+
+# Starts logging the records of 'logger' through a queue, to the given
+# handlers. Returns the listener writing them, which should be stopped on
+# exit so that the queued records are flushed
+def setup_queue_logging(logger: logging.Logger, handlers: list):
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue,
+        *handlers,
+        respect_handler_level=True
+    )
+    logger.addHandler(QueueHandler(log_queue))
+    listener.start()
+    return listener
+
+
+# Lazily formatted, size capped, representation of a value. Lists, tuples
+# and sets are formatted item by item, up to the maximum length, so that the
+# cost of formatting doesn't grow with their size
+class Truncated:
+
+    def __init__(self, value, max_length: int = DEFAULT_MAX_LENGTH):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self):
+        if isinstance(self.value, (list, tuple, set)):
+            return self._format_items()
+        return self._truncate(str(self.value))
+
+    __repr__ = __str__
+
+    def _truncate(self, text: str):
+        if len(text) <= self.max_length:
+            return text
+        return text[:self.max_length] + \
+            f"... ({len(text) - self.max_length} more characters)"
+
+    def _format_items(self):
+        items = []
+        length = 0
+        for item in self.value:
+            if length >= self.max_length:
+                break
+            text = str(item)
+            items.append(text)
+            length += len(text) + 2
+        if len(items) == len(self.value):
+            return self._truncate("[" + ", ".join(items) + "]")
+        return "[" + self._truncate(", ".join(items)) + \
+            f", ... ({len(self.value)} items)]"
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-23 09:55:12
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-23 16:31:47
+
+# general imports
+import contextvars
+import json
+import msgpack
+
+# CBOR is optional. Without it, only JSON and MessagePack are negotiated
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    cbor2 = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# Legacy names still sent by some MessagePack clients
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+# Media type negotiated for the response of the current request
+response_media_type = contextvars.ContextVar(
+    "response_media_type",
+    default=JSON
+)
+
+
+def supported_media_types():
+    return [JSON, MSGPACK, CBOR] if cbor2 else [JSON, MSGPACK]
+
+
+def parse_media_type(content_type: str):
+    media_type = content_type.split(";")[0].strip().lower()
+    return MEDIA_TYPE_ALIASES.get(media_type, media_type)
+
+
+def is_binary_media_type(content_type: str):
+    return parse_media_type(content_type) in supported_media_types()[1:]
+
+
+def select_media_type(accept: str):
+    # Parse the Accept header, honoring quality values. JSON is kept as the
+    # default for */*, unknown media types and ties
+    best_media_type, best_quality = JSON, 0.0
+    for item in accept.split(","):
+        media_range, _, params = item.strip().partition(";")
+        media_type = parse_media_type(media_range)
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if media_type in supported_media_types() \
+                and quality > best_quality:
+            best_media_type, best_quality = media_type, quality
+    return best_media_type
+
+
+# Same settings as starlette's JSONResponse
+def encode_json(content):
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def encode(content, media_type: str = JSON):
+    if media_type == MSGPACK:
+        return msgpack.packb(content, use_bin_type=True)
+    if media_type == CBOR:
+        return cbor2.dumps(content)
+    return encode_json(content)
+
+
+def decode(body: bytes, media_type: str = JSON):
+    media_type = parse_media_type(media_type)
+    if media_type == MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    if media_type == CBOR:
+        return cbor2.loads(body)
+    return json.loads(body)
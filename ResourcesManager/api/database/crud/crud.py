@@ -6,17 +6,56 @@
 
 # general imports
 import logging
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import and_, event, func, literal, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
 
 # custom imports
 from database.models import models
 from schemas import tmf632_party_mgmt
 from database.crud.exceptions import ImpossibleToCreateDatabaseEntry
 from database.crud.exceptions import EntityDoesNotExist
+from database.crud.exceptions import InvalidQueryParameter
+from database.crud import query_filters as QueryFilters
+from database.crud import full_text_search as FullTextSearch
+from database.crud import organization_documents as OrganizationDocuments
+from events import organization_events as OrganizationEvents
+from events import outbox as Outbox
+from events.change_feed import change_broadcaster
+from tracing.tracer import tracer, trace_module_functions
 
 # Logger
 logger = logging.getLogger(__name__)
 
+# Maximum number of organizations whose children are loaded with one query.
+# Kept below SQLite's default limit of bound parameters per statement
+HYDRATION_BATCH_SIZE = 500
+
+
+# For how long a cached organization count may be served, in seconds, and how
+# many distinct counts (i.e. combinations of filters) are kept
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_MAX_ENTRIES = 1024
+
+# Number of rows fetched from the database cursor at a time, when exporting
+EXPORT_BATCH_SIZE = 10000
+
+# Tables that may be exported, by name
+EXPORTABLE_TABLES = {
+    "organizations": models.Organization,
+    "characteristics": models.Characteristic,
+    "timePeriods": models.TimePeriod,
+    "authorizedUsers": models.OrganizationAuthorizedUsers,
+}
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 #######################################
 #     Time Period CRUD Operations     #
 #######################################
@@ -97,6 +136,17 @@ def delete_party_characteristic_by_organization_id(
 #######################################
 
 
+# Drops the authorized users preloaded on an organization of this session,
+# if any, since they are now outdated
+def _clear_preloaded_authorized_users(db: Session, organization_id: int):
+    db_organization = db.identity_map.get(
+        identity_key(models.Organization, organization_id)
+    )
+    if db_organization is not None:
+        db_organization.__dict__.get("_preloaded", {})\
+            .pop("authorizedUsersParsed", None)
+
+
 def create_authorized_user(db: Session, user_id: str, organization_id: int):
     try:
         db_authorized_user = models.OrganizationAuthorizedUsers(
@@ -104,11 +154,20 @@ def create_authorized_user(db: Session, user_id: str, organization_id: int):
             organization=organization_id,
         )
         db.add(db_authorized_user)
+        _stamp_organization_change(db, organization_id)
+        _record_authorized_user_event(
+            db,
+            OrganizationEvents.AUTHORIZED_USER_CREATE_EVENT,
+            user_id,
+            organization_id
+        )
         db.commit()
         db.refresh(db_authorized_user)
+        _clear_preloaded_authorized_users(db, organization_id)
+        organization_count_cache.clear()
         logger.info(
-            "Authorized User created for Organization " +
-            f"(id={db_authorized_user}): {db_authorized_user.as_dict()}"
+            "Authorized User created for Organization (id=%s): %s",
+            organization_id, db_authorized_user.as_dict()
         )
         db_authorized_user.set_db(db)
         return db_authorized_user
@@ -152,7 +211,16 @@ def delete_authorized_user(db: Session, user_id: str):
 
     for db_authorized_user in db_authorized_users:
         db_authorized_user.deleted = True
+        _clear_preloaded_authorized_users(db, db_authorized_user.organization)
+        _stamp_organization_change(db, db_authorized_user.organization)
+        _record_authorized_user_event(
+            db,
+            OrganizationEvents.AUTHORIZED_USER_DELETE_EVENT,
+            user_id,
+            db_authorized_user.organization
+        )
         db.commit()
+    organization_count_cache.clear()
 
 
 def delete_authorized_user_for_organization(
@@ -169,24 +237,54 @@ def delete_authorized_user_for_organization(
 
     for db_authorized_user in db_authorized_users:
         db_authorized_user.deleted = True
+        _stamp_organization_change(db, organization_id)
+        _record_authorized_user_event(
+            db,
+            OrganizationEvents.AUTHORIZED_USER_DELETE_EVENT,
+            user_id,
+            organization_id
+        )
         db.commit()
 
+    _clear_preloaded_authorized_users(db, organization_id)
+    organization_count_cache.clear()
+
+
+def get_authorized_organizations_for_user(
+    db: Session,
+    user_id: str,
+    filters: dict = {},
+    batch_size: int = HYDRATION_BATCH_SIZE
+):
+    organizations = _organizations_query(
+        db=db,
+        filters=filters,
+        authorized_user_id=user_id
+    ).order_by(models.Organization.id)
 
-def get_authorized_organizations_for_user(db: Session, user_id: str):
     return [
-        get_organization_by_id(
-            db=db,
-            id=db_authorized_user.organization
-        )
-        for db_authorized_user
-        in db
-        .query(models.OrganizationAuthorizedUsers)
-        .filter(
-            models.OrganizationAuthorizedUsers.user_id == user_id
+        organization
+        for batch in iter_hydrated_organizations(db, organizations, batch_size)
+        for organization in batch
+    ]
+
+
+# Ids of the (not deleted) organizations the user is authorized for, without
+# loading the organizations
+def get_authorized_organization_ids(db: Session, user_id: str):
+    return {
+        organization_id
+        for organization_id, in db
+        .query(models.OrganizationAuthorizedUsers.organization)
+        .join(
+            models.Organization,
+            models.Organization.id
+            == models.OrganizationAuthorizedUsers.organization
         )
+        .filter(models.OrganizationAuthorizedUsers.user_id == user_id)
         .filter(models.OrganizationAuthorizedUsers.deleted == bool(False))
-        .all()
-    ]
+        .filter(models.Organization.deleted == bool(False))
+    }
 
 
 #######################################
@@ -194,6 +292,68 @@ def get_authorized_organizations_for_user(db: Session, user_id: str):
 #######################################
 
 
+# Loads the time periods and party characteristics of several organizations
+# with one query per child table, and preloads them on each organization, so
+# that serializing them doesn't trigger one query per organization
+def hydrate_organizations(db: Session, organizations: list):
+    models.Organization.set_db(db)
+    for organizations_chunk in _chunks(organizations, HYDRATION_BATCH_SIZE):
+        organization_ids = [
+            organization.id for organization in organizations_chunk
+        ]
+        time_period_ids = [
+            organization.existsDuring
+            for organization in organizations_chunk
+            if organization.existsDuring
+        ]
+
+        party_characteristics = {
+            organization_id: [] for organization_id in organization_ids
+        }
+        for party_characteristic in db\
+                .query(models.Characteristic)\
+                .filter(models.Characteristic.organization.in_(
+                    organization_ids
+                ))\
+                .filter(models.Characteristic.deleted == bool(False))\
+                .order_by(models.Characteristic.id):
+            party_characteristics[party_characteristic.organization]\
+                .append(party_characteristic)
+
+        time_periods = {}
+        if time_period_ids:
+            time_periods = {
+                time_period.id: time_period
+                for time_period in db
+                .query(models.TimePeriod)
+                .filter(models.TimePeriod.id.in_(time_period_ids))
+                .filter(models.TimePeriod.deleted == bool(False))
+            }
+
+        for organization in organizations_chunk:
+            organization.preload(
+                partyCharacteristicParsed=party_characteristics[
+                    organization.id
+                ],
+                existsDuringParsed=time_periods.get(organization.existsDuring)
+            )
+
+    return organizations
+
+
+# Streams the results of an organizations' query in hydrated batches
+def iter_hydrated_organizations(db: Session, query,
+                                batch_size: int = HYDRATION_BATCH_SIZE):
+    batch = []
+    for organization in query.yield_per(batch_size):
+        batch.append(organization)
+        if len(batch) == batch_size:
+            yield hydrate_organizations(db, batch)
+            batch = []
+    if batch:
+        yield hydrate_organizations(db, batch)
+
+
 def create_organization(db: Session,
                         organization: tmf632_party_mgmt.OrganizationCreate):
     try:
@@ -232,7 +392,7 @@ def create_organization(db: Session,
         db.flush()
         db.refresh(db_organization)
         db_organization.set_db(db)
-        logger.info(f"Organization created: {db_organization.as_dict()}")
+        logger.info("Organization created: %s", db_organization)
 
         # Try to create a new partyCharacteristic DB Entry
         if organization.partyCharacteristic:
@@ -244,7 +404,22 @@ def create_organization(db: Session,
                 db.add(db_party_characteristic)
                 db.flush()
 
+        FullTextSearch.index_organization(db, db_organization)
+        document = OrganizationDocuments.materialize_document(
+            db,
+            db_organization
+        )
+
+        db_organization.changeSeq = next_change_seq(db)
+        _record_organization_event(
+            db,
+            OrganizationEvents.ORGANIZATION_CREATE_EVENT,
+            db_organization.id,
+            document
+        )
+
         db.commit()
+        organization_count_cache.clear()
         return db_organization
 
     except Exception as e:
@@ -259,7 +434,8 @@ def create_organization(db: Session,
 
 def update_organization(db: Session,
                         organization_id: int,
-                        organization: tmf632_party_mgmt.OrganizationCreate):
+                        organization: tmf632_party_mgmt.OrganizationCreate,
+                        db_organization: models.Organization = None):
     try:
         # Check if organization payload contains the organization's id
         if not organization_id:
@@ -268,11 +444,12 @@ def update_organization(db: Session,
                 reason="Organization had no id"
             )
 
-        # Get current organization
-        db_organization = get_organization_by_id(
-            db=db,
-            id=organization_id
-        )
+        # Get current organization, if it wasn't already loaded by the caller
+        if db_organization is None:
+            db_organization = get_organization_by_id(
+                db=db,
+                id=organization_id
+            )
 
         if not db_organization:
             raise EntityDoesNotExist(
@@ -298,23 +475,27 @@ def update_organization(db: Session,
 
         # Try to create a new partyCharacteristic DB Entry
         if organization.partyCharacteristic:
-            for characteristic in db_organization.partyCharacteristicParsed:
-                if characteristic:
-                    characteristic.deleted = True
+            with tracer.span("crud.update_organization.characteristics"):
+                for characteristic in \
+                        db_organization.partyCharacteristicParsed:
+                    if characteristic:
+                        characteristic.deleted = True
+                        db.flush()
+
+                for party_characteristic in organization.partyCharacteristic:
+                    db_party_characteristic = models.Characteristic(
+                        **party_characteristic.dict()
+                    )
+                    db_party_characteristic.organization = \
+                        db_organization.id
+                    db.add(db_party_characteristic)
                     db.flush()
 
-            for party_characteristic in organization.partyCharacteristic:
-                db_party_characteristic = models.Characteristic(
-                    **party_characteristic.dict()
-                )
-                db_party_characteristic.organization = db_organization.id
-                db.add(db_party_characteristic)
-                db.flush()
-
         # Check if a status was assigned to the organization
         status_value = None
         if organization.status:
             status_value = organization.status.value
+        previous_status_value = db_organization.status
 
         # Update the Organization Itself
         db_organization.isHeadOffice = organization.isHeadOffice
@@ -331,10 +512,34 @@ def update_organization(db: Session,
 
         db.flush()
         db.refresh(db_organization)
-        logger.info(f"Organization updated: {db_organization.as_dict()}")
+        # Previously preloaded children are now outdated
+        db_organization.clear_preloaded()
+        FullTextSearch.index_organization(db, db_organization)
+        with tracer.span("crud.update_organization.document"):
+            document = OrganizationDocuments.materialize_document(
+                db,
+                db_organization
+            )
+        db_organization.changeSeq = next_change_seq(db)
+        _record_organization_event(
+            db,
+            OrganizationEvents.ORGANIZATION_ATTRIBUTE_VALUE_CHANGE_EVENT,
+            organization_id,
+            document
+        )
+        if status_value != previous_status_value:
+            _record_organization_event(
+                db,
+                OrganizationEvents.ORGANIZATION_STATE_CHANGE_EVENT,
+                organization_id,
+                document
+            )
+        logger.info("Organization updated: %s", db_organization)
 
         # Finally, commit
-        db.commit()
+        with tracer.span("crud.update_organization.commit"):
+            db.commit()
+        organization_count_cache.clear()
         db_organization.set_db(db)
         return db_organization
 
@@ -364,15 +569,413 @@ def get_organization_by_id(db: Session, id: int):
     return organization
 
 
-def get_all_organizations(db: Session, filters: dict = {}):
+class OrganizationAccess:
+
+    def __init__(self, organization, authorized_user_ids, is_authorized):
+        self.organization = organization
+        self.authorized_user_ids = authorized_user_ids
+        self.is_authorized = is_authorized
+
+    @property
+    def organization_id(self):
+        return self.organization.id if self.organization else None
 
-    organizations = db\
+
+class OrganizationDocumentAccess:
+
+    def __init__(self, organization_id, document, is_authorized):
+        self.organization_id = organization_id
+        self.document = document
+        self.is_authorized = is_authorized
+
+
+# How often the precomputed documents were found (hits), or the organization
+# had to be loaded instead (misses)
+class DocumentLookups:
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+
+organization_document_lookups = DocumentLookups()
+
+
+# Fetches the precomputed TMF632 document of an organization, and whether the
+# user may access it, with a single query. Returns None if there is no
+# up-to-date document, in which case the organization has to be loaded
+def get_organization_document_for_user(db: Session, id: int, user_id: str,
+                                       is_admin: bool = False):
+    is_authorized_user = db\
+        .query(models.OrganizationAuthorizedUsers.id)\
+        .filter(models.OrganizationAuthorizedUsers.user_id == user_id)\
+        .filter(models.OrganizationAuthorizedUsers.deleted == bool(False))\
+        .filter(models.OrganizationAuthorizedUsers.organization == id)\
+        .exists()
+    row = db\
+        .query(models.OrganizationDocument.document, is_authorized_user)\
+        .filter(models.OrganizationDocument.organization == id)\
+        .filter(
+            models.OrganizationDocument.version
+            == OrganizationDocuments.DOCUMENT_VERSION
+        )\
+        .first()
+
+    if row is None:
+        organization_document_lookups.misses += 1
+        return None
+
+    organization_document_lookups.hits += 1
+    document, is_authorized_user = row
+    return OrganizationDocumentAccess(
+        organization_id=id,
+        document=document,
+        is_authorized=is_admin or bool(is_authorized_user)
+    )
+
+
+# Rebuilds the documents of all organizations, e.g. to backfill them or after
+# their serialization changed. Returns the number of rebuilt documents
+def rebuild_organization_documents(db: Session,
+                                   batch_size: int = HYDRATION_BATCH_SIZE):
+    rebuilt = 0
+    organizations = _organizations_query(db)\
+        .order_by(models.Organization.id)
+    for batch in iter_hydrated_organizations(db, organizations, batch_size):
+        db\
+            .query(models.OrganizationDocument)\
+            .filter(models.OrganizationDocument.organization.in_(
+                [organization.id for organization in batch]
+            ))\
+            .delete(synchronize_session=False)
+        db.add_all([
+            models.OrganizationDocument(
+                organization=organization.id,
+                version=OrganizationDocuments.DOCUMENT_VERSION,
+                document=OrganizationDocuments.encode_document(organization)
+            )
+            for organization in batch
+        ])
+        db.flush()
+        rebuilt += len(batch)
+    db.commit()
+    return rebuilt
+
+
+# Loads an organization, its live authorized users and whether the user may
+# access it, all in a single query
+def get_organization_for_user(db: Session, id: int, user_id: str,
+                              is_admin: bool = False):
+    organization_model = models.Organization
+    organization_model.set_db(db)
+    rows = db\
+        .query(organization_model, models.OrganizationAuthorizedUsers)\
+        .outerjoin(
+            models.OrganizationAuthorizedUsers,
+            and_(
+                models.OrganizationAuthorizedUsers.organization
+                == organization_model.id,
+                models.OrganizationAuthorizedUsers.deleted == bool(False)
+            )
+        )\
+        .filter(organization_model.id == id)\
+        .filter(organization_model.deleted == bool(False))\
+        .order_by(models.OrganizationAuthorizedUsers.id)\
+        .all()
+
+    if not rows:
+        return OrganizationAccess(
+            organization=None,
+            authorized_user_ids=[],
+            is_authorized=is_admin
+        )
+
+    organization = rows[0][0]
+    authorized_users = [
+        authorized_user
+        for _, authorized_user in rows
+        if authorized_user is not None
+    ]
+    organization.preload(authorizedUsersParsed=authorized_users)
+    authorized_user_ids = [
+        authorized_user.user_id for authorized_user in authorized_users
+    ]
+
+    return OrganizationAccess(
+        organization=organization,
+        authorized_user_ids=authorized_user_ids,
+        is_authorized=is_admin or user_id in authorized_user_ids
+    )
+
+
+class OrganizationsBatchAccess:
+
+    def __init__(self, organizations, not_found, forbidden):
+        self.organizations = organizations
+        self.not_found = not_found
+        self.forbidden = forbidden
+
+
+# Loads several organizations, and their authorized users, with one query
+# each per batch of ids, and checks the user's access to all of them at once.
+# Only the organizations the user may access are hydrated. Results keep the
+# order of the requested ids
+def get_organizations_for_user(db: Session, ids: list, user_id: str,
+                               is_admin: bool = False):
+    models.Organization.set_db(db)
+    ids = list(dict.fromkeys(ids))
+
+    organizations = {}
+    authorized_user_ids = {}
+    for ids_chunk in _chunks(ids, HYDRATION_BATCH_SIZE):
+        for organization in db\
+                .query(models.Organization)\
+                .filter(models.Organization.id.in_(ids_chunk))\
+                .filter(models.Organization.deleted == bool(False)):
+            organizations[organization.id] = organization
+
+        authorized_users = {
+            organization_id: [] for organization_id in ids_chunk
+        }
+        for authorized_user in db\
+                .query(models.OrganizationAuthorizedUsers)\
+                .filter(
+                    models.OrganizationAuthorizedUsers.organization
+                    .in_(ids_chunk)
+                )\
+                .filter(
+                    models.OrganizationAuthorizedUsers.deleted == bool(False)
+                )\
+                .order_by(models.OrganizationAuthorizedUsers.id):
+            authorized_users[authorized_user.organization]\
+                .append(authorized_user)
+
+        for organization_id in ids_chunk:
+            if organization_id in organizations:
+                organizations[organization_id].preload(
+                    authorizedUsersParsed=authorized_users[organization_id]
+                )
+                authorized_user_ids[organization_id] = [
+                    authorized_user.user_id
+                    for authorized_user in authorized_users[organization_id]
+                ]
+
+    not_found = [id for id in ids if id not in organizations]
+    forbidden = [
+        id
+        for id in ids
+        if id in organizations
+        and not is_admin
+        and user_id not in authorized_user_ids[id]
+    ]
+    accessible_organizations = [
+        organizations[id]
+        for id in ids
+        if id in organizations and id not in set(forbidden)
+    ]
+
+    return OrganizationsBatchAccess(
+        organizations=hydrate_organizations(db, accessible_organizations),
+        not_found=not_found,
+        forbidden=forbidden
+    )
+
+
+def _organizations_query(db: Session, filters: dict = {},
+                         authorized_user_id: str = None,
+                         operator_filters: list = [],
+                         characteristic_filter: dict = {},
+                         search_ranking=None,
+                         active_period: tuple = None):
+    query = db\
         .query(models.Organization)\
         .filter(models.Organization.deleted == bool(False))\
-        .filter_by(**filters)\
-        .all()
+        .filter_by(**filters)
 
-    return organizations
+    # Full-text search. Only the matching organizations are joined
+    if search_ranking is not None:
+        query = query.join(
+            search_ranking,
+            search_ranking.c.id == models.Organization.id
+        )
+
+    # Organizations owning a given party characteristic
+    if characteristic_filter:
+        query = query.filter(
+            QueryFilters.compile_characteristic_filter(characteristic_filter)
+        )
+
+    # Organizations active at a given time, or during a given period
+    if active_period is not None:
+        query = query.filter(
+            QueryFilters.compile_active_period(active_period)
+        )
+
+    # TMF632 attribute filters (e.g. 'name.like'), compiled to indexed
+    # predicates. Filters on the organization's time period go through its
+    # (indexed) foreign key
+    if operator_filters:
+        if QueryFilters.requires_time_period_join(operator_filters):
+            query = query.join(
+                models.TimePeriod,
+                models.TimePeriod.id == models.Organization.existsDuring
+            )
+        query = query.filter(
+            *QueryFilters.compile_filters(
+                operator_filters,
+                has_sargable_predicates=bool(filters)
+                or bool(characteristic_filter)
+                or search_ranking is not None
+                or active_period is not None
+            )
+        )
+
+    # Row-level authorization: only keep the organizations the user is
+    # authorized to access, through a semi-join on the
+    # (user_id, deleted, organization) index, so that rows the user can't
+    # access are never loaded
+    if authorized_user_id is not None:
+        query = query.filter(
+            models.Organization.id.in_(
+                db
+                .query(models.OrganizationAuthorizedUsers.organization)
+                .filter(
+                    models.OrganizationAuthorizedUsers.user_id
+                    == authorized_user_id
+                )
+                .filter(
+                    models.OrganizationAuthorizedUsers.deleted == bool(False)
+                )
+            )
+        )
+
+    return query
+
+
+def get_all_organizations(db: Session, filters: dict = {},
+                          authorized_user_id: str = None,
+                          offset: int = None, limit: int = None,
+                          operator_filters: list = [],
+                          characteristic_filter: dict = {},
+                          search: str = None,
+                          sort: str = None,
+                          active_period: tuple = None):
+
+    search_ranking = None
+    if search is not None:
+        search_ranking = FullTextSearch.search_ranking(db, search)
+
+    organizations = _organizations_query(
+        db=db,
+        filters=filters,
+        authorized_user_id=authorized_user_id,
+        operator_filters=operator_filters,
+        characteristic_filter=characteristic_filter,
+        search_ranking=search_ranking,
+        active_period=active_period
+    )
+
+    # Explicitly requested orders take precedence. Otherwise, search results
+    # are ranked by relevance, and organizations are ordered by id, so that
+    # pagination is stable
+    if sort:
+        organizations = organizations.order_by(
+            *QueryFilters.compile_sort(sort)
+        )
+    else:
+        if search_ranking is not None:
+            organizations = organizations.order_by(search_ranking.c.rank)
+        organizations = organizations.order_by(models.Organization.id)
+    organizations = organizations\
+        .offset(offset)\
+        .limit(limit)
+
+    return [
+        organization
+        for batch in iter_hydrated_organizations(db, organizations)
+        for organization in batch
+    ]
+
+
+# Short-lived cache of organization counts, keyed by their filters. It is
+# cleared whenever an organization is written, so the TTL only bounds how
+# stale counts may get when other processes write to the same database
+class CountCache:
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL,
+                 max_entries: int = COUNT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_count(self, key, count):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = count()
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+organization_count_cache = CountCache()
+
+
+def count_organizations(db: Session, filters: dict = {},
+                        authorized_user_id: str = None,
+                        operator_filters: list = [],
+                        characteristic_filter: dict = {},
+                        search: str = None, active_period: tuple = None,
+                        cached: bool = False):
+
+    def count():
+        search_ranking = None
+        if search is not None:
+            search_ranking = FullTextSearch.search_ranking(db, search)
+        # SELECT COUNT(*) with the same predicates as the listing
+        return _organizations_query(
+            db=db,
+            filters=filters,
+            authorized_user_id=authorized_user_id,
+            operator_filters=operator_filters,
+            characteristic_filter=characteristic_filter,
+            search_ranking=search_ranking,
+            active_period=active_period
+        )\
+            .with_entities(func.count(models.Organization.id))\
+            .scalar()
+
+    if not cached:
+        return count()
+
+    key = (
+        tuple(sorted(filters.items())),
+        authorized_user_id,
+        tuple(
+            (f.field, f.operator, f.value) for f in operator_filters
+        ),
+        tuple(sorted(characteristic_filter.items())),
+        search,
+        active_period,
+    )
+    return organization_count_cache.get_or_count(key, count)
 
 
 def permanentely_delete_organization(db: Session, organization_id: int):
@@ -388,11 +991,15 @@ def permanentely_delete_organization(db: Session, organization_id: int):
         db_organization.id
     )
 
+    FullTextSearch.unindex_organization(db, organization_id)
+    OrganizationDocuments.delete_document(db, organization_id)
+
     # Finally, delete the organization
     db\
         .query(models.Organization)\
         .filter(models.Organization.id == organization_id)\
         .delete()
+    organization_count_cache.clear()
 
 
 def delete_organization(db: Session, organization_id: int):
@@ -405,6 +1012,9 @@ def delete_organization(db: Session, organization_id: int):
             reason=f"Organization with id={organization_id} doesn't exist"
         )
 
+    # Last document of the organization, for the delete event
+    document = OrganizationDocuments.get_document(db, schema_organization)
+
     # Delete Time Period
     delete_time_period(db, schema_organization.id)
 
@@ -421,4 +1031,277 @@ def delete_organization(db: Session, organization_id: int):
         .first()
 
     db_organization.deleted = True
+    FullTextSearch.unindex_organization(db, db_organization.id)
+    OrganizationDocuments.delete_document(db, db_organization.id)
+    db_organization.changeSeq = next_change_seq(db)
+    _record_organization_event(
+        db,
+        OrganizationEvents.ORGANIZATION_DELETE_EVENT,
+        organization_id,
+        document
+    )
     db.commit()
+    organization_count_cache.clear()
+
+
+#######################################
+#     Change Sequence Operations      #
+#######################################
+
+
+# Increments the change sequence, in the caller's transaction, and returns
+# its new value. Concurrent writers wait on it until the caller commits, so
+# it should be called right before committing
+def next_change_seq(db: Session):
+    db\
+        .query(models.ChangeSequence)\
+        .filter(models.ChangeSequence.id == models.CHANGE_SEQUENCE_ID)\
+        .update(
+            {models.ChangeSequence.value: models.ChangeSequence.value + 1},
+            synchronize_session=False
+        )
+    return get_change_seq(db)
+
+
+def get_change_seq(db: Session):
+    return db\
+        .query(models.ChangeSequence.value)\
+        .filter(models.ChangeSequence.id == models.CHANGE_SEQUENCE_ID)\
+        .scalar() or 0
+
+
+# Changes of the organization's authorized users are changes of the
+# organization, for the users who gain or lose access to it
+def _stamp_organization_change(db: Session, organization_id: int):
+    db\
+        .query(models.Organization)\
+        .filter(models.Organization.id == organization_id)\
+        .update(
+            {models.Organization.changeSeq: next_change_seq(db)},
+            synchronize_session=False
+        )
+
+
+class OrganizationChanges:
+
+    def __init__(self, organizations, deleted_ids, change_seq):
+        # Organizations created or updated since the requested value
+        self.organizations = organizations
+        # Ids of the organizations deleted since then (tombstones), or the
+        # user lost access to
+        self.deleted_ids = deleted_ids
+        # Value to sync from next time
+        self.change_seq = change_seq
+
+
+# Organizations changed after the 'since' value of the change sequence, in
+# the order they changed, along with whether they are authorized. Read
+# through the changeSeq index, so that the cost is proportional to the number
+# of changes, not to the number of organizations. With 'authorized_user_id',
+# only the organizations the user is, or was, authorized for are considered
+def _organization_changes_query(db: Session, since: int,
+                                authorized_user_id: str = None):
+    if authorized_user_id is None:
+        query = db.query(models.Organization, literal(True))
+    else:
+        is_authorized = db\
+            .query(models.OrganizationAuthorizedUsers.id)\
+            .filter(
+                models.OrganizationAuthorizedUsers.user_id
+                == authorized_user_id
+            )\
+            .filter(
+                models.OrganizationAuthorizedUsers.organization
+                == models.Organization.id
+            )\
+            .filter(models.OrganizationAuthorizedUsers.deleted == bool(False))\
+            .exists()
+        ever_authorized_organizations = select(
+            models.OrganizationAuthorizedUsers.organization
+        ).where(
+            models.OrganizationAuthorizedUsers.user_id == authorized_user_id
+        )
+        query = db\
+            .query(models.Organization, is_authorized)\
+            .filter(models.Organization.id.in_(ever_authorized_organizations))
+
+    return query\
+        .filter(models.Organization.changeSeq > since)\
+        .order_by(models.Organization.changeSeq)
+
+
+# The organizations the user lost access to are reported as deleted
+def get_organization_changes(db: Session, since: int, limit: int = None,
+                             authorized_user_id: str = None):
+    # Read first: all the changes stamped up to this value are committed, and
+    # so returned by the query below
+    current_change_seq = get_change_seq(db)
+
+    query = _organization_changes_query(db, since, authorized_user_id)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
+
+    organizations = []
+    deleted_ids = []
+    for organization, is_authorized in rows:
+        if organization.deleted or not is_authorized:
+            deleted_ids.append(organization.id)
+        else:
+            organizations.append(organization)
+    hydrate_organizations(db, organizations)
+
+    change_seq = max(since, current_change_seq)
+    if rows:
+        # More changes may follow the last one of a full page
+        last_change_seq = rows[-1][0].changeSeq
+        change_seq = last_change_seq if limit is not None \
+            and len(rows) == limit else max(change_seq, last_change_seq)
+    return OrganizationChanges(organizations, deleted_ids, change_seq)
+
+
+#######################################
+#   Event Subscriptions Operations    #
+#######################################
+
+
+# Events are recorded in the outbox, in the same transaction as the mutation
+# that caused them, and delivered by the outbox relay once committed. They are
+# also kept in the session, to be pushed to the change feed once committed
+RECORDED_CHANGES = "recorded_changes"
+
+
+def _record_organization_event(db: Session, event_type: str,
+                               organization_id: int, document: bytes):
+    Outbox.record_event(
+        db,
+        event_type,
+        organization_id,
+        OrganizationEvents.encode_organization_event(event_type, document)
+    )
+    db.info.setdefault(RECORDED_CHANGES, [])\
+        .append((organization_id, event_type, None))
+
+
+def _record_authorized_user_event(db: Session, event_type: str, user_id: str,
+                                  organization_id: int):
+    Outbox.record_event(
+        db,
+        event_type,
+        organization_id,
+        OrganizationEvents.encode_authorized_user_event(
+            event_type,
+            user_id,
+            organization_id
+        )
+    )
+    db.info.setdefault(RECORDED_CHANGES, [])\
+        .append((organization_id, event_type, user_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_recorded_changes(db: Session):
+    changes = db.info.pop(RECORDED_CHANGES, None)
+    if not changes:
+        return
+    # Relay the new events right away, instead of on the next poll
+    Outbox.outbox_relay.wake_up()
+    for organization_id, event_type, user_id in changes:
+        change_broadcaster.publish(organization_id, event_type, user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_recorded_changes(db: Session):
+    db.info.pop(RECORDED_CHANGES, None)
+
+
+def get_outbox_lag(db: Session):
+    return Outbox.get_outbox_lag(db)
+
+
+def create_event_subscription(
+    db: Session,
+    subscription: tmf632_party_mgmt.EventSubscriptionInput
+):
+    try:
+        # Rejects unsupported queries
+        OrganizationEvents.parse_subscription_query(subscription.query)
+
+        db_subscription = models.EventSubscription(
+            callback=subscription.callback,
+            query=subscription.query
+        )
+        db.add(db_subscription)
+        db.commit()
+        db.refresh(db_subscription)
+        OrganizationEvents.subscriptions_cache.invalidate()
+        logger.info(
+            "Event Subscription created: %s",
+            db_subscription.as_dict()
+        )
+        return db_subscription
+
+    except InvalidQueryParameter as e:
+        raise e
+    except Exception as e:
+        db.rollback()
+        raise ImpossibleToCreateDatabaseEntry(
+            entity_type="EventSubscription",
+            entity_data=str(subscription),
+            reason=str(e)
+        )
+
+
+def get_event_subscriptions(db: Session):
+    return db\
+        .query(models.EventSubscription)\
+        .filter(models.EventSubscription.deleted == bool(False))\
+        .order_by(models.EventSubscription.id)\
+        .all()
+
+
+def delete_event_subscription(db: Session, subscription_id: int):
+    db_subscription = db\
+        .query(models.EventSubscription)\
+        .filter(models.EventSubscription.id == subscription_id)\
+        .filter(models.EventSubscription.deleted == bool(False))\
+        .first()
+
+    if not db_subscription:
+        raise EntityDoesNotExist(
+            entity_type="EventSubscription",
+            reason=f"Event Subscription with id={subscription_id} " +
+            "doesn't exist"
+        )
+
+    db_subscription.deleted = True
+    db.commit()
+    OrganizationEvents.subscriptions_cache.invalidate()
+
+
+#######################################
+#          Export Operations          #
+#######################################
+
+
+def exportable_columns(table_name: str):
+    return list(EXPORTABLE_TABLES[table_name].__table__.columns)
+
+
+# Streams the live rows of a table, as plain tuples, in batches read straight
+# from a server-side cursor, without building ORM objects
+def iter_table_rows(db: Session, table_name: str,
+                    batch_size: int = EXPORT_BATCH_SIZE):
+    table = EXPORTABLE_TABLES[table_name].__table__
+    result = db.execute(
+        select(table)
+        .where(table.c.deleted == bool(False))
+        .order_by(table.c.id)
+        .execution_options(stream_results=True)
+    )
+    for rows in result.partitions(batch_size):
+        yield [tuple(row) for row in rows]
+
+
+# Each call to the crud functions is traced
+trace_module_functions(globals(), "crud")
@@ -44,3 +44,15 @@ class EntityDoesNotExist(Exception):
 
     def __str__(self):
         return self.message
+
+
+class InvalidQueryParameter(Exception):
+    def __init__(self, parameter, reason):
+        self.parameter = parameter
+        self.reason = f"Invalid query parameter '{parameter}': {reason}"
+        self.message = f"Impossible to run query ({self.reason})."
+        logger.error(f"Exception: {self.message}")
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
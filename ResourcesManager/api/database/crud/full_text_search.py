@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-28 10:12:40
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-28 16:05:18
+
+# Ranked full-text search ('q=') over the organizations' name and tradingName.
+#
+# Each word of the search is matched as a prefix, and all of them must match.
+# Results are ranked with bm25 on SQLite (FTS5) and ts_rank on Postgres; the
+# lower the rank, the better the match.
+
+# general imports
+import re
+from sqlalchemy import column, delete, func, insert, literal_column, select
+from sqlalchemy import table
+from sqlalchemy.orm import Session
+
+# custom imports
+from database.models import models
+from database.crud.exceptions import InvalidQueryParameter
+
+SEARCH_PARAMETER = "q"
+
+search_table = table(
+    models.ORGANIZATION_SEARCH_TABLE,
+    column("rowid"),
+    column("name"),
+    column("tradingName"),
+)
+
+# Same expression as the GIN index, so that Postgres can use it
+search_document = literal_column(models.ORGANIZATION_SEARCH_DOCUMENT)
+
+
+def _dialect(db: Session):
+    return db.get_bind().dialect.name
+
+
+def search_terms(search: str):
+    terms = re.findall(r"\w+", search)
+    if not terms:
+        raise InvalidQueryParameter(
+            SEARCH_PARAMETER,
+            "the search must contain at least one word"
+        )
+    return terms
+
+
+# Subquery with the (id, rank) of the organizations matching the search
+def search_ranking(db: Session, search: str):
+    terms = search_terms(search)
+
+    if _dialect(db) == "postgresql":
+        ts_query = func.to_tsquery(
+            literal_column("'simple'"),
+            " & ".join(f"{term}:*" for term in terms)
+        )
+        return select(
+            models.Organization.id.label("id"),
+            (-func.ts_rank(search_document, ts_query)).label("rank")
+        )\
+            .where(search_document.op("@@")(ts_query))\
+            .subquery()
+
+    search_table_name = literal_column(f'"{models.ORGANIZATION_SEARCH_TABLE}"')
+    return select(
+        search_table.c.rowid.label("id"),
+        func.bm25(search_table_name).label("rank")
+    )\
+        .where(
+            search_table_name.op("MATCH")(
+                " ".join(f'"{term}"*' for term in terms)
+            )
+        )\
+        .subquery()
+
+
+# Only needed on SQLite, where the search table isn't maintained by the
+# database. Runs in the caller's transaction
+def index_organization(db: Session, organization: models.Organization):
+    if _dialect(db) != "sqlite":
+        return
+    unindex_organization(db, organization.id)
+    db.execute(
+        insert(search_table).values(
+            rowid=organization.id,
+            name=organization.name,
+            tradingName=organization.tradingName
+        )
+    )
+
+
+def unindex_organization(db: Session, organization_id: int):
+    if _dialect(db) != "sqlite":
+        return
+    db.execute(
+        delete(search_table).where(search_table.c.rowid == organization_id)
+    )
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-31 09:37:02
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-31 17:14:48
+
+# Precomputed TMF632 documents of the organizations.
+#
+# Every write of an organization in crud.py serializes its final TMF632
+# document (organization, time period and party characteristics) into the
+# OrganizationDocument table, in the same transaction. Getting an organization
+# by id is then a single-row fetch, with no pydantic work.
+#
+# Usage (backfill, or after DOCUMENT_VERSION changes):
+#   python -m database.crud.organization_documents
+#       [--database-url sqlite:///./sql_app.db] [--batch-size 500]
+
+# general imports
+import argparse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+# custom imports
+from database.models import models
+from schemas import tmf632_party_mgmt as TMF632
+from aux import media_types as MediaTypes
+
+# Bump whenever the serialization below changes, so that stale documents are
+# no longer served
+DOCUMENT_VERSION = 1
+
+
+def organization_to_schema(organization: models.Organization):
+
+    # Parse Organization Model to TMF632 Organization Schema
+    schema = TMF632.Organization.from_orm(organization)
+
+    # Add TimePeriod, if needed
+    if organization.existsDuringParsed:
+        schema.existsDuring = TMF632.TimePeriod\
+            .from_orm(organization.existsDuringParsed)
+
+    # Add Characteristics, if needed
+    schema.partyCharacteristic = []
+    for pc in organization.partyCharacteristicParsed:
+        schema.partyCharacteristic.append(
+            TMF632.Characteristic.from_orm(pc)
+        )
+
+    return schema
+
+
+def encode_document(organization: models.Organization):
+    return MediaTypes.encode_json(
+        jsonable_encoder(organization_to_schema(organization))
+    )
+
+
+# Runs in the caller's transaction. Returns the document
+def materialize_document(db: Session, organization: models.Organization):
+    organization.set_db(db)
+
+    # Values assigned in this session (e.g. timezone aware datetimes) are
+    # reloaded, so that the document matches what is read back from the
+    # database
+    time_period = organization.existsDuringParsed
+    if time_period is not None:
+        db.refresh(time_period)
+
+    document = encode_document(organization)
+    db.merge(
+        models.OrganizationDocument(
+            organization=organization.id,
+            version=DOCUMENT_VERSION,
+            document=document
+        )
+    )
+    db.flush()
+    return document
+
+
+# Returns the up-to-date document of an organization, building it if needed
+def get_document(db: Session, organization: models.Organization):
+    row = db\
+        .query(models.OrganizationDocument.document)\
+        .filter(models.OrganizationDocument.organization == organization.id)\
+        .filter(models.OrganizationDocument.version == DOCUMENT_VERSION)\
+        .first()
+    if row is not None:
+        return row[0]
+    organization.set_db(db)
+    return encode_document(organization)
+
+
+def delete_document(db: Session, organization_id: int):
+    db\
+        .query(models.OrganizationDocument)\
+        .filter(models.OrganizationDocument.organization == organization_id)\
+        .delete()
+
+
+def main(args: list = None):
+    parser = argparse.ArgumentParser(
+        description="Rebuilds the precomputed TMF632 documents of all " +
+        "organizations"
+    )
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parsed_args = parser.parse_args(args)
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from database.database import SQLALCHEMY_DATABASE_URL
+    from database.crud import crud
+
+    engine = create_engine(parsed_args.database_url or SQLALCHEMY_DATABASE_URL)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        rebuilt = crud.rebuild_organization_documents(
+            db,
+            parsed_args.batch_size or crud.HYDRATION_BATCH_SIZE
+        )
+        print(f"Rebuilt {rebuilt} organization documents")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-27 09:48:21
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-27 15:22:09
+
+# Compiles the TMF632 attribute filters (e.g. 'name.like=Acme%',
+# 'status.in=initialized,validated' or 'existsDuring.startDateTime.gt=...')
+# into SQL predicates.
+#
+# Only predicates that the database can answer through an index are accepted.
+# Anything that would fall back to a full scan of the organizations (filters
+# on non-indexed columns, 'like' patterns without a literal prefix, or a query
+# made only of 'ne' predicates) is rejected with InvalidQueryParameter.
+
+# general imports
+from datetime import datetime, timezone
+from sqlalchemy import Boolean, DateTime, Integer, and_, or_, select
+
+# custom imports
+from database.models import models
+from database.crud.exceptions import InvalidQueryParameter
+
+EQ = "eq"
+NE = "ne"
+GT = "gt"
+GTE = "gte"
+LT = "lt"
+LTE = "lte"
+IN = "in"
+LIKE = "like"
+
+FILTER_OPERATORS = [EQ, NE, GT, GTE, LT, LTE, IN, LIKE]
+
+# Operators whose predicates can't be answered through an index, on their own
+NON_SARGABLE_OPERATORS = [NE]
+
+LIKE_WILDCARDS = ("%", "_")
+
+SORT_PARAMETER = "sort"
+ACTIVE_AT_PARAMETER = "activeAt"
+ACTIVE_BETWEEN_PARAMETER = "activeBetween"
+DESCENDING_PREFIX = "-"
+
+# Filterable attributes, by query parameter name
+FILTERABLE_FIELDS = {
+    "href": models.Organization.__table__.c.href,
+    "isHeadOffice": models.Organization.__table__.c.isHeadOffice,
+    "isLegalEntity": models.Organization.__table__.c.isLegalEntity,
+    "name": models.Organization.__table__.c.name,
+    "nameType": models.Organization.__table__.c.nameType,
+    "organizationType": models.Organization.__table__.c.organizationType,
+    "tradingName": models.Organization.__table__.c.tradingName,
+    "status": models.Organization.__table__.c.status,
+    "existsDuring.startDateTime": models.TimePeriod.__table__.c.startDateTime,
+    "existsDuring.endDateTime": models.TimePeriod.__table__.c.endDateTime,
+}
+
+# Attributes organizations may be sorted by. All of them are indexed, so that
+# sorted pages are read in index order
+SORTABLE_FIELDS = {
+    field: models.Organization.__table__.c[field]
+    for field in [
+        "id",
+        "href",
+        "name",
+        "nameType",
+        "organizationType",
+        "tradingName",
+        "status",
+    ]
+}
+
+
+class OperatorFilter:
+
+    def __init__(self, field, operator, value):
+        self.field = field
+        self.operator = operator
+        self.value = value
+
+    @property
+    def parameter(self):
+        return f"{self.field}.{self.operator}"
+
+    def __eq__(self, other):
+        return isinstance(other, OperatorFilter) \
+            and (self.field, self.operator, self.value) \
+            == (other.field, other.operator, other.value)
+
+    def __repr__(self):
+        return f"OperatorFilter({self.parameter}={self.value!r})"
+
+
+# Splits a query parameter such as 'existsDuring.startDateTime.gt' into its
+# field and operator. Returns None for parameters without an operator
+def split_filter_parameter(parameter: str):
+    field, _, operator = parameter.rpartition(".")
+    if not field or operator not in FILTER_OPERATORS:
+        return None
+    return field, operator
+
+
+def _is_indexed(column):
+    if column.primary_key or column.index:
+        return True
+    # Leading column of a composite index
+    return any(
+        list(index.columns)[0] is column
+        for index in column.table.indexes
+    )
+
+
+def _parse_datetime(value: str):
+    parsed_value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Datetimes are stored as naive UTC
+    if parsed_value.tzinfo is not None:
+        parsed_value = parsed_value.astimezone(timezone.utc)\
+            .replace(tzinfo=None)
+    return parsed_value
+
+
+def _coerce_value(filter: OperatorFilter, column, value: str):
+    try:
+        if isinstance(column.type, Boolean):
+            if value.lower() not in ["true", "false"]:
+                raise ValueError(value)
+            return value.lower() == "true"
+        if isinstance(column.type, Integer):
+            return int(value)
+        if isinstance(column.type, DateTime):
+            return _parse_datetime(value)
+    except ValueError:
+        raise InvalidQueryParameter(
+            filter.parameter,
+            f"'{value}' is not a valid {column.type} value"
+        )
+    return value
+
+
+# 'like' patterns are compiled into a range over their literal prefix, which
+# any B-tree index can answer, plus the pattern itself to check the remaining
+# characters. Matching is therefore case-sensitive, on every backend
+def _compile_like(filter: OperatorFilter, column):
+    pattern = filter.value
+    wildcard_positions = [
+        pattern.index(wildcard)
+        for wildcard in LIKE_WILDCARDS
+        if wildcard in pattern
+    ]
+    if not wildcard_positions:
+        return column == pattern
+
+    prefix = pattern[:min(wildcard_positions)]
+    if not prefix:
+        raise InvalidQueryParameter(
+            filter.parameter,
+            "patterns starting with a wildcard would require a full scan"
+        )
+
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(
+        column >= prefix,
+        column < upper_bound,
+        column.like(pattern)
+    )
+
+
+def compile_filter(filter: OperatorFilter):
+    column = FILTERABLE_FIELDS.get(filter.field)
+    if column is None:
+        raise InvalidQueryParameter(
+            filter.parameter,
+            f"filtering by '{filter.field}' is not supported"
+        )
+    if not _is_indexed(column):
+        raise InvalidQueryParameter(
+            filter.parameter,
+            f"'{filter.field}' is not indexed and would require a full scan"
+        )
+
+    if filter.operator == LIKE:
+        if column.type.python_type is not str:
+            raise InvalidQueryParameter(
+                filter.parameter,
+                "'like' is only supported on text attributes"
+            )
+        return _compile_like(filter, column)
+
+    if filter.operator == IN:
+        values = [
+            _coerce_value(filter, column, value)
+            for value in filter.value.split(",")
+        ]
+        return column.in_(values)
+
+    value = _coerce_value(filter, column, filter.value)
+    if filter.operator == EQ:
+        return column == value
+    if filter.operator == NE:
+        return column != value
+    if filter.operator == GT:
+        return column > value
+    if filter.operator == GTE:
+        return column >= value
+    if filter.operator == LT:
+        return column < value
+    return column <= value
+
+
+# 'has_sargable_predicates' tells if the query has other predicates that can be
+# answered through an index (e.g. equality filters), in which case 'ne' filters
+# are only applied to the rows those select
+def compile_filters(filters: list, has_sargable_predicates: bool = False):
+    if filters and not has_sargable_predicates and all(
+        filter.operator in NON_SARGABLE_OPERATORS
+        for filter in filters
+    ):
+        raise InvalidQueryParameter(
+            filters[0].parameter,
+            "'ne' must be combined with another filter, otherwise the " +
+            "query would require a full scan"
+        )
+    return [compile_filter(filter) for filter in filters]
+
+
+# Semi-join on the organizations owning a live characteristic with the given
+# name (and value), answered by the (name, value, deleted, organization) index
+def compile_characteristic_filter(characteristic_filter: dict):
+    if "name" not in characteristic_filter:
+        raise InvalidQueryParameter(
+            "partyCharacteristic.value",
+            "must be combined with 'partyCharacteristic.name', otherwise " +
+            "the query would require a full scan"
+        )
+
+    characteristics = select(models.Characteristic.organization)\
+        .where(models.Characteristic.name == characteristic_filter["name"])
+    if "value" in characteristic_filter:
+        characteristics = characteristics.where(
+            models.Characteristic.value == characteristic_filter["value"]
+        )
+    characteristics = characteristics\
+        .where(models.Characteristic.deleted == bool(False))
+
+    return models.Organization.id.in_(characteristics)
+
+
+# Compiles 'sort' (e.g. '-name,id') into ORDER BY clauses. The id is appended
+# as tie-breaker, in the direction of the first key, so that the order is
+# total (as keyset pagination requires) and matches the order of the
+# (column, rowid) index entries
+def compile_sort(sort: str):
+    order_by = []
+    sorted_fields = []
+    for sort_key in sort.split(","):
+        descending = sort_key.startswith(DESCENDING_PREFIX)
+        field = sort_key[len(DESCENDING_PREFIX):] if descending else sort_key
+        column = SORTABLE_FIELDS.get(field)
+        if column is None or not _is_indexed(column):
+            raise InvalidQueryParameter(
+                SORT_PARAMETER,
+                f"sorting by '{field}' is not supported"
+            )
+        if field in sorted_fields:
+            raise InvalidQueryParameter(
+                SORT_PARAMETER,
+                f"'{field}' is repeated"
+            )
+        sorted_fields.append(field)
+        order_by.append(column.desc() if descending else column.asc())
+
+    if "id" not in sorted_fields:
+        id_column = SORTABLE_FIELDS["id"]
+        order_by.append(
+            id_column.desc()
+            if sort.startswith(DESCENDING_PREFIX)
+            else id_column.asc()
+        )
+    return order_by
+
+
+# Parses 'activeAt' (a datetime) or 'activeBetween' (two comma separated
+# datetimes) into the (start, end) of the period organizations must be active
+# during. 'activeAt=T' is the same as 'activeBetween=T,T'
+def parse_active_period(active_at: str = None, active_between: str = None):
+    if active_at is not None and active_between is not None:
+        raise InvalidQueryParameter(
+            ACTIVE_BETWEEN_PARAMETER,
+            f"can't be combined with '{ACTIVE_AT_PARAMETER}'"
+        )
+    if active_at is not None:
+        parameter, values = ACTIVE_AT_PARAMETER, [active_at]
+    elif active_between is not None:
+        parameter, values = ACTIVE_BETWEEN_PARAMETER, active_between.split(",")
+        if len(values) != 2:
+            raise InvalidQueryParameter(
+                parameter,
+                "must be two comma separated datetimes"
+            )
+    else:
+        return None
+
+    try:
+        datetimes = [_parse_datetime(value) for value in values]
+    except ValueError:
+        raise InvalidQueryParameter(parameter, "invalid datetime")
+    if datetimes[0] > datetimes[-1]:
+        raise InvalidQueryParameter(
+            parameter,
+            "the period can't end before it starts"
+        )
+    return datetimes[0], datetimes[-1]
+
+
+# Organizations whose existsDuring overlaps the period. A period without an
+# end is open-ended. Organizations without a period are never active.
+# Compiled to a semi-join, so that the matching periods are read from the
+# (startDateTime, endDateTime) index alone, and their organizations through
+# the existsDuring index
+def compile_active_period(active_period: tuple):
+    period_start, period_end = active_period
+    time_periods = select(models.TimePeriod.id)\
+        .where(models.TimePeriod.startDateTime <= period_end)\
+        .where(
+            or_(
+                models.TimePeriod.endDateTime.is_(None),
+                models.TimePeriod.endDateTime >= period_start
+            )
+        )
+    return models.Organization.existsDuring.in_(time_periods)
+
+
+def requires_time_period_join(filters: list):
+    return any(
+        filter.field in FILTERABLE_FIELDS
+        and FILTERABLE_FIELDS[filter.field].table
+        is models.TimePeriod.__table__
+        for filter in filters
+    )
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 11:03:18
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:40:55
+
+# Metrics of the database: executed SQL statements and their time, how long
+# sessions wait for a connection, and how many connections are in use.
+#
+# Statements are also accounted to the request that executed them, through
+# the QueryStats set by the metrics middleware in the request's context.
+#
+# Within a traced request, each statement is a span, named after its
+# operation (e.g. SELECT), with the statement but not its parameters.
+#
+# Statements slower than SLOW_QUERY_THRESHOLD are logged, with their bound
+# parameters redacted, since they may hold personal data. A statement
+# repeated REPEATED_STATEMENT_THRESHOLD times by the same request is logged
+# as well: it usually means that something is loaded one row at a time
+# (N+1 queries), instead of in bulk.
+
+# general imports
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# custom imports
+from aux.log_utils import Truncated
+from metrics.registry import Counter, Gauge, Histogram
+from tracing.tracer import CLIENT, NOOP_SPAN, tracer
+
+# Logger
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD = 0.5  # seconds
+REPEATED_STATEMENT_THRESHOLD = 10
+# Longer statements are truncated in the spans
+MAX_TRACED_STATEMENT_LENGTH = 2048
+
+POOL_WAIT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5
+)
+
+sql_queries = Counter(
+    "db_queries_total",
+    "SQL statements executed"
+)
+sql_duration = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements"
+)
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool",
+    buckets=POOL_WAIT_BUCKETS
+)
+connections_in_use = Gauge(
+    "db_connections_in_use",
+    "Connections checked out from the pool"
+)
+slow_queries = Counter(
+    "db_slow_queries_total",
+    "SQL statements slower than the slow query threshold"
+)
+repeated_statements = Counter(
+    "db_repeated_statements_total",
+    "SQL statements repeated too often by a single request (N+1 queries)"
+)
+
+
+# SQL statements executed while handling a request
+class QueryStats:
+
+    __slots__ = ("method", "path", "queries", "duration", "statements")
+
+    def __init__(self, method: str = None, path: str = None):
+        self.method = method
+        self.path = path
+        self.queries = 0
+        self.duration = 0.0
+        # Statement -> times it was executed. Only created once needed
+        self.statements = None
+
+    def __str__(self):
+        if self.method is None:
+            return "a request"
+        return f"{self.method} {self.path}"
+
+    # Returns how many times the statement was executed so far
+    def add(self, statement: str, duration: float):
+        self.queries += 1
+        self.duration += duration
+        if self.statements is None:
+            self.statements = {}
+        executions = self.statements.get(statement, 0) + 1
+        self.statements[statement] = executions
+        return executions
+
+    # Statements executed at least 'threshold' times
+    def repeated_statements(
+        self,
+        threshold: int = REPEATED_STATEMENT_THRESHOLD
+    ):
+        return {
+            statement: executions
+            for statement, executions in (self.statements or {}).items()
+            if executions >= threshold
+        }
+
+
+current_query_stats = ContextVar("current_query_stats", default=None)
+
+
+# e.g. SELECT, INSERT
+def _operation(statement: str):
+    words = statement.split(None, 1)
+    return words[0].upper() if words else "SQL"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if tracer.enabled:
+        conn.info["query_span"] = tracer.start_span(
+            _operation(statement),
+            {
+                "db.system": conn.dialect.name,
+                "db.statement": statement[:MAX_TRACED_STATEMENT_LENGTH],
+            },
+            kind=CLIENT
+        )
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    duration = time.perf_counter() - conn.info.pop(
+        "query_started_at",
+        time.perf_counter()
+    )
+    conn.info.pop("query_span", NOOP_SPAN).end()
+    sql_queries.inc()
+    sql_duration.observe(duration)
+    query_stats = current_query_stats.get()
+
+    if duration >= SLOW_QUERY_THRESHOLD:
+        slow_queries.inc()
+        logger.warning(
+            "Slow SQL statement (%.3fs) executed by %s: %s " +
+            "[parameters: %s]", duration, query_stats or "a background task",
+            Truncated(statement), redact_parameters(parameters, executemany)
+        )
+
+    if query_stats is not None \
+            and query_stats.add(statement, duration) \
+            == REPEATED_STATEMENT_THRESHOLD:
+        # Only logged once per statement and request
+        repeated_statements.inc()
+        logger.warning(
+            "SQL statement executed %d times by %s, which suggests N+1 " +
+            "queries: %s", REPEATED_STATEMENT_THRESHOLD, query_stats,
+            Truncated(statement)
+        )
+
+
+# Parameters are replaced by their types, e.g. (<int>, <str>)
+def redact_parameters(parameters, executemany: bool = False):
+    if executemany:
+        return f"{len(parameters)} parameter sets"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(
+            f"{name}: <{type(value).__name__}>"
+            for name, value in parameters.items()
+        ) + "}"
+    return "(" + ", ".join(
+        f"<{type(value).__name__}>" for value in parameters or ()
+    ) + ")"
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is None:
+        return
+    span = connection.info.pop("query_span", NOOP_SPAN)
+    span.set_error(exception_context.original_exception)
+    span.end()
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    connections_in_use.inc()
+
+
+def _checkin(dbapi_connection, connection_record):
+    connections_in_use.dec()
+
+
+# The pool has no event fired before a checkout, so its connect is wrapped to
+# time the wait
+def _instrument_pool(pool):
+    connect = pool.connect
+
+    def timed_connect():
+        started_at = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started_at)
+
+    pool.connect = timed_connect
+
+
+def _engine_disposed(engine: Engine):
+    # Disposing the engine replaces its pool
+    _instrument_pool(engine.pool)
+
+
+def instrument_engine(engine: Engine):
+    if event.contains(engine, "before_cursor_execute",
+                      _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine, "checkout", _checkout)
+    event.listen(engine, "checkin", _checkin)
+    event.listen(engine, "engine_disposed", _engine_disposed)
+    _instrument_pool(engine.pool)
@@ -6,17 +6,30 @@
 
 # generic imports
 from sqlalchemy import Boolean, Column, ForeignKey, String, DateTime
-from sqlalchemy import Integer
+from sqlalchemy import LargeBinary
+from sqlalchemy import Integer, Index, event, inspect
 
 # custom imports
 from database.database import Base
 
+# Marks a child collection that was not preloaded in bulk
+NOT_PRELOADED = object()
+
 
 class TimePeriod(Base):
     __tablename__ = "TimePeriod"
+    # Answers "active at"/"active between" queries: a range scan over the
+    # start, with the end checked from the same index entry
+    __table_args__ = (
+        Index(
+            "ix_TimePeriod_startDateTime_endDateTime",
+            "startDateTime",
+            "endDateTime",
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     startDateTime = Column(DateTime)
-    endDateTime = Column(DateTime)
+    endDateTime = Column(DateTime, index=True)
     deleted = Column(Boolean, default=False)
 
     def as_dict(self):
@@ -29,19 +42,22 @@ class TimePeriod(Base):
 class Organization(Base):
     __tablename__ = "Organization"
     id = Column(Integer, primary_key=True, index=True)
-    href = Column(String)
+    href = Column(String, index=True)
     isHeadOffice = Column(Boolean)
     isLegalEntity = Column(Boolean)
-    name = Column(String)
-    nameType = Column(String)
-    organizationType = Column(String)
-    tradingName = Column(String)
-    existsDuring = Column(Integer, ForeignKey("TimePeriod.id"))
-    status = Column(String, default="initialized")
+    name = Column(String, index=True)
+    nameType = Column(String, index=True)
+    organizationType = Column(String, index=True)
+    tradingName = Column(String, index=True)
+    existsDuring = Column(Integer, ForeignKey("TimePeriod.id"), index=True)
+    status = Column(String, default="initialized", index=True)
     _baseType = Column(String)
     _schemaLocation = Column(String)
     _type = Column(String)
     deleted = Column(Boolean, default=False)
+    # Value of the change sequence when the organization was last written
+    # (see ChangeSequence)
+    changeSeq = Column(Integer, index=True)
 
     def as_dict(self):
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
@@ -57,10 +73,24 @@ class Organization(Base):
     def set_db(self, db):
         self.db = db
 
+    # Children loaded in bulk (see crud.hydrate_organizations) are kept on the
+    # instance, so that the *Parsed properties don't need one query each
+    def preload(self, **children):
+        self.__dict__.setdefault("_preloaded", {}).update(children)
+
+    def clear_preloaded(self):
+        self.__dict__.pop("_preloaded", None)
+
+    def preloaded(self, child):
+        return self.__dict__.get("_preloaded", {}).get(child, NOT_PRELOADED)
+
     # This enables not having to create specific methods to get the
     # organization's party characteristics
     @property
     def partyCharacteristicParsed(self):
+        preloaded = self.preloaded("partyCharacteristicParsed")
+        if preloaded is not NOT_PRELOADED:
+            return preloaded
         if not self.db:
             return []
         return self.db\
@@ -73,6 +103,9 @@ class Organization(Base):
     # organization's time period
     @property
     def existsDuringParsed(self):
+        preloaded = self.preloaded("existsDuringParsed")
+        if preloaded is not NOT_PRELOADED:
+            return preloaded
         if not self.db:
             return
         return self.db\
@@ -85,6 +118,9 @@ class Organization(Base):
     # organization's authorized users
     @property
     def authorizedUsersParsed(self):
+        preloaded = self.preloaded("authorizedUsersParsed")
+        if preloaded is not NOT_PRELOADED:
+            return preloaded
         if not self.db:
             return []
         return self.db\
@@ -96,6 +132,18 @@ class Organization(Base):
 
 class Characteristic(Base):
     __tablename__ = "Characteristic"
+    # Looks up the organizations owning a characteristic (e.g. a given
+    # ci_cd_agent_url). The organization is included, so that the lookup is
+    # answered by the index alone
+    __table_args__ = (
+        Index(
+            "ix_Characteristic_name_value_deleted_organization",
+            "name",
+            "value",
+            "deleted",
+            "organization",
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     valueType = Column(String)
@@ -103,7 +151,8 @@ class Characteristic(Base):
     organization = Column(
         Integer,
         ForeignKey("Organization.id"),
-        nullable=False
+        nullable=False,
+        index=True
     )
     _baseType = Column(String)
     _schemaLocation = Column(String)
@@ -119,6 +168,16 @@ class Characteristic(Base):
 
 class OrganizationAuthorizedUsers(Base):
     __tablename__ = "OrganizationAuthorizedUsers"
+    # Used to answer "which organizations can this user access" with a
+    # single index range scan
+    __table_args__ = (
+        Index(
+            "ix_OrganizationAuthorizedUsers_user_id_deleted_organization",
+            "user_id",
+            "deleted",
+            "organization",
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, nullable=False)
     organization = Column(
@@ -150,15 +209,213 @@ class OrganizationAuthorizedUsers(Base):
             return []
         organization_model = Organization
         organization_model.set_db(self.db)
-        return [
-            self.db
-                .query(organization_model)
-                .filter(organization_model.id == organization.id)
-                .first()
-            for organization
-            in self.db
-                .query(OrganizationAuthorizedUsers)
-                .filter(OrganizationAuthorizedUsers.user_id == self.user_id)
-                .filter(OrganizationAuthorizedUsers.deleted == bool(False))
-                .all()
-        ]
+        return self.db\
+            .query(organization_model)\
+            .join(
+                OrganizationAuthorizedUsers,
+                OrganizationAuthorizedUsers.organization
+                == organization_model.id
+            )\
+            .filter(OrganizationAuthorizedUsers.user_id == self.user_id)\
+            .filter(OrganizationAuthorizedUsers.deleted == bool(False))\
+            .filter(organization_model.deleted == bool(False))\
+            .distinct()\
+            .order_by(organization_model.id)\
+            .all()
+
+
+# TMF632 document of each organization, serialized when the organization is
+# written, so that reads don't have to rebuild it
+class OrganizationDocument(Base):
+    __tablename__ = "OrganizationDocument"
+    organization = Column(
+        Integer,
+        ForeignKey("Organization.id"),
+        primary_key=True
+    )
+    # Version of the serialization that produced the document. Documents
+    # from other versions are ignored until rebuilt
+    version = Column(Integer, nullable=False)
+    document = Column(LargeBinary, nullable=False)
+
+    def as_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def __str__(self):
+        return str(self.as_dict())
+
+
+# Listeners registered in the TMF632 event hub
+class EventSubscription(Base):
+    __tablename__ = "EventSubscription"
+    id = Column(Integer, primary_key=True, index=True)
+    callback = Column(String, nullable=False)
+    query = Column(String)
+    deleted = Column(Boolean, default=False)
+
+    def as_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def __str__(self):
+        return str(self.as_dict())
+
+
+# Global, monotonic sequence of the organizations' changes. It is a single
+# row, incremented in the transaction of each change, so that writers are
+# serialized on it: once a value is committed, so are all the changes
+# stamped with lower values, which lets readers sync from a given value
+# without missing any change
+class ChangeSequence(Base):
+    __tablename__ = "ChangeSequence"
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+    def as_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def __str__(self):
+        return str(self.as_dict())
+
+
+CHANGE_SEQUENCE_ID = 1
+
+
+@event.listens_for(ChangeSequence.__table__, "after_create")
+def _initialize_change_sequence(table, connection, **kwargs):
+    connection.execute(
+        table.insert().values(id=CHANGE_SEQUENCE_ID, value=0)
+    )
+
+
+# Transactional outbox. Events are written in the same transaction as the
+# mutation that caused them, and deleted by the relay once delivered. The
+# primary key gives their order
+class OutboxEvent(Base):
+    __tablename__ = "OutboxEvent"
+    id = Column(Integer, primary_key=True, index=True)
+    # Events of the same organization are delivered in order
+    organization = Column(Integer, nullable=False)
+    eventType = Column(String, nullable=False)
+    # Encoded notification, delivered as is
+    body = Column(LargeBinary, nullable=False)
+    createdAt = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+
+    def as_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def __str__(self):
+        return str(self.as_dict())
+
+
+# Lease of the outbox relay. Only the relay holding it drains the outbox, so
+# that relays in several processes (e.g. uvicorn workers) don't deliver the
+# same events twice, or out of order. It is a single row, taken over once it
+# expires, if its holder died
+class OutboxRelayLease(Base):
+    __tablename__ = "OutboxRelayLease"
+    id = Column(Integer, primary_key=True)
+    owner = Column(String)
+    expiresAt = Column(DateTime)
+
+    def as_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+    def __str__(self):
+        return str(self.as_dict())
+
+
+OUTBOX_RELAY_LEASE_ID = 1
+
+
+@event.listens_for(OutboxRelayLease.__table__, "after_create")
+def _initialize_outbox_relay_lease(table, connection, **kwargs):
+    connection.execute(
+        table.insert().values(id=OUTBOX_RELAY_LEASE_ID)
+    )
+
+
+# Full-text search over the organizations' name and tradingName.
+# SQLite keeps them in an FTS5 table, which the crud write paths update in the
+# same transaction as the organization. Postgres uses a GIN index over a
+# tsvector expression, which the database maintains by itself
+ORGANIZATION_SEARCH_TABLE = "OrganizationSearch"
+ORGANIZATION_SEARCH_INDEX = "ix_Organization_search"
+ORGANIZATION_SEARCH_DOCUMENT = "to_tsvector('simple', " +\
+    "coalesce(name, '') || ' ' || coalesce(\"tradingName\", ''))"
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_organization_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS " +
+            f"\"{ORGANIZATION_SEARCH_TABLE}\" USING fts5(" +
+            "name, tradingName, tokenize='unicode61 remove_diacritics 2')"
+        )
+        # Backfill databases created before the search table existed
+        indexed = connection.exec_driver_sql(
+            f"SELECT COUNT(*) FROM \"{ORGANIZATION_SEARCH_TABLE}\""
+        ).scalar()
+        if not indexed:
+            connection.exec_driver_sql(
+                f"INSERT INTO \"{ORGANIZATION_SEARCH_TABLE}\"" +
+                "(rowid, name, tradingName) " +
+                "SELECT id, name, \"tradingName\" FROM \"Organization\" " +
+                "WHERE deleted = 0"
+            )
+    elif connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS \"{ORGANIZATION_SEARCH_INDEX}\" " +
+            f"ON \"Organization\" USING gin (({ORGANIZATION_SEARCH_DOCUMENT}))"
+        )
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_organization_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(
+            f"DROP TABLE IF EXISTS \"{ORGANIZATION_SEARCH_TABLE}\""
+        )
+
+
+# Adds the Organization.changeSeq column to the databases created before it
+# existed, since create_all doesn't alter existing tables. The existing
+# organizations are stamped in id order, as if each had changed once, and the
+# change sequence continues after them. Runs before the indexes are created
+@event.listens_for(Base.metadata, "after_create")
+def add_organization_change_seq(target, connection, **kw):
+    inspector = inspect(connection)
+    if Organization.__tablename__ not in inspector.get_table_names():
+        return
+    columns = {
+        column["name"]
+        for column in inspector.get_columns(Organization.__tablename__)
+    }
+    if "changeSeq" in columns:
+        return
+    connection.exec_driver_sql(
+        "ALTER TABLE \"Organization\" ADD COLUMN \"changeSeq\" INTEGER"
+    )
+    connection.exec_driver_sql(
+        "UPDATE \"Organization\" SET \"changeSeq\" = id"
+    )
+    connection.exec_driver_sql(
+        "UPDATE \"ChangeSequence\" SET value = " +
+        "(SELECT COALESCE(MAX(\"changeSeq\"), 0) FROM \"Organization\") " +
+        f"WHERE id = {CHANGE_SEQUENCE_ID}"
+    )
+
+
+# create_all only creates the indexes of the tables it creates. Those added
+# to existing tables are created here, so that upgraded databases get them
+# too, instead of silently scanning the tables
+@event.listens_for(Base.metadata, "after_create")
+def create_missing_indexes(target, connection, **kw):
+    # Not only the tables create_all just created, which it passes in kw
+    existing_tables = set(inspect(connection).get_table_names())
+    for table in target.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-06 09:31:17
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-06 18:05:42
+
+# Change feed of the organizations, pushed to the clients of
+# GET /organization/changes (Server-Sent Events, or long polling).
+#
+# The mutations in crud.py publish a change once committed. Publishing only
+# hands the change to the event loop, where a single fan-out task puts it in
+# the queue of each connection interested in it. Connections are indexed by
+# organization, so that a change only costs work for the connections that
+# follow that organization, however many idle connections there are.
+#
+# Recent changes are kept in a ring buffer, so that reconnecting clients
+# (Last-Event-ID) and long polling clients don't miss the changes published
+# in between. Clients that fall further behind are told to reset, i.e. to
+# fetch the organizations again.
+#
+# Changes are only seen by the connections of the process that committed
+# them. Their ids are qualified by the process' epoch ('<epoch>-<sequence>'),
+# so that clients resuming from an id of another process (e.g. before a
+# restart, or another worker) are told to reset, instead of silently missing
+# changes.
+
+# general imports
+import asyncio
+import logging
+import threading
+import uuid
+from collections import deque
+
+# custom imports
+from aux import media_types as MediaTypes
+from events import organization_events as OrganizationEvents
+
+# Logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 10000
+# Changes queued per connection. Connections that don't keep up are closed
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 1000
+HEARTBEAT_INTERVAL = 15  # seconds
+
+SSE_MEDIA_TYPE = "text/event-stream"
+RESET_EVENT = "reset"
+
+
+def format_event_id(epoch: str, sequence: int):
+    return f"{epoch}-{sequence}"
+
+
+class Change:
+
+    def __init__(self, sequence: int, organization_id: int, event_type: str,
+                 user_id: str = None, epoch: str = ""):
+        self.sequence = sequence
+        self.event_id = format_event_id(epoch, sequence)
+        self.organization_id = organization_id
+        self.event_type = event_type
+        # Set on the authorized users' changes
+        self.user_id = user_id
+
+    def as_dict(self):
+        event = {"organization": {"id": str(self.organization_id)}}
+        if self.user_id is not None:
+            event["authorizedUser"] = {"userId": self.user_id}
+        return {
+            "eventId": self.event_id,
+            "eventType": self.event_type,
+            "event": event,
+        }
+
+
+# A connection to the change feed. 'organization_ids' are the organizations
+# it follows, or None for all of them. Connections of users that follow all
+# the organizations they are authorized for also follow their authorizations.
+# Without a 'last_event_id', only the changes published after the connection
+# subscribed are sent
+class ChangeSubscriber:
+
+    def __init__(self, organization_ids: set = None, user_id: str = None,
+                 follows_authorizations: bool = False,
+                 last_event_id: str = None,
+                 max_queue_size: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE):
+        self.organization_ids = organization_ids
+        self.user_id = user_id
+        self.follows_authorizations = follows_authorizations
+        self.last_event_id = last_event_id
+        # Set when subscribing
+        self.last_sequence = None
+        self.overflowed = False
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+
+    def follows(self, organization_id: int):
+        return self.organization_ids is None \
+            or organization_id in self.organization_ids
+
+    def put(self, change: Change):
+        if change.sequence <= self.last_sequence or self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(change)
+            self.last_sequence = change.sequence
+        except asyncio.QueueFull:
+            # The connection isn't waiting on a full queue, so it notices
+            # the overflow on its next get
+            self.overflowed = True
+
+    # Waits for the next change, for up to 'timeout' seconds. Returns None on
+    # timeout
+    async def get(self, timeout: float = None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    # Changes already queued, without waiting
+    def get_queued(self):
+        changes = []
+        while not self.queue.empty():
+            changes.append(self.queue.get_nowait())
+        return changes
+
+
+class ChangeBroadcaster:
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.sequence = 0
+        # Sequences restart with the process
+        self.epoch = uuid.uuid4().hex[:12]
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._inbox = None
+        self._task = None
+        self._all_organizations = set()
+        self._by_organization = {}
+        self._by_user = {}
+
+    @property
+    def subscribers(self):
+        return len(self._all_organizations) + len({
+            subscriber
+            for subscribers in self._by_organization.values()
+            for subscriber in subscribers
+        })
+
+    # May be called from any thread, e.g. by crud.py after a commit
+    def publish(self, organization_id: int, event_type: str,
+                user_id: str = None):
+        with self._lock:
+            self.sequence += 1
+            change = Change(self.sequence, organization_id, event_type,
+                            user_id, self.epoch)
+            self._buffer.append(change)
+            loop, inbox = self._loop, self._inbox
+        if loop is None:
+            return change
+        try:
+            loop.call_soon_threadsafe(inbox.put_nowait, change)
+        except RuntimeError:
+            # The loop was closed. Changes are published to the connections
+            # of the next one from the buffer
+            pass
+        return change
+
+    def event_id(self, sequence: int):
+        return format_event_id(self.epoch, sequence)
+
+    # Sequence of an event id published by this broadcaster, or None if it
+    # wasn't: from another epoch, ahead of the sequence, or malformed
+    def sequence_of(self, event_id: str):
+        epoch, _, sequence = event_id.rpartition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self._lock:
+            return sequence if sequence <= self.sequence else None
+
+    # Buffered changes after 'sequence' (the current sequence if None), and
+    # that sequence. The flag tells if some changes in between were already
+    # dropped from the buffer
+    def changes_after(self, sequence: int = None):
+        with self._lock:
+            if sequence is None:
+                return [], self.sequence, False
+            changes = [
+                change for change in self._buffer
+                if change.sequence > sequence
+            ]
+            oldest_sequence = self._buffer[0].sequence if self._buffer \
+                else self.sequence + 1
+        return changes, sequence, sequence + 1 < oldest_sequence
+
+    def _ensure_fan_out(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is loop:
+                return
+            self._loop = loop
+            self._inbox = asyncio.Queue()
+            inbox = self._inbox
+        self._task = loop.create_task(self._fan_out(inbox))
+
+    async def _fan_out(self, inbox: asyncio.Queue):
+        while True:
+            change = await inbox.get()
+            try:
+                self._deliver(change)
+            except Exception as exception:
+                logger.error(f"Impossible to fan out change {change}: " +
+                             f"{exception}")
+
+    def _deliver(self, change: Change):
+        if change.event_type == \
+                OrganizationEvents.AUTHORIZED_USER_CREATE_EVENT:
+            self._follow(change.user_id, change.organization_id)
+
+        for subscriber in list(self._all_organizations):
+            subscriber.put(change)
+        for subscriber in list(
+            self._by_organization.get(change.organization_id, ())
+        ):
+            subscriber.put(change)
+
+        if change.event_type == \
+                OrganizationEvents.AUTHORIZED_USER_DELETE_EVENT:
+            self._unfollow(change.user_id, change.organization_id)
+
+    def _index(self, subscriber: ChangeSubscriber, organization_id: int):
+        self._by_organization.setdefault(organization_id, set())\
+            .add(subscriber)
+
+    def _unindex(self, subscriber: ChangeSubscriber, organization_id: int):
+        subscribers = self._by_organization.get(organization_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._by_organization[organization_id]
+
+    def _follow(self, user_id: str, organization_id: int):
+        for subscriber in self._by_user.get(user_id, ()):
+            if subscriber.follows_authorizations \
+                    and organization_id not in subscriber.organization_ids:
+                subscriber.organization_ids.add(organization_id)
+                self._index(subscriber, organization_id)
+
+    def _unfollow(self, user_id: str, organization_id: int):
+        for subscriber in self._by_user.get(user_id, ()):
+            if subscriber.organization_ids is not None \
+                    and organization_id in subscriber.organization_ids:
+                subscriber.organization_ids.discard(organization_id)
+                self._unindex(subscriber, organization_id)
+
+    # Must be called from the event loop. Changes after the subscriber's last
+    # event, still buffered, are queued right away. Returns whether some
+    # changes were missed: already dropped from the buffer, or the last event
+    # wasn't published by this broadcaster
+    def subscribe(self, subscriber: ChangeSubscriber):
+        self._ensure_fan_out()
+        if subscriber.organization_ids is None:
+            self._all_organizations.add(subscriber)
+        else:
+            for organization_id in subscriber.organization_ids:
+                self._index(subscriber, organization_id)
+        if subscriber.user_id is not None:
+            self._by_user.setdefault(subscriber.user_id, set())\
+                .add(subscriber)
+
+        last_sequence = None
+        if subscriber.last_event_id is not None:
+            last_sequence = self.sequence_of(subscriber.last_event_id)
+        changes, subscriber.last_sequence, missed_changes = \
+            self.changes_after(last_sequence)
+        if subscriber.last_event_id is not None and last_sequence is None:
+            missed_changes = True
+        for change in changes:
+            if subscriber.follows(change.organization_id):
+                subscriber.put(change)
+        return missed_changes
+
+    def unsubscribe(self, subscriber: ChangeSubscriber):
+        self._all_organizations.discard(subscriber)
+        for organization_id in list(subscriber.organization_ids or ()):
+            self._unindex(subscriber, organization_id)
+        subscribers = self._by_user.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._by_user[subscriber.user_id]
+
+
+change_broadcaster = ChangeBroadcaster()
+
+
+def encode_sse(change: Change = None, event: str = None, data: dict = None):
+    if change is not None:
+        return b"id: " + change.event_id.encode() + \
+            b"\nevent: " + change.event_type.encode() + \
+            b"\ndata: " + MediaTypes.encode_json(change.as_dict()) + b"\n\n"
+    return b"event: " + event.encode() + \
+        b"\ndata: " + MediaTypes.encode_json(data or {}) + b"\n\n"
+
+
+SSE_HEARTBEAT = b": heartbeat\n\n"
+
+
+# Server-Sent Events stream of the subscriber's changes, until the client
+# disconnects or the subscriber overflows
+async def iter_sse(request, subscriber: ChangeSubscriber,
+                   broadcaster: ChangeBroadcaster = change_broadcaster,
+                   heartbeat_interval: float = HEARTBEAT_INTERVAL):
+    try:
+        if broadcaster.subscribe(subscriber):
+            yield encode_sse(event=RESET_EVENT)
+        while True:
+            change = await subscriber.get(heartbeat_interval)
+            if subscriber.overflowed:
+                yield encode_sse(event=RESET_EVENT)
+                return
+            if await request.is_disconnected():
+                return
+            if change is None:
+                yield SSE_HEARTBEAT
+                continue
+            yield encode_sse(change)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+# Long polling. Waits for up to 'timeout' seconds for the subscriber's first
+# change, and returns it along with the ones already queued
+async def poll(subscriber: ChangeSubscriber, timeout: float,
+               broadcaster: ChangeBroadcaster = change_broadcaster):
+    try:
+        missed_changes = broadcaster.subscribe(subscriber)
+        changes = subscriber.get_queued()
+        if not changes and not missed_changes:
+            change = await subscriber.get(timeout)
+            # Let the changes published along with it be fanned out
+            await asyncio.sleep(0)
+            changes = ([change] if change is not None else []) + \
+                subscriber.get_queued()
+    finally:
+        broadcaster.unsubscribe(subscriber)
+    return {
+        "changes": [change.as_dict() for change in changes],
+        "lastEventId": broadcaster.event_id(subscriber.last_sequence),
+        "reset": missed_changes or subscriber.overflowed,
+    }
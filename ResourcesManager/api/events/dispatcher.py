@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-03 10:05:44
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-03 18:21:30
+
+# Asynchronous delivery of notifications to the hub's listeners.
+#
+# Publishing only puts the notification in a bounded in-process queue and
+# never blocks: when the queue is full, the notification is dropped (and
+# counted). Worker threads POST the notifications to the listeners' callbacks
+# through pooled HTTP connections, retrying with exponential backoff.
+#
+# Notifications are sharded across the workers by key (e.g. the organization's
+# id), so that those of the same resource are delivered in order.
+#
+# Callers that need to know the outcome (e.g. the outbox relay) pass an
+# 'on_done' callback, called with whether the notification was delivered, and
+# may cancel notifications still queued through 'is_cancelled'.
+
+# general imports
+import logging
+import queue
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE_SIZE = 10000
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds, doubled on each retry
+DEFAULT_TIMEOUT = 5  # seconds
+
+# Statuses worth retrying. Other errors are the listener's
+RETRYABLE_STATUS_CODES = [408, 429, 500, 502, 503, 504]
+
+_STOP = object()
+
+
+class Notification:
+
+    def __init__(self, callback: str, body: bytes, key=None,
+                 content_type: str = "application/json",
+                 on_done=None, is_cancelled=None):
+        self.callback = callback
+        self.body = body
+        self.key = key
+        self.content_type = content_type
+        self.on_done = on_done
+        self.is_cancelled = is_cancelled
+
+    def done(self, delivered: bool):
+        if self.on_done is None:
+            return
+        try:
+            self.on_done(delivered)
+        except Exception as exception:
+            logger.error("Notification callback failed: " +
+                         f"{exception}")
+
+
+class EventDispatcher:
+
+    def __init__(self, workers: int = DEFAULT_WORKERS,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 session_factory=None):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session_factory = session_factory or self._create_session
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queues = [
+            queue.Queue(maxsize=max(1, max_queue_size // workers))
+            for _ in range(workers)
+        ]
+        self._threads = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return bool(self._threads)
+
+    @property
+    def pending(self):
+        return sum(q.qsize() for q in self._queues)
+
+    # Each worker keeps its own session, and so its own connection pool
+    def _create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for shard, shard_queue in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(shard_queue,),
+                    name=f"event-dispatcher-{shard}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    # Waits for the queued notifications to be delivered, for up to 'timeout'
+    # seconds, and stops the workers
+    def stop(self, timeout: float = None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for shard_queue in self._queues:
+            try:
+                shard_queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+        for thread in threads:
+            thread.join(
+                None if deadline is None
+                else max(0, deadline - time.monotonic())
+            )
+
+    def publish(self, notification: Notification):
+        self.start()
+        shard = hash(notification.key) % self.workers
+        try:
+            self._queues[shard].put_nowait(notification)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning("Event queue is full. Dropped notification to " +
+                           f"{notification.callback}")
+            notification.done(False)
+            return False
+
+    def _work(self, shard_queue: queue.Queue):
+        session = self.session_factory()
+        try:
+            while True:
+                notification = shard_queue.get()
+                try:
+                    if notification is _STOP:
+                        return
+                    if notification.is_cancelled is not None \
+                            and notification.is_cancelled():
+                        notification.done(False)
+                        continue
+                    notification.done(
+                        self._deliver(session, notification)
+                    )
+                finally:
+                    shard_queue.task_done()
+        finally:
+            session.close()
+
+    def _deliver(self, session, notification: Notification):
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff, with jitter
+                time.sleep(
+                    self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1)
+                )
+            try:
+                response = session.post(
+                    notification.callback,
+                    data=notification.body,
+                    headers={"Content-Type": notification.content_type},
+                    timeout=self.timeout
+                )
+            except requests.RequestException as exception:
+                logger.warning(f"Notification to {notification.callback} " +
+                               f"failed (attempt {attempt + 1}): {exception}")
+                continue
+            if response.status_code < 400:
+                with self._lock:
+                    self.delivered += 1
+                return True
+            logger.warning(f"Notification to {notification.callback} " +
+                           f"failed (attempt {attempt + 1}): HTTP " +
+                           f"{response.status_code}")
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                break
+
+        with self._lock:
+            self.failed += 1
+        logger.error("Gave up delivering notification to " +
+                     f"{notification.callback}")
+        return False
+
+    # Blocks until all the queued notifications were handled. Mostly useful
+    # in tests
+    def join(self):
+        for shard_queue in self._queues:
+            shard_queue.join()
+
+
+event_dispatcher = EventDispatcher()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-03 14:48:19
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-04 11:36:52
+
+# TMF632 organization events, and the hub's listeners they are delivered to.
+#
+# The events are encoded when the mutations in crud.py record them in the
+# outbox (see events/outbox.py). They embed the organization's precomputed
+# document, so that recording an event costs no serialization of the
+# organization.
+
+# general imports
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+from sqlalchemy.orm import Session
+
+# custom imports
+from database.models import models
+from database.crud.exceptions import InvalidQueryParameter
+from aux import media_types as MediaTypes
+
+# Logger
+logger = logging.getLogger(__name__)
+
+ORGANIZATION_CREATE_EVENT = "OrganizationCreateEvent"
+ORGANIZATION_ATTRIBUTE_VALUE_CHANGE_EVENT = \
+    "OrganizationAttributeValueChangeEvent"
+ORGANIZATION_STATE_CHANGE_EVENT = "OrganizationStateChangeEvent"
+ORGANIZATION_DELETE_EVENT = "OrganizationDeleteEvent"
+# Not part of TMF632. Authorizations are specific to VPilot
+AUTHORIZED_USER_CREATE_EVENT = "OrganizationAuthorizedUserCreateEvent"
+AUTHORIZED_USER_DELETE_EVENT = "OrganizationAuthorizedUserDeleteEvent"
+
+EVENT_TYPES = [
+    ORGANIZATION_CREATE_EVENT,
+    ORGANIZATION_ATTRIBUTE_VALUE_CHANGE_EVENT,
+    ORGANIZATION_STATE_CHANGE_EVENT,
+    ORGANIZATION_DELETE_EVENT,
+    AUTHORIZED_USER_CREATE_EVENT,
+    AUTHORIZED_USER_DELETE_EVENT,
+]
+
+EVENT_DOMAIN = "PartyManagement"
+
+# For how long, in seconds, subscriptions are cached. They are also reloaded
+# whenever a subscription is created or deleted by this process
+SUBSCRIPTIONS_CACHE_TTL = 10
+
+
+# Parses a subscription's query, e.g. 'eventType=OrganizationCreateEvent' or
+# 'eventType=OrganizationCreateEvent,OrganizationDeleteEvent'. Returns the
+# subscribed event types, or None if all of them are
+def parse_subscription_query(query: str = None):
+    if not query:
+        return None
+    parsed_query = parse_qs(query, keep_blank_values=True)
+    unsupported_parameters = set(parsed_query.keys()) - {"eventType"}
+    if unsupported_parameters:
+        raise InvalidQueryParameter(
+            "query",
+            f"filtering by {sorted(unsupported_parameters)} is not supported"
+        )
+    event_types = {
+        event_type
+        for values in parsed_query.get("eventType", [])
+        for event_type in values.split(",")
+        if event_type
+    }
+    unknown_event_types = event_types - set(EVENT_TYPES)
+    if unknown_event_types:
+        raise InvalidQueryParameter(
+            "query",
+            f"unknown event types {sorted(unknown_event_types)}"
+        )
+    return event_types or None
+
+
+class Listener:
+
+    def __init__(self, callback: str, event_types: set = None):
+        self.callback = callback
+        self.event_types = event_types
+
+    def accepts(self, event_type: str):
+        return self.event_types is None or event_type in self.event_types
+
+
+class SubscriptionsCache:
+
+    def __init__(self, ttl: float = SUBSCRIPTIONS_CACHE_TTL):
+        self.ttl = ttl
+        self._listeners = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session):
+        with self._lock:
+            if self._listeners is not None \
+                    and self._expires_at > time.monotonic():
+                return self._listeners
+
+        listeners = []
+        for subscription in db\
+                .query(models.EventSubscription)\
+                .filter(models.EventSubscription.deleted == bool(False)):
+            try:
+                event_types = parse_subscription_query(subscription.query)
+            except InvalidQueryParameter:
+                continue
+            listeners.append(Listener(subscription.callback, event_types))
+
+        with self._lock:
+            self._listeners = listeners
+            self._expires_at = time.monotonic() + self.ttl
+        return listeners
+
+    def invalidate(self):
+        with self._lock:
+            self._listeners = None
+
+
+subscriptions_cache = SubscriptionsCache()
+
+
+# The event is given already JSON encoded, and spliced into the envelope.
+# Its id lets listeners drop the duplicates at-least-once delivery may cause
+def encode_event(event_type: str, event: bytes):
+    now = datetime.now(timezone.utc).isoformat()
+    envelope = MediaTypes.encode_json({
+        "eventId": uuid.uuid4().hex,
+        "eventTime": now,
+        "timeOcurred": now,
+        "eventType": event_type,
+        "domain": EVENT_DOMAIN,
+        "title": event_type,
+    })
+    return envelope[:-1] + b',"event":' + event + b'}'
+
+
+def encode_organization_event(event_type: str, organization_document: bytes):
+    return encode_event(
+        event_type,
+        b'{"organization":' + organization_document + b'}'
+    )
+
+
+def encode_authorized_user_event(event_type: str, user_id: str,
+                                 organization_id: int):
+    return encode_event(
+        event_type,
+        MediaTypes.encode_json({
+            "authorizedUser": {
+                "userId": user_id,
+                "organization": organization_id,
+            }
+        })
+    )
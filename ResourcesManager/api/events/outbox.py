@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-05 09:12:40
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-05 17:44:03
+
+# Transactional outbox of the organizations' events.
+#
+# The mutations in crud.py record their events in the OutboxEvent table, in
+# the same transaction as the mutation itself: a rolled back mutation leaves
+# no event behind, and a committed one can't lose its events if the process
+# crashes right after the commit.
+#
+# A relay thread drains the outbox in batches, handing the notifications to
+# the event dispatcher, and only deletes an event once it was delivered to all
+# the listeners. Delivery is therefore at-least-once: listeners may get
+# duplicates, which they can drop by the event's id.
+#
+# The events of an organization are delivered in order. Once one of them
+# fails, the following events of the same organization are held back, and
+# retried after it, on the next batch. Events that keep failing are dropped
+# after MAX_ATTEMPTS batches, so that they don't hold the organization back
+# forever.
+#
+# Only one relay drains the outbox at a time, across processes: it must hold
+# the lease (the OutboxRelayLease row) while it relays, and renews it before
+# each batch. A batch whose notifications aren't all handled within
+# batch_timeout (e.g. the dispatcher was stopped) is given up: its pending
+# notifications are cancelled, and their events retried on the next batch.
+
+# general imports
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+# custom imports
+from database.models import models
+from database.database import SessionLocal
+from events import dispatcher as Dispatcher
+from events.dispatcher import EventDispatcher, Notification
+from events import organization_events as OrganizationEvents
+
+# Logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_POLL_INTERVAL = 1  # seconds
+MAX_ATTEMPTS = 10
+DEFAULT_BATCH_TIMEOUT = 60  # seconds
+# Renewed before each batch, so it must outlast one
+DEFAULT_LEASE_DURATION = 2 * DEFAULT_BATCH_TIMEOUT + 30  # seconds
+# The relay warns when the oldest pending event is older than this
+LAG_WARNING_THRESHOLD = 60  # seconds
+
+
+def record_event(db: Session, event_type: str, organization_id: int,
+                 body: bytes):
+    db.add(
+        models.OutboxEvent(
+            organization=organization_id,
+            eventType=event_type,
+            body=body,
+            createdAt=datetime.utcnow(),
+            attempts=0
+        )
+    )
+
+
+class OutboxLag:
+
+    def __init__(self, pending: int, oldest_pending_age: float):
+        self.pending = pending
+        # In seconds. 0 when there are no pending events
+        self.oldest_pending_age = oldest_pending_age
+
+    def as_dict(self):
+        return {
+            "pending": self.pending,
+            "oldestPendingAge": self.oldest_pending_age,
+        }
+
+
+def get_outbox_lag(db: Session):
+    pending, oldest_created_at = db\
+        .query(
+            func.count(models.OutboxEvent.id),
+            func.min(models.OutboxEvent.createdAt)
+        )\
+        .one()
+    oldest_pending_age = 0
+    if oldest_created_at is not None:
+        oldest_pending_age = max(
+            0,
+            (datetime.utcnow() - oldest_created_at).total_seconds()
+        )
+    return OutboxLag(pending, oldest_pending_age)
+
+
+# Outcome of the notifications of a batch. Notifications of an organization
+# with a failed event are cancelled, so that its events stay in order
+class _OutboxBatch:
+
+    def __init__(self):
+        self.failed_events = set()
+        self.cancelled_events = set()
+        self.failed_organizations = set()
+        # Events with notifications not handled before the batch timed out
+        self.timed_out_events = set()
+        self.timed_out = False
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+    def add(self, event_id: int, organization_id: int):
+        with self._lock:
+            self._pending[event_id] = (
+                organization_id,
+                self._pending.get(event_id, (organization_id, 0))[1] + 1
+            )
+
+    # Callbacks of a notification of the event
+    def callbacks(self, event_id: int, organization_id: int):
+        cancelled = False
+
+        def is_cancelled():
+            nonlocal cancelled
+            with self._lock:
+                cancelled = self.timed_out or \
+                    organization_id in self.failed_organizations
+                if cancelled:
+                    self.cancelled_events.add(event_id)
+                return cancelled
+
+        def on_done(delivered: bool):
+            with self._lock:
+                if self.timed_out:
+                    return
+                if not delivered and not cancelled:
+                    self.failed_events.add(event_id)
+                    self.failed_organizations.add(organization_id)
+                _, pending = self._pending[event_id]
+                if pending == 1:
+                    del self._pending[event_id]
+                else:
+                    self._pending[event_id] = (organization_id, pending - 1)
+                self._done.notify_all()
+
+        return on_done, is_cancelled
+
+    def cancel(self, event_id: int):
+        with self._lock:
+            self.cancelled_events.add(event_id)
+
+    # Waits for the notifications to be handled. Returns False if they
+    # weren't within timeout seconds: the pending ones are then cancelled,
+    # and their events (and the following ones of their organizations) held
+    # back
+    def wait(self, timeout: float = None):
+        with self._lock:
+            if self._done.wait_for(lambda: not self._pending, timeout):
+                return True
+            self.timed_out = True
+            self.timed_out_events.update(self._pending)
+            self.failed_organizations.update(
+                organization_id
+                for organization_id, _ in self._pending.values()
+            )
+            return False
+
+
+class OutboxRelay:
+
+    def __init__(self, session_factory=SessionLocal,
+                 dispatcher: EventDispatcher = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 max_attempts: int = MAX_ATTEMPTS,
+                 batch_timeout: float = DEFAULT_BATCH_TIMEOUT,
+                 lease_duration: float = DEFAULT_LEASE_DURATION):
+        self.session_factory = session_factory
+        self.dispatcher = dispatcher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.batch_timeout = batch_timeout
+        self.lease_duration = lease_duration
+        # Identifies this relay as the holder of the lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:" +\
+            uuid.uuid4().hex[:8]
+        self.relayed = 0
+        self.failed = 0
+        self.discarded = 0
+        self.lag = OutboxLag(0, 0)
+        self._wake_up = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="outbox-relay",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        self._wake_up.set()
+        thread.join(timeout)
+
+    # Called after committing new events, so that they are relayed right
+    # away instead of on the next poll
+    def wake_up(self):
+        self._wake_up.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.relay_pending()
+                self.update_lag()
+            except Exception as exception:
+                logger.error("Outbox relay failed: %s", exception)
+            self._wake_up.wait(self.poll_interval)
+            self._wake_up.clear()
+
+    def update_lag(self):
+        db = self.session_factory()
+        try:
+            self.lag = get_outbox_lag(db)
+        finally:
+            db.close()
+        if self.lag.oldest_pending_age > LAG_WARNING_THRESHOLD:
+            logger.warning("Outbox relay is lagging: %d pending events, " +
+                           "the oldest from %.0fs ago", self.lag.pending,
+                           self.lag.oldest_pending_age)
+        return self.lag
+
+    # Takes the lease, or renews it if already held. Returns whether this
+    # relay holds it
+    def acquire_lease(self, db: Session):
+        now = datetime.utcnow()
+        acquired = db\
+            .query(models.OutboxRelayLease)\
+            .filter(
+                models.OutboxRelayLease.id == models.OUTBOX_RELAY_LEASE_ID
+            )\
+            .filter(or_(
+                models.OutboxRelayLease.owner == self.owner,
+                models.OutboxRelayLease.expiresAt.is_(None),
+                models.OutboxRelayLease.expiresAt < now
+            ))\
+            .update(
+                {
+                    "owner": self.owner,
+                    "expiresAt": now + timedelta(seconds=self.lease_duration)
+                },
+                synchronize_session=False
+            )
+        db.commit()
+        return acquired == 1
+
+    def release_lease(self, db: Session):
+        db\
+            .query(models.OutboxRelayLease)\
+            .filter(
+                models.OutboxRelayLease.id == models.OUTBOX_RELAY_LEASE_ID
+            )\
+            .filter(models.OutboxRelayLease.owner == self.owner)\
+            .update(
+                {"owner": None, "expiresAt": None},
+                synchronize_session=False
+            )
+        db.commit()
+
+    # Relays batches until the outbox is empty, or a batch had failures, if
+    # no other relay holds the lease. Returns how many events were relayed
+    def relay_pending(self):
+        relayed = 0
+        db = self.session_factory()
+        try:
+            if not self.acquire_lease(db):
+                logger.debug("The outbox is relayed by another relay")
+                return 0
+            try:
+                while True:
+                    batch_size, batch_relayed = self.relay_batch(db)
+                    relayed += batch_relayed
+                    if batch_size < self.batch_size \
+                            or batch_relayed < batch_size \
+                            or not self.acquire_lease(db):
+                        return relayed
+            finally:
+                self.release_lease(db)
+        finally:
+            db.close()
+
+    # Returns the size of the batch, and how many of its events were relayed
+    def relay_batch(self, db: Session):
+        # The lease keeps other relays out. On Postgres, the rows are locked
+        # until the batch is done too (SQLite ignores FOR UPDATE)
+        events = db\
+            .query(models.OutboxEvent)\
+            .order_by(models.OutboxEvent.id)\
+            .limit(self.batch_size)\
+            .with_for_update()\
+            .all()
+        if not events:
+            db.rollback()
+            return 0, 0
+
+        dispatcher = self.dispatcher or Dispatcher.event_dispatcher
+        listeners = OrganizationEvents.subscriptions_cache.get(db)
+        batch = _OutboxBatch()
+        for event in events:
+            if event.organization in batch.failed_organizations:
+                batch.cancel(event.id)
+                continue
+            for listener in listeners:
+                if not listener.accepts(event.eventType):
+                    continue
+                on_done, is_cancelled = batch.callbacks(
+                    event.id,
+                    event.organization
+                )
+                batch.add(event.id, event.organization)
+                dispatcher.publish(
+                    Notification(
+                        callback=listener.callback,
+                        body=event.body,
+                        key=event.organization,
+                        on_done=on_done,
+                        is_cancelled=is_cancelled
+                    )
+                )
+        if not batch.wait(self.batch_timeout):
+            logger.warning("Outbox batch timed out, with " +
+                           f"{len(batch.timed_out_events)} events still " +
+                           "being notified. They will be retried")
+
+        relayed = 0
+        for event in events:
+            if event.id in batch.timed_out_events:
+                # Not an attempt of the listeners: retried as is
+                continue
+            if event.id in batch.failed_events:
+                event.attempts += 1
+                self.failed += 1
+                if event.attempts >= self.max_attempts:
+                    logger.error("Discarding %s of the organization " +
+                                 "with id=%s, after %d failed attempts",
+                                 event.eventType, event.organization,
+                                 event.attempts)
+                    db.delete(event)
+                    self.discarded += 1
+            elif event.id not in batch.cancelled_events:
+                db.delete(event)
+                relayed += 1
+        db.commit()
+        self.relayed += relayed
+        return len(events), relayed
+
+
+outbox_relay = OutboxRelay()
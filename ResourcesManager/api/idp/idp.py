@@ -8,6 +8,7 @@ from fastapi_keycloak import FastAPIKeycloak
 import os
 import time
 from idp.exceptions import IDPVariablesNotDefined
+from tracing.tracer import tracer
 
 print(11)
 
@@ -49,4 +50,23 @@ while True:
             print("It was impossible to connect to Keycloak Server!")
             exit(1)
         print("Will try again in 10 seconds")
-        time.sleep(10)
\ No newline at end of file
+        time.sleep(10)
+
+
+# Traces the validation of the users' tokens, i.e. the dependencies returned
+# by get_current_user. Everything else is left to the wrapped IdP
+class TracedIDP:
+
+    def __init__(self, idp):
+        self.idp = idp
+
+    def __getattr__(self, name):
+        return getattr(self.idp, name)
+
+    def get_current_user(self, *args, **kwargs):
+        return tracer.traced("idp.get_current_user")(
+            self.idp.get_current_user(*args, **kwargs)
+        )
+
+
+idp = TracedIDP(idp)
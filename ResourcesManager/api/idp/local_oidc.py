@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-21 14:02:37
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-21 17:45:10
+
+# Local stand-in for the Keycloak realm used by the Resources Manager.
+#
+# It serves the few Keycloak endpoints FastAPIKeycloak relies on (realm
+# public key, OpenID configuration, JWKS and token endpoint) and issues RS256
+# signed tokens with the configured realm roles. Pointing IDP_SERVER_URL to it
+# lets the service run its real token verification path without a live
+# Keycloak, e.g. for load testing on a machine without network access.
+#
+# Usage:
+#   python -m idp.local_oidc serve --port 8180 --key-file local_oidc.pem
+#   python -m idp.local_oidc token admin --key-file local_oidc.pem
+#
+# Passwords are not verified: any password is accepted for a known user.
+
+# general imports
+import argparse
+import base64
+import hashlib
+import json
+import os
+import time
+import uuid
+import rsa
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Request,
+    status
+)
+from jose import jwk, jwt
+from urllib.parse import parse_qs
+
+# custom imports
+from aux.constants import IDP_ADMIN_USER, IDP_TESTBED_ADMIN_USER
+
+DEFAULT_REALM = "VPilot"
+DEFAULT_ISSUER_URL = "http://localhost:8180"
+DEFAULT_TOKEN_LIFETIME = 3600  # seconds
+DEFAULT_KEY_BITS = 2048
+DEFAULT_USERS = {
+    "admin": [IDP_ADMIN_USER, IDP_TESTBED_ADMIN_USER],
+    "testbed-admin": [IDP_TESTBED_ADMIN_USER],
+}
+
+# Audience FastAPIKeycloak verifies on user tokens
+TOKEN_AUDIENCE = "account"
+
+
+def load_or_create_private_key(key_file: str = None,
+                               key_bits: int = DEFAULT_KEY_BITS):
+    if key_file and os.path.exists(key_file):
+        with open(key_file, "r") as f:
+            return f.read()
+
+    _, private_key = rsa.newkeys(key_bits)
+    private_key_pem = private_key.save_pkcs1().decode()
+
+    # Persist the key, so that tokens issued from the CLI remain valid
+    # across restarts of the issuer
+    if key_file:
+        with open(key_file, "w") as f:
+            f.write(private_key_pem)
+
+    return private_key_pem
+
+
+# RFC 7638 thumbprint of an RSA JWK: the SHA-256 of its required members,
+# in lexicographic order and without whitespace, base64url encoded
+def jwk_thumbprint(public_jwk: dict):
+    members = {name: public_jwk[name] for name in ("e", "kty", "n")}
+    digest = hashlib.sha256(
+        json.dumps(members, sort_keys=True, separators=(",", ":")).encode()
+    ).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+class LocalOIDCIssuer:
+
+    def __init__(self, issuer_url: str = DEFAULT_ISSUER_URL,
+                 realm: str = DEFAULT_REALM, users: dict = None,
+                 private_key_pem: str = None,
+                 token_lifetime: int = DEFAULT_TOKEN_LIFETIME):
+        self.issuer_url = issuer_url.rstrip("/")
+        self.realm = realm
+        self.users = users if users is not None else dict(DEFAULT_USERS)
+        self.token_lifetime = token_lifetime
+        self.private_key_pem = private_key_pem or load_or_create_private_key()
+        public_key = jwk.construct(self.private_key_pem, "RS256")\
+            .public_key()
+        self.public_key_pem = public_key.to_pem().decode()
+        # Derived from the key, so that the tokens issued by the CLI, with
+        # the same key file, have the kid of the running issuer's JWKS
+        self.key_id = jwk_thumbprint(public_key.to_dict())
+
+    @property
+    def realm_uri(self):
+        return f"{self.issuer_url}/realms/{self.realm}"
+
+    @property
+    def token_uri(self):
+        return f"{self.realm_uri}/protocol/openid-connect/token"
+
+    # Keycloak exposes the public key as base64 encoded DER, without the PEM
+    # armor
+    @property
+    def public_key(self):
+        return "".join(
+            line
+            for line in self.public_key_pem.strip().splitlines()
+            if not line.startswith("-----")
+        )
+
+    @property
+    def jwks(self):
+        public_jwk = jwk.construct(self.private_key_pem, "RS256")\
+            .public_key()\
+            .to_dict()
+        public_jwk["kid"] = self.key_id
+        public_jwk["use"] = "sig"
+        return {"keys": [public_jwk]}
+
+    @property
+    def open_id_configuration(self):
+        open_id = f"{self.realm_uri}/protocol/openid-connect"
+        return {
+            "issuer": self.realm_uri,
+            "authorization_endpoint": f"{open_id}/auth",
+            "token_endpoint": f"{open_id}/token",
+            "end_session_endpoint": f"{open_id}/logout",
+            "jwks_uri": f"{open_id}/certs",
+            "grant_types_supported": ["password", "client_credentials"],
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+
+    @staticmethod
+    def user_id(username: str):
+        # Deterministic, so that authorized users can be set up beforehand
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"local-oidc/{username}"))
+
+    def _sign(self, claims: dict):
+        return jwt.encode(
+            claims,
+            self.private_key_pem,
+            algorithm="RS256",
+            headers={"kid": self.key_id}
+        )
+
+    def issue_token(self, username: str, roles: list = None,
+                    sub: str = None, lifetime: int = None):
+        if roles is None:
+            roles = self.users.get(username, [])
+        issued_at = int(time.time())
+        return self._sign({
+            "iss": self.realm_uri,
+            "aud": TOKEN_AUDIENCE,
+            "typ": "Bearer",
+            "sub": sub or self.user_id(username),
+            "iat": issued_at,
+            "exp": issued_at + (lifetime or self.token_lifetime),
+            "jti": uuid.uuid4().hex,
+            "scope": "openid profile email",
+            "email_verified": True,
+            "preferred_username": username,
+            "realm_access": {"roles": list(roles)},
+            "resource_access": {"account": {"roles": ["view-profile"]}},
+        })
+
+    # FastAPIKeycloak validates, on startup, that the admin-cli token grants
+    # access to both the realm-management and account resources
+    def issue_admin_token(self, client_id: str = "admin-cli"):
+        issued_at = int(time.time())
+        return self._sign({
+            "iss": self.realm_uri,
+            "typ": "Bearer",
+            "sub": self.user_id(f"service-account-{client_id}"),
+            "iat": issued_at,
+            "exp": issued_at + self.token_lifetime,
+            "jti": uuid.uuid4().hex,
+            "azp": client_id,
+            "resource_access": {
+                "realm-management": {"roles": ["realm-admin"]},
+                "account": {"roles": ["manage-account"]},
+            },
+        })
+
+    def token_response(self, access_token: str):
+        return {
+            "access_token": access_token,
+            "expires_in": self.token_lifetime,
+            "token_type": "Bearer",
+            "scope": "openid profile email",
+        }
+
+    def create_app(self):
+        app = FastAPI(title="VPilot Local OIDC Issuer")
+        realm_path = "/realms/{realm}"
+        open_id_path = realm_path + "/protocol/openid-connect"
+
+        def check_realm(realm: str):
+            if realm != self.realm:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Realm does not exist"
+                )
+
+        @app.get(realm_path)
+        def get_realm(realm: str):
+            check_realm(realm)
+            return {
+                "realm": self.realm,
+                "public_key": self.public_key,
+                "token-service": f"{self.realm_uri}/protocol/openid-connect",
+            }
+
+        @app.get(realm_path + "/.well-known/openid-configuration")
+        def get_open_id_configuration(realm: str):
+            check_realm(realm)
+            return self.open_id_configuration
+
+        @app.get(open_id_path + "/certs")
+        def get_jwks(realm: str):
+            check_realm(realm)
+            return self.jwks
+
+        # The form is parsed by hand, to avoid depending on python-multipart
+        @app.post(open_id_path + "/token")
+        async def create_token(realm: str, request: Request):
+            check_realm(realm)
+            form = {
+                key: values[0]
+                for key, values
+                in parse_qs((await request.body()).decode()).items()
+            }
+            grant_type = form.get("grant_type")
+            username = form.get("username")
+            if grant_type == "client_credentials":
+                return self.token_response(
+                    self.issue_admin_token(form.get("client_id", "admin-cli"))
+                )
+            if grant_type == "password" and username in self.users:
+                return self.token_response(self.issue_token(username))
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid user credentials"
+            )
+
+        return app
+
+
+def parse_users(user_args: list):
+    if not user_args:
+        return dict(DEFAULT_USERS)
+    users = {}
+    for user_arg in user_args:
+        username, _, roles = user_arg.partition("=")
+        users[username] = [role for role in roles.split(",") if role]
+    return users
+
+
+def main(args: list = None):
+    parser = argparse.ArgumentParser(
+        description="Local OIDC issuer standing in for Keycloak"
+    )
+    parser.add_argument("--realm", default=DEFAULT_REALM)
+    parser.add_argument("--issuer-url", default=None,
+                        help="Public base URL of the issuer. Defaults to " +
+                        "http://<host>:<port>")
+    parser.add_argument("--key-file", default=None,
+                        help="PEM file holding the signing key. Created if " +
+                        "it doesn't exist")
+    parser.add_argument("--user", action="append", dest="users",
+                        metavar="USERNAME=ROLE1,ROLE2",
+                        help="User and realm roles. May be repeated. " +
+                        f"Defaults to {DEFAULT_USERS}")
+    parser.add_argument("--token-lifetime", type=int,
+                        default=DEFAULT_TOKEN_LIFETIME)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve the issuer")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8180)
+
+    token_parser = subparsers.add_parser("token", help="Print a user token")
+    token_parser.add_argument("username")
+    token_parser.add_argument("--roles", default=None,
+                              help="Comma separated realm roles. Defaults " +
+                              "to the configured roles of the user")
+
+    parsed_args = parser.parse_args(args)
+    issuer_url = parsed_args.issuer_url or DEFAULT_ISSUER_URL
+    if parsed_args.command == "serve" and not parsed_args.issuer_url:
+        issuer_url = f"http://{parsed_args.host}:{parsed_args.port}"
+
+    issuer = LocalOIDCIssuer(
+        issuer_url=issuer_url,
+        realm=parsed_args.realm,
+        users=parse_users(parsed_args.users),
+        private_key_pem=load_or_create_private_key(parsed_args.key_file),
+        token_lifetime=parsed_args.token_lifetime
+    )
+
+    if parsed_args.command == "token":
+        roles = None
+        if parsed_args.roles is not None:
+            roles = [r for r in parsed_args.roles.split(",") if r]
+        print(issuer.issue_token(parsed_args.username, roles=roles))
+        return
+
+    import uvicorn
+    print(f"Local OIDC issuer for realm '{issuer.realm}' at " +
+          f"{issuer.realm_uri}")
+    for username, roles in issuer.users.items():
+        print(f"  user={username} sub={issuer.user_id(username)} " +
+              f"roles={roles}")
+    uvicorn.run(issuer.create_app(), host=parsed_args.host,
+                port=parsed_args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from fastapi import (
     HTTPException,
     status
 )
+import atexit
 import logging
 from logging.handlers import RotatingFileHandler
 from fastapi.exceptions import RequestValidationError
@@ -21,7 +22,23 @@ from database.database import SessionLocal
 from database.database import engine
 from database.models import models
 from routers import organizations_router
+from routers import hub_router
+from routers import metrics_router
+from routers import profiling_router
+from events.dispatcher import event_dispatcher
+from events.outbox import outbox_relay
 from routers import aux as RouterAux
+from middleware.compression import CompressionMiddleware
+from middleware.content_negotiation import ContentNegotiationMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.tracing import TracingMiddleware
+from database.instrumentation import instrument_engine
+from tracing.tracer import tracer
+from idp.idp import idp
+from aux.constants import IDP_ADMIN_USER
+from tracing.exporters import create_span_processor
+from aux.log_utils import setup_queue_logging
 
 # Logger
 logger = logging.getLogger()
@@ -39,10 +56,15 @@ formatter = logging.Formatter(
 ch.setFormatter(formatter)
 fh.setFormatter(formatter)
 
-# Exporting logs to the screen
-# logger.addHandler(ch)
 # Exporting logs to a file
-logger.addHandler(fh)
+log_handlers = [fh]
+# Exporting logs to the screen
+# log_handlers.append(ch)
+# The handlers are run by a background thread, so that requests don't block
+# on writing (and rotating) the log file. The records still queued are
+# written on exit
+log_listener = setup_queue_logging(logger, log_handlers)
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 logging.info("Starting API..")
@@ -52,6 +74,19 @@ fast_api_tags_metadata = [
         "name": "organization",
         "description": "Operations related with the organizations.",
     },
+    {
+        "name": "events subscription",
+        "description": "Registration of listeners of the organizations' " +
+        "events.",
+    },
+    {
+        "name": "metrics",
+        "description": "Metrics of the service, for Prometheus.",
+    },
+    {
+        "name": "profiling",
+        "description": "Profiles of the running worker, for admins.",
+    },
 ]
 
 fast_api_description = "REST API of VPilot"
@@ -70,6 +105,27 @@ app = FastAPI(
 
 # Load Routers
 app.include_router(organizations_router.router)
+app.include_router(hub_router.router)
+app.include_router(metrics_router.router)
+app.include_router(profiling_router.router)
+
+# Encode responses as JSON, MessagePack or CBOR, according to the client's
+# Accept header
+app.add_middleware(ContentNegotiationMiddleware)
+# Compress responses, according to the client's Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+# Return the call tree of the requests with '?__profile=1' to admins
+app.add_middleware(
+    ProfilingMiddleware,
+    admin_user=idp.get_current_user(required_roles=[IDP_ADMIN_USER])
+)
+# Trace the requests, if an exporter was configured (TRACING_EXPORTER)
+app.add_middleware(TracingMiddleware)
+tracer.configure(create_span_processor())
+# Record the latency, status and SQL statements of each request. Added last,
+# so that it accounts for the other middlewares too
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
 
 
 # Dependency
@@ -85,7 +141,18 @@ def get_db():
 @app.on_event("startup")
 async def startup_event():
     models.Base.metadata.create_all(bind=engine)
-    pass
+    # Relay the events recorded in the outbox to the hub's listeners
+    outbox_relay.start()
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Events not yet relayed stay in the outbox, and are relayed on the next
+    # startup. Give the queued notifications a chance to be delivered
+    outbox_relay.stop(timeout=5)
+    event_dispatcher.stop(timeout=5)
+    # Export the spans still queued
+    tracer.shutdown()
 
 
 # This function will handle all default pydantic exceptions raised in the
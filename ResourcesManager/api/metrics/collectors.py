@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 14:58:36
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:47:13
+
+# Metrics read, on each scrape, from the state the caches and the background
+# threads already keep
+
+# custom imports
+from database.crud import crud
+from events.change_feed import change_broadcaster
+from events.dispatcher import event_dispatcher
+from events.outbox import outbox_relay
+from metrics.registry import REGISTRY, Counter, Gauge
+from middleware.compression import compressed_body_cache
+
+
+def caches():
+    return {
+        "compressed_bodies": compressed_body_cache,
+        "organization_counts": crud.organization_count_cache,
+        "organization_documents": crud.organization_document_lookups,
+    }
+
+
+def collect_caches():
+    hits = Counter(
+        "cache_hits_total",
+        "Lookups answered by the cache",
+        ("cache",),
+        registry=None
+    )
+    misses = Counter(
+        "cache_misses_total",
+        "Lookups not answered by the cache",
+        ("cache",),
+        registry=None
+    )
+    hit_ratio = Gauge(
+        "cache_hit_ratio",
+        "Ratio of the lookups answered by the cache",
+        ("cache",),
+        registry=None
+    )
+    for name, cache in caches().items():
+        cache_hits, cache_misses = cache.hits, cache.misses
+        hits.labels(name).inc(cache_hits)
+        misses.labels(name).inc(cache_misses)
+        lookups = cache_hits + cache_misses
+        hit_ratio.labels(name).set(cache_hits / lookups if lookups else 0)
+    return [hits, misses, hit_ratio]
+
+
+def collect_events():
+    outbox_pending = Gauge(
+        "outbox_pending_events",
+        "Events waiting in the outbox",
+        registry=None
+    )
+    outbox_pending.set(outbox_relay.lag.pending)
+    outbox_oldest_pending_age = Gauge(
+        "outbox_oldest_pending_event_age_seconds",
+        "Age of the oldest event waiting in the outbox",
+        registry=None
+    )
+    outbox_oldest_pending_age.set(outbox_relay.lag.oldest_pending_age)
+    outbox_events = Counter(
+        "outbox_events_total",
+        "Events taken from the outbox, by outcome",
+        ("outcome",),
+        registry=None
+    )
+    outbox_events.labels("relayed").inc(outbox_relay.relayed)
+    outbox_events.labels("failed").inc(outbox_relay.failed)
+    outbox_events.labels("discarded").inc(outbox_relay.discarded)
+
+    notifications = Counter(
+        "event_notifications_total",
+        "Notifications handed to the listeners, by outcome",
+        ("outcome",),
+        registry=None
+    )
+    notifications.labels("delivered").inc(event_dispatcher.delivered)
+    notifications.labels("failed").inc(event_dispatcher.failed)
+    notifications.labels("dropped").inc(event_dispatcher.dropped)
+    pending_notifications = Gauge(
+        "event_notifications_pending",
+        "Notifications queued for delivery",
+        registry=None
+    )
+    pending_notifications.set(event_dispatcher.pending)
+
+    change_feed_subscribers = Gauge(
+        "change_feed_subscribers",
+        "Connections following the change feed",
+        registry=None
+    )
+    change_feed_subscribers.set(change_broadcaster.subscribers)
+    return [
+        outbox_pending,
+        outbox_oldest_pending_age,
+        outbox_events,
+        notifications,
+        pending_notifications,
+        change_feed_subscribers,
+    ]
+
+
+REGISTRY.register_collector(collect_caches)
+REGISTRY.register_collector(collect_events)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 09:26:44
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:52:07
+
+# In-process metrics, exported in the Prometheus text format by GET /metrics.
+#
+# Metrics are recorded through label children, bound once (e.g. when a route
+# is first requested) and kept by their callers, so that recording a value
+# only costs a lock and an addition: no labels are looked up, and nothing is
+# allocated.
+#
+# Values owned by other components (caches, background threads) are not
+# recorded as they change, but read by collectors when the metrics are
+# scraped.
+
+# general imports
+import math
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10
+)
+
+
+def format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def escape_label_value(value: str):
+    return value.replace("\\", "\\\\").replace("\n", "\\n")\
+        .replace("\"", "\\\"")
+
+
+def format_labels(labelnames: tuple, labelvalues: tuple):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(
+        f"{name}=\"{escape_label_value(value)}\""
+        for name, value in zip(labelnames, labelvalues)
+    ) + "}"
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    # 'collector' is called on each scrape, and returns the metrics to
+    # export, e.g. built from the state of a cache
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def collect(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render(self):
+        lines = []
+        for metric in self.collect():
+            metric.render(lines)
+        lines.append("")
+        return "\n".join(lines).encode()
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+
+    type = None
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        # Metrics without labels are recorded on their single child
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    # Child of the given label values, created on its first use. Callers on
+    # hot paths should keep it, instead of calling labels() each time
+    def labels(self, *labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects the labels {self.labelnames}"
+            )
+        labelvalues = tuple(str(value) for value in labelvalues)
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(
+                    labelvalues,
+                    self._new_child()
+                )
+        return child
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.documentation}")
+        lines.append(f"# TYPE {self.name} {self.type}")
+        with self._lock:
+            children = list(self._children.items())
+        for labelvalues, child in children:
+            child.render(lines, self.name, self.labelnames, labelvalues)
+
+
+class _CounterChild:
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, lines, name, labelnames, labelvalues):
+        lines.append(
+            name + format_labels(labelnames, labelvalues) + " " +
+            format_value(self.value)
+        )
+
+
+class Counter(_Metric):
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Gauge(_Metric):
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self._children[()].dec(amount)
+
+    def set(self, value):
+        self._children[()].set(value)
+
+
+class _HistogramChild:
+
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        # Non cumulative. The last bucket is +Inf
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        bucket = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def render(self, lines, name, labelnames, labelvalues):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        labelnames = labelnames + ("le",)
+        cumulative_count = 0
+        for upper_bound, count in zip(
+            self.upper_bounds + (math.inf,),
+            counts
+        ):
+            cumulative_count += count
+            lines.append(
+                name + "_bucket" +
+                format_labels(
+                    labelnames,
+                    labelvalues + (format_value(upper_bound),)
+                ) +
+                " " + str(cumulative_count)
+            )
+        labels = format_labels(labelnames[:-1], labelvalues)
+        lines.append(name + "_sum" + labels + " " + format_value(total))
+        lines.append(name + "_count" + labels + " " + str(cumulative_count))
+
+
+class Histogram(_Metric):
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry: Registry = REGISTRY):
+        self.upper_bounds = tuple(float(bound) for bound in sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value):
+        self._children[()].observe(value)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-22 10:41:18
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-22 15:06:33
+
+# general imports
+import gzip
+import hashlib
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+
+# Brotli is optional. Without it, responses are only gzip compressed
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Logger
+logger = logging.getLogger(__name__)
+
+GZIP = "gzip"
+BROTLI = "br"
+IDENTITY = "identity"
+
+DEFAULT_MINIMUM_SIZE = 1024  # bytes
+DEFAULT_CACHE_SIZE = 32 * 1024 * 1024  # bytes
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+
+# Media types worth compressing. Everything else is sent as is
+COMPRESSIBLE_MEDIA_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "application/cbor",
+    "application/x-ndjson",
+    "application/xml",
+    "text/",
+)
+
+# Streams whose chunks must reach the client as soon as they are sent, which
+# compressors would hold back
+UNCOMPRESSED_MEDIA_TYPES = (
+    "text/event-stream",
+)
+
+
+def supported_encodings():
+    return [BROTLI, GZIP] if brotli else [GZIP]
+
+
+def select_encoding(accept_encoding: str):
+    # Parse the Accept-Encoding header, honoring quality values
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+
+    # Prefer brotli, which compresses repeated JSON keys better, then gzip
+    candidates = [
+        (accepted.get(encoding, accepted.get("*", 0.0)), -i, encoding)
+        for i, encoding in enumerate(supported_encodings())
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else IDENTITY
+
+
+def compress(body: bytes, encoding: str):
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=DEFAULT_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=DEFAULT_GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+
+    def __init__(self, encoding: str):
+        if encoding == BROTLI:
+            self.compressor = brotli.Compressor(quality=DEFAULT_BROTLI_QUALITY)
+            self._compress = self.compressor.process
+            self._flush = self.compressor.finish
+        else:
+            # wbits=31 produces a gzip container
+            self.compressor = zlib.compressobj(DEFAULT_GZIP_LEVEL, wbits=31)
+            self._compress = self.compressor.compress
+            self._flush = self.compressor.flush
+
+    def compress(self, chunk: bytes):
+        return self._compress(chunk)
+
+    def flush(self):
+        return self._flush()
+
+
+# LRU of compressed bodies, keyed by encoding and body digest. Hot documents
+# are served with the same bytes over and over, so they are only compressed
+# once
+class CompressedBodyCache:
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, body: bytes, encoding: str):
+        if self.max_size <= 0:
+            return compress(body, encoding)
+
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            compressed_body = self._entries.get(key)
+            if compressed_body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compressed_body
+            self.misses += 1
+
+        compressed_body = compress(body, encoding)
+
+        with self._lock:
+            if key not in self._entries \
+                    and len(compressed_body) <= self.max_size:
+                self._entries[key] = compressed_body
+                self.size += len(compressed_body)
+                while self.size > self.max_size:
+                    _, evicted_body = self._entries.popitem(last=False)
+                    self.size -= len(evicted_body)
+        return compressed_body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+compressed_body_cache = CompressedBodyCache()
+
+
+class CompressionMiddleware:
+
+    def __init__(self, app, minimum_size: int = DEFAULT_MINIMUM_SIZE,
+                 cache: CompressedBodyCache = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache if cache is not None else compressed_body_cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if encoding == IDENTITY:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(
+            send=send,
+            encoding=encoding,
+            minimum_size=self.minimum_size,
+            cache=self.cache
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+
+    def __init__(self, send, encoding: str, minimum_size: int,
+                 cache: CompressedBodyCache):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _is_compressible(self, headers: Headers):
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_MEDIA_TYPES) \
+            and not content_type.startswith(UNCOMPRESSED_MEDIA_TYPES)
+
+    async def send(self, message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._is_compressible(
+                Headers(raw=message["headers"])
+            )
+            if self.passthrough:
+                await self._send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+
+        # Streaming response, already being compressed
+        if self.compressor is not None:
+            chunk = self.compressor.compress(body)
+            if not more_body:
+                chunk += self.compressor.flush()
+            await self._send({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": more_body,
+            })
+            return
+
+        # Whole body in a single message
+        if not more_body:
+            if len(body) < self.minimum_size:
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+            compressed_body = self.cache.get_or_compress(body, self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers["Content-Length"] = str(len(compressed_body))
+            headers.add_vary_header("Accept-Encoding")
+            await self._send(self.start_message)
+            await self._send({
+                "type": "http.response.body",
+                "body": compressed_body,
+            })
+            return
+
+        # First chunk of a streaming response. Its final size is unknown, so
+        # it is compressed incrementally
+        self.compressor = StreamCompressor(self.encoding)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        await self._send(self.start_message)
+        await self._send({
+            "type": "http.response.body",
+            "body": self.compressor.compress(body),
+            "more_body": True,
+        })
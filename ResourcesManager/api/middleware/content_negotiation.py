@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-23 10:20:03
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-23 15:48:29
+
+# general imports
+from starlette.datastructures import Headers
+
+# custom imports
+from aux.media_types import response_media_type, select_media_type
+
+
+# Negotiates the response media type from the Accept header, so that
+# create_http_response, including in the exception handlers, encodes the
+# payload accordingly
+class ContentNegotiationMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = response_media_type.set(
+            select_media_type(Headers(scope=scope).get("accept", ""))
+        )
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            response_media_type.reset(token)
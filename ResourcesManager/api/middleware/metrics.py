@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 13:47:21
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:31:09
+
+# general imports
+import time
+
+# custom imports
+from database.instrumentation import QueryStats, current_query_stats
+from metrics.registry import Counter, Histogram
+
+# Requests that didn't match any API route (e.g. 404s, the docs)
+OTHER_ROUTE = "other"
+
+SQL_QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling requests, including streaming the response",
+    ("method", "route")
+)
+responses = Counter(
+    "http_responses_total",
+    "Responses sent, by status code",
+    ("method", "route", "status")
+)
+request_sql_queries = Histogram(
+    "http_request_sql_queries",
+    "SQL statements executed per request",
+    ("method", "route"),
+    buckets=SQL_QUERIES_BUCKETS
+)
+request_sql_duration = Histogram(
+    "http_request_sql_duration_seconds",
+    "Time spent executing SQL statements per request",
+    ("method", "route")
+)
+
+
+# Children of the metrics of a route and method, bound on its first request
+class RouteMetrics:
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.duration = request_duration.labels(method, route)
+        self.sql_queries = request_sql_queries.labels(method, route)
+        self.sql_duration = request_sql_duration.labels(method, route)
+        self.responses = {}
+
+    def record(self, status: int, duration: float, query_stats: QueryStats):
+        responses_child = self.responses.get(status)
+        if responses_child is None:
+            responses_child = self.responses[status] = responses.labels(
+                self.method,
+                self.route,
+                status
+            )
+        responses_child.inc()
+        self.duration.observe(duration)
+        self.sql_queries.observe(query_stats.queries)
+        self.sql_duration.observe(query_stats.duration)
+
+
+# Records the latency, status and SQL statements of each request, labelled
+# by the route's path template (e.g. /organization/{id}), so that the labels
+# don't grow with the requested ids
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+        # Route's path -> method -> RouteMetrics
+        self._route_metrics = {}
+
+    def route_metrics(self, route: str, method: str):
+        by_method = self._route_metrics.get(route)
+        if by_method is None:
+            by_method = self._route_metrics.setdefault(route, {})
+        metrics = by_method.get(method)
+        if metrics is None:
+            metrics = by_method[method] = RouteMetrics(method, route)
+        return metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        query_stats = QueryStats(scope["method"], scope["path"])
+        token = current_query_stats.set(query_stats)
+        # Unhandled exceptions are answered with a 500 by the outer
+        # ServerErrorMiddleware
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_query_stats.reset(token)
+            # FastAPI's routes set themselves in the scope once matched
+            route = scope.get("route")
+            self.route_metrics(
+                route.path if route is not None else OTHER_ROUTE,
+                scope["method"]
+            ).record(
+                status,
+                time.perf_counter() - started_at,
+                query_stats
+            )
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 11:30:52
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 12:44:31
+
+# general imports
+import cProfile
+import logging
+from urllib.parse import parse_qsl, urlencode
+from fastapi import Depends
+from fastapi.dependencies.utils import get_dependant, solve_dependencies
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+# custom imports
+from profiling.request_profiler import PROFILE_PARAMETER, format_call_tree
+
+# Logger
+logger = logging.getLogger(__name__)
+
+PROFILED_STATUS_HEADER = "X-Profiled-Status"
+
+# Streams whose chunks must reach the client as soon as they are sent. They
+# aren't profiled: the profiler is stopped as soon as their response starts
+STREAMED_MEDIA_TYPES = (
+    "text/event-stream",
+)
+
+
+# Returns the call tree of the requests with '?__profile=1', instead of their
+# response, to admins. The response's status is sent in the X-Profiled-Status
+# header. Everyone else's requests are passed through, unprofiled.
+#
+# admin_user is the dependency of the admin routes, i.e. the IdP's
+# get_current_user(required_roles=[IDP_ADMIN_USER]). It validates the user's
+# token before anything is profiled
+class ProfilingMiddleware:
+
+    def __init__(self, app, admin_user):
+        self.app = app
+
+        # Only the dependencies of a dependant are solved, as the route's
+        def admin(user=Depends(admin_user)):
+            return user
+
+        self._admin_dependant = get_dependant(path="", call=admin)
+        # cProfile profiles the whole thread, so only one request is
+        # profiled at a time
+        self._profiling = False
+
+    # Solves the dependency as FastAPI does for the routes, so the token is
+    # read from the Authorization header and decoded by the IdP
+    async def is_admin(self, scope, receive):
+        try:
+            _, errors, *_ = await solve_dependencies(
+                request=Request(scope, receive),
+                dependant=self._admin_dependant,
+                dependency_overrides_provider=scope.get("app")
+            )
+        except Exception as exception:
+            # No token, an invalid one or a user without the role. The
+            # request's route answers them as usual
+            logger.debug("Not profiling the request: %r", exception)
+            return False
+        return not errors
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._profiling:
+            await self.app(scope, receive, send)
+            return
+
+        query = parse_qsl(
+            scope["query_string"].decode("latin-1"),
+            keep_blank_values=True
+        )
+        if (PROFILE_PARAMETER, "1") not in query or \
+                not await self.is_admin(scope, receive) or self._profiling:
+            await self.app(scope, receive, send)
+            return
+
+        # The routes don't see the option
+        scope = dict(scope)
+        scope["query_string"] = urlencode(
+            [(name, value) for name, value in query
+             if name != PROFILE_PARAMETER]
+        ).encode("latin-1")
+
+        profile = cProfile.Profile()
+        profiling = True
+        response_start = None
+        streaming = False
+
+        def stop_profiling():
+            nonlocal profiling
+            if profiling:
+                profile.disable()
+                self._profiling = False
+                profiling = False
+
+        async def hold_back(message):
+            nonlocal response_start, streaming
+            if streaming:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                media_type = Headers(raw=message["headers"]).get(
+                    "content-type", ""
+                )
+                if media_type.startswith(STREAMED_MEDIA_TYPES):
+                    # Streams stay open for as long as their clients want.
+                    # Profiling them would slow down the whole worker and
+                    # keep the other requests from being profiled
+                    stop_profiling()
+                    streaming = True
+                    await send(message)
+                    return
+                response_start = message
+            # The body is replaced by the profile, so only the response's
+            # status is kept
+
+        self._profiling = True
+        profile.enable()
+        try:
+            await self.app(scope, receive, hold_back)
+        finally:
+            stop_profiling()
+
+        if streaming:
+            return
+
+        response = PlainTextResponse(
+            format_call_tree(profile),
+            headers={PROFILED_STATUS_HEADER: str(response_start["status"])}
+        )
+        await response(scope, receive, send)
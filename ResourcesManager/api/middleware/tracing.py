@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-12 14:10:26
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-12 17:12:49
+
+# general imports
+from starlette.datastructures import Headers
+
+# custom imports
+from middleware.metrics import OTHER_ROUTE
+from tracing.tracer import (
+    SERVER,
+    TRACEPARENT_HEADER,
+    parse_traceparent,
+    tracer,
+)
+
+
+# Starts a span for each request, continuing the client's trace (W3C
+# traceparent header) if there is one. The spans started while handling the
+# request are its children
+class TracingMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        trace_context = parse_traceparent(
+            Headers(scope=scope).get(TRACEPARENT_HEADER)
+        )
+        with tracer.span(
+            method,
+            {"http.method": method, "http.target": scope["path"]},
+            kind=SERVER,
+            trace_context=trace_context,
+            root=True
+        ) as span:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # Named after the route's template once matched, so that
+                # spans of the same route are grouped together
+                route = scope.get("route")
+                route_path = route.path if route is not None else OTHER_ROUTE
+                span.name = f"{method} {route_path}"
+                span.set_attribute("http.route", route_path)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 10:11:02
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 10:14:27
+
+import logging
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusy(Exception):
+
+    def __init__(self):
+        self.reason = "The worker is already being profiled."
+        self.message = "Impossible to profile the worker " +\
+            f"(reason='{self.reason}')."
+        logger.error(f"Exception: {self.message}")
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
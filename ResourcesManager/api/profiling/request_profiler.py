@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 11:02:15
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 12:40:08
+
+# Profile of a single request, asked for with '?__profile=1'.
+#
+# The requests of admins are handled under cProfile, and the profile is
+# returned instead of their response.
+#
+# cProfile only profiles the event loop's thread, where the routes run. The
+# sync dependencies, run in the threadpool, are left out. Other requests
+# handled concurrently by the event loop are profiled too.
+
+# general imports
+import cProfile
+import io
+import pstats
+
+PROFILE_PARAMETER = "__profile"
+# Functions listed in each section of the call tree
+PROFILE_LINES = 40
+
+
+# The functions that took the longest, including their callees, followed by
+# what each of them called
+def format_call_tree(profile: cProfile.Profile, lines: int = PROFILE_LINES):
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    stats.print_stats(lines)
+    stats.print_callees(lines)
+    return stream.getvalue()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 10:04:37
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 12:21:50
+
+# Statistical profiler of the live worker.
+#
+# A thread samples the stacks of all the other threads of the worker every
+# interval (sys._current_frames), and counts how many times each stack was
+# seen. Nothing is hooked into the profiled code, so the overhead is that of
+# walking the stacks, whatever the load of the worker.
+#
+# The stacks are exported in the collapsed format of flamegraph.pl (and
+# speedscope): one line per stack, its frames from the root to the leaf
+# separated by ';', followed by the number of samples. The root frame is the
+# thread's name.
+
+# general imports
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+# custom imports
+from profiling.exceptions import ProfilerBusy
+
+# Logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.005  # seconds
+MIN_INTERVAL = 0.001  # seconds
+MAX_INTERVAL = 1  # seconds
+MAX_DURATION = 60  # seconds
+
+
+# Path of the file relative to the sys.path entry it was imported from,
+# e.g. 'database/crud/crud.py' or 'sqlalchemy/orm/query.py'
+def short_filename(filename: str, paths: list = None):
+    paths = sys.path if paths is None else paths
+    filename = os.path.abspath(filename)
+    prefixes = [
+        os.path.join(os.path.abspath(path or os.curdir), "")
+        for path in paths
+    ]
+    prefixes = [prefix for prefix in prefixes if filename.startswith(prefix)]
+    if not prefixes:
+        return filename
+    return os.path.relpath(filename, max(prefixes, key=len))
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # The frames' labels, by code object. The same functions are seen
+        # over and over, so they are only formatted once
+        self._labels = {}
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} " +\
+                f"({short_filename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self, stacks: collections.Counter, thread_names: dict):
+        sampler_thread_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == sampler_thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            thread_name = thread_names.get(thread_id)
+            if thread_name is None:
+                # A thread started during the profile
+                thread_names.update(
+                    (thread.ident, thread.name)
+                    for thread in threading.enumerate()
+                )
+                thread_name = thread_names.get(thread_id, str(thread_id))
+            stack.append(thread_name)
+            stacks[";".join(reversed(stack))] += 1
+
+    # Samples the worker's threads for duration seconds, from the calling
+    # thread. Returns the number of samples of each collapsed stack.
+    # Only one profile runs at a time: ProfilerBusy is raised otherwise
+    def profile(self, duration: float, interval: float = None):
+        interval = self.interval if interval is None else interval
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            stacks = collections.Counter()
+            thread_names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            start = time.perf_counter()
+            end = start + duration
+            next_sample = start
+            n_samples = 0
+            while True:
+                self._sample(stacks, thread_names)
+                n_samples += 1
+                next_sample += interval
+                now = time.perf_counter()
+                if next_sample >= end:
+                    break
+                if next_sample > now:
+                    time.sleep(next_sample - now)
+                else:
+                    # Sampling is lagging behind, e.g. the GIL is busy. Skip
+                    # the missed samples instead of catching up in a burst
+                    next_sample = now
+            logger.info("Profiled the worker for %.2fs (%d samples)",
+                        time.perf_counter() - start, n_samples)
+            return stacks
+        finally:
+            self._lock.release()
+
+
+def format_collapsed(stacks: collections.Counter):
+    return "".join(
+        f"{stack} {count}\n" for stack, count in sorted(stacks.items())
+    )
+
+
+sampling_profiler = SamplingProfiler()
@@ -8,10 +8,15 @@
 from fastapi import (
     Query,
     HTTPException,
+    Request,
     status,
 )
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.params import Query as QueryParam
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic.error_wrappers import ErrorWrapper
 from http import HTTPStatus
 import logging
 from typing import (
@@ -21,10 +26,15 @@ from typing import (
 
 # custom imports
 from database.crud import exceptions as CRUDExceptions
+from aux import exceptions as AuxExceptions
+from profiling import exceptions as ProfilingExceptions
 from database.models import models
+from database.crud import query_filters as QueryFilters
+from database.crud import organization_documents as OrganizationDocuments
 from aux.constants import IDP_ADMIN_USER
+from aux import media_types as MediaTypes
+from tracing.tracer import tracer
 from schemas import (
-    tmf632_party_mgmt as TMF632,
     authorized_users as AuthorizedUsersSchemas
 )
 
@@ -78,6 +88,14 @@ class GetOrganizationFilters:
             default=None,
             alias="partyCharacteristic.id"
         ),
+        partyCharacteristicName: Optional[str] = Query(
+            default=None,
+            alias="partyCharacteristic.name"
+        ),
+        partyCharacteristicValue: Optional[str] = Query(
+            default=None,
+            alias="partyCharacteristic.value"
+        ),
         relatedParty: Optional[int] = Query(
             default=None,
             alias="relatedParty.id"
@@ -107,11 +125,24 @@ class GetOrganizationFilters:
         self.organizationParentRelationship = organizationParentRelationship
         self.otherName = otherName
         self.partyCharacteristic = partyCharacteristic
+        self.partyCharacteristicName = partyCharacteristicName
+        self.partyCharacteristicValue = partyCharacteristicValue
         self.relatedParty = relatedParty
         self.status = status
         self.taxExemptionCertificate = taxExemptionCertificate
 
 
+def parse_organization_query_characteristic_filter(
+    filter: GetOrganizationFilters
+):
+    characteristic_filter = {}
+    if isinstance(filter.partyCharacteristicName, str):
+        characteristic_filter["name"] = filter.partyCharacteristicName
+    if isinstance(filter.partyCharacteristicValue, str):
+        characteristic_filter["value"] = filter.partyCharacteristicValue
+    return characteristic_filter
+
+
 def filter_organization_fields(allowed_fields, organization):
     if not allowed_fields:
         return organization
@@ -133,18 +164,47 @@ def parse_organization_query_filters(filter: GetOrganizationFilters):
     }
 
 
-def check_if_user_is_authorized_to_access_an_organization(user, organization):
-    if IDP_ADMIN_USER not in user.roles:
-        if user.sub not in [
-            authorized_user.user_id
-            for authorized_user
-            in organization.authorizedUsersParsed
-        ]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail='User not authorized to access data ' +
-                f'related with organization {organization.id}',
+# Collects the TMF632 attribute filters with an operator (e.g. 'name.like=a%'
+# or 'existsDuring.startDateTime.gt=2023-01-01T00:00:00Z'). Parameters without
+# one are handled by GetOrganizationFilters
+def parse_organization_query_operator_filters(query_params):
+    operator_filters = []
+    for parameter, value in query_params.multi_items():
+        field_and_operator = QueryFilters.split_filter_parameter(parameter)
+        if field_and_operator:
+            operator_filters.append(
+                QueryFilters.OperatorFilter(*field_and_operator, value)
             )
+    return operator_filters
+
+
+def check_organization_access(organization_access):
+    if not organization_access.is_authorized:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='User not authorized to access data ' +
+            f'related with organization {organization_access.organization_id}',
+        )
+
+
+def check_change_feed_access(organization_ids: set,
+                             authorized_organization_ids: set):
+    forbidden_ids = sorted(organization_ids - authorized_organization_ids)
+    if forbidden_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='User not authorized to access data related with ' +
+            f'organizations {forbidden_ids}',
+        )
+
+
+def check_if_user_is_authorized_to_access_user_organizations(user, sub):
+    if IDP_ADMIN_USER not in user.roles and user.sub != sub:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='User not authorized to access the organizations ' +
+            f'of user {sub}',
+        )
 
 
 def compose_error_payload(code: str, reason: str, message: str = None,
@@ -177,40 +237,136 @@ def compose_error_payload(code: str, reason: str, message: str = None,
 
 def create_http_response(http_status: HTTPStatus = HTTPStatus.OK,
                          content: Any = {}):
-    return JSONResponse(
-        status_code=http_status.value,
-        content=content,
-        # headers={"Access-Control-Allow-Origin": "*"}
-        )
+    # The media type is negotiated by the ContentNegotiationMiddleware
+    media_type = MediaTypes.response_media_type.get()
+    with tracer.span("encode", {"media_type": media_type}):
+        if media_type == MediaTypes.JSON:
+            return JSONResponse(
+                status_code=http_status.value,
+                content=content,
+                headers={"Vary": "Accept"}
+                # headers={"Access-Control-Allow-Origin": "*"}
+                )
+        return Response(
+            status_code=http_status.value,
+            content=MediaTypes.encode(content, media_type),
+            media_type=media_type,
+            headers={"Vary": "Accept"}
+            )
 
 
-def organization_to_organization_schema(organization: models.Organization):
+# Count-only responses. The count is always sent in the X-Total-Count header,
+# and also in the body, unless it is a response to a HEAD request
+def create_count_http_response(total_count: int, include_body: bool = True):
+    headers = {"X-Total-Count": str(total_count)}
+    if not include_body:
+        return Response(status_code=HTTPStatus.OK.value, headers=headers)
+    response = create_http_response(
+        http_status=HTTPStatus.OK,
+        content={"totalCount": total_count}
+    )
+    response.headers.update(headers)
+    return response
 
-    # Parse Organization Model to TMF632 Organization Schema
-    schema = TMF632.Organization.from_orm(organization)
 
-    # Add TimePeriod, if needed
-    if organization.existsDuringParsed:
-        schema.existsDuring = TMF632.TimePeriod\
-            .from_orm(organization.existsDuringParsed)
+# Organizations changed since the requested value of the change sequence.
+# The value to sync from next time is also sent in the X-Change-Seq header
+def create_organization_changes_http_response(organization_changes,
+                                              fields: list = None):
+    response = create_http_response(
+        http_status=HTTPStatus.OK,
+        content={
+            "organizations": [
+                filter_organization_fields(
+                    fields,
+                    jsonable_encoder(
+                        organization_to_organization_schema(organization)
+                    )
+                )
+                for organization in organization_changes.organizations
+            ],
+            "deleted": [
+                str(organization_id)
+                for organization_id in organization_changes.deleted_ids
+            ],
+            "changeSeq": organization_changes.change_seq,
+        }
+    )
+    response.headers["X-Change-Seq"] = str(organization_changes.change_seq)
+    return response
+
+
+# Route that also accepts MessagePack and CBOR request bodies. These are
+# decoded up front and handed to FastAPI as if they were already parsed JSON,
+# so that the same TMF632 schemas validate them
+class NegotiatedContentRoute(APIRoute):
+
+    def get_route_handler(self):
+        route_handler = super().get_route_handler()
+
+        async def negotiated_content_route_handler(request: Request):
+            content_type = request.headers.get("content-type", "")
+            if MediaTypes.is_binary_media_type(content_type):
+                request = await decode_binary_request(request, content_type)
+            return await route_handler(request)
+
+        return negotiated_content_route_handler
 
-    # Add Characteristics, if needed
-    schema.partyCharacteristic = []
-    for pc in organization.partyCharacteristicParsed:
-        schema.partyCharacteristic.append(
-            TMF632.Characteristic.from_orm(pc)
-        )
 
-    return schema
+async def decode_binary_request(request: Request, content_type: str):
+    body = await request.body()
+    try:
+        decoded_body = MediaTypes.decode(body, content_type) if body else None
+    except Exception as e:
+        raise RequestValidationError([ErrorWrapper(e, ("body",))], body=body)
 
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (key, value)
+        for key, value in request.scope["headers"]
+        if key != b"content-type"
+    ] + [(b"content-type", MediaTypes.JSON.encode())]
+    decoded_request = Request(scope, request.receive)
+    decoded_request._body = body
+    if decoded_body is not None:
+        decoded_request._json = decoded_body
+    return decoded_request
 
-def organization_authorized_users_to_schema(organization: models.Organization):
+
+def organization_to_organization_schema(organization: models.Organization):
+    # Same serialization as the precomputed organization documents
+    return OrganizationDocuments.organization_to_schema(organization)
+
+
+# Precomputed organization documents are already serialized as JSON. They are
+# only decoded to select some of their fields, or to re-encode them
+def create_organization_document_http_response(document: bytes,
+                                               fields: list = None):
+    media_type = MediaTypes.response_media_type.get()
+    if not fields and media_type == MediaTypes.JSON:
+        return Response(
+            status_code=HTTPStatus.OK.value,
+            content=document,
+            media_type=MediaTypes.JSON,
+            headers={"Vary": "Accept"}
+        )
+    return create_http_response(
+        http_status=HTTPStatus.OK,
+        content=filter_organization_fields(
+            fields,
+            MediaTypes.decode(document)
+        )
+    )
+
+
+def authorized_user_ids_to_schema(organization_id: int,
+                                  authorized_user_ids: list):
     return AuthorizedUsersSchemas.OrganizationAuthorizedUsers(
-        organization_id=organization.id,
+        organization_id=organization_id,
         authorized_users=[
-            AuthorizedUsersSchemas.AuthorizedUser(user_id=user.user_id)
-            for user
-            in organization.authorizedUsersParsed
+            AuthorizedUsersSchemas.AuthorizedUser(user_id=user_id)
+            for user_id
+            in authorized_user_ids
         ]
     )
 
@@ -234,6 +390,30 @@ def exception_to_http_response(exception):
                 reason=exception.reason,
             )
         )
+    elif isinstance(exception, CRUDExceptions.InvalidQueryParameter):
+        return create_http_response(
+            http_status=HTTPStatus.BAD_REQUEST,
+            content=compose_error_payload(
+                code=HTTPStatus.BAD_REQUEST,
+                reason=exception.reason,
+            )
+        )
+    elif isinstance(exception, AuxExceptions.ColumnarExportUnavailable):
+        return create_http_response(
+            http_status=HTTPStatus.NOT_IMPLEMENTED,
+            content=compose_error_payload(
+                code=HTTPStatus.NOT_IMPLEMENTED,
+                reason=exception.reason,
+            )
+        )
+    elif isinstance(exception, ProfilingExceptions.ProfilerBusy):
+        return create_http_response(
+            http_status=HTTPStatus.CONFLICT,
+            content=compose_error_payload(
+                code=HTTPStatus.CONFLICT,
+                reason=exception.reason,
+            )
+        )
     elif isinstance(exception, HTTPException):
         return create_http_response(
             http_status=HTTPStatus.FORBIDDEN,
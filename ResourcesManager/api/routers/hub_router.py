@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-04 09:51:26
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-04 12:18:03
+
+# generic imports
+from fastapi import (
+    APIRouter,
+    Depends,
+)
+from sqlalchemy.orm import Session
+from http import HTTPStatus
+import logging
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from idp.idp import idp
+import main
+from routers.aux import (
+    create_http_response,
+    exception_to_http_response,
+    NegotiatedContentRoute
+)
+from aux.constants import IDP_ADMIN_USER
+
+# Logger
+logger = logging.getLogger(__name__)
+
+
+router = APIRouter(route_class=NegotiatedContentRoute)
+
+
+# Dependency
+def get_db():
+    return next(main.get_db())
+
+
+@router.post(
+    "/hub",
+    tags=["events subscription"],
+    summary="Register a listener",
+    description="Sets the communication endpoint address the service " +
+    "instance must use to deliver information about its health state, " +
+    "execution state, failures and metrics. The query may restrict the " +
+    "notified events, e.g. 'eventType=OrganizationCreateEvent'.",
+    status_code=HTTPStatus.CREATED.value,
+    response_model=TMF632Schemas.EventSubscription,
+)
+async def register_listener(
+    subscription: TMF632Schemas.EventSubscriptionInput,
+    db: Session = Depends(get_db),
+    user=Depends(idp.get_current_user(required_roles=[IDP_ADMIN_USER]))
+):
+    try:
+        logger.info("User %s is trying to register the listener %s...",
+                    user, subscription.callback)
+
+        db_subscription = crud.create_event_subscription(db, subscription)
+
+        logger.info("User %s registered the listener %s", user,
+                    db_subscription)
+        return create_http_response(
+            http_status=HTTPStatus.CREATED,
+            content=TMF632Schemas.EventSubscription(
+                id=str(db_subscription.id),
+                callback=db_subscription.callback,
+                query=db_subscription.query
+            ).dict()
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
+
+
+@router.delete(
+    "/hub/{id}",
+    tags=["events subscription"],
+    summary="Unregister a listener",
+    description="Resets the communication endpoint address the service " +
+    "instance must use to deliver information about its health state, " +
+    "execution state, failures and metrics.",
+    status_code=HTTPStatus.NO_CONTENT.value,
+)
+async def unregister_listener(
+    id: int,
+    db: Session = Depends(get_db),
+    user=Depends(idp.get_current_user(required_roles=[IDP_ADMIN_USER]))
+):
+    try:
+        logger.info("User %s is trying to unregister the listener " +
+                    "with id=%s...", user, id)
+
+        crud.delete_event_subscription(db, id)
+
+        logger.info("User %s unregistered the listener with id=%s", user,
+                    id)
+        return create_http_response(
+            http_status=HTTPStatus.NO_CONTENT
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
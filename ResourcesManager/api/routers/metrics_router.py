@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 15:32:50
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:21:34
+
+# generic imports
+from fastapi import APIRouter, Response
+
+# custom imports
+from metrics.registry import REGISTRY, CONTENT_TYPE
+# Registers the metrics of the caches and of the events' background threads
+import metrics.collectors  # noqa: F401
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    tags=["metrics"],
+    summary="Get the service's metrics",
+    description="Exports the metrics of the routes, the database and the " +
+    "caches in the Prometheus text format. It isn't authenticated, so it " +
+    "should only be reachable by the monitoring system.",
+    response_class=Response,
+)
+async def get_metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
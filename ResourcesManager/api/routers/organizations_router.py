@@ -9,9 +9,12 @@
 from fastapi import (
     APIRouter,
     Depends,
+    Header,
     Query,
+    Request,
 )
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from database.crud import crud
 from http import HTTPStatus
@@ -22,28 +25,44 @@ import logging
 import database.crud.exceptions as CRUDExceptions
 import schemas.tmf632_party_mgmt as TMF632Schemas
 import schemas.authorized_users as AuthorizedUsersSchemas
+import schemas.organizations_batch as OrganizationsBatchSchemas
 from idp.idp import idp
 import main
 from routers.aux import (
     GetOrganizationFilters,
     filter_organization_fields,
     parse_organization_query_filters,
-    check_if_user_is_authorized_to_access_an_organization,
+    parse_organization_query_operator_filters,
+    parse_organization_query_characteristic_filter,
+    check_organization_access,
+    check_change_feed_access,
+    check_if_user_is_authorized_to_access_user_organizations,
     create_http_response,
+    create_count_http_response,
+    create_organization_changes_http_response,
+    create_organization_document_http_response,
     organization_to_organization_schema,
-    organization_authorized_users_to_schema,
-    exception_to_http_response
+    authorized_user_ids_to_schema,
+    exception_to_http_response,
+    NegotiatedContentRoute
 )
 from aux.constants import (
     IDP_ADMIN_USER,
     IDP_TESTBED_ADMIN_USER,
 )
+from aux import columnar_export as ColumnarExport
+from database.crud.query_filters import (
+    SORTABLE_FIELDS,
+    parse_active_period
+)
+from events import change_feed as ChangeFeed
+from aux.log_utils import Truncated
 
 # Logger
 logger = logging.getLogger(__name__)
 
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedContentRoute)
 
 
 # Dependency
@@ -72,8 +91,10 @@ async def create_organization(
 
         organization = crud.create_organization(db, organization)
 
-        logger.info(f"User {user} created the following organization: " +
-                    f"{organization}")
+        logger.info("User %s created the organization with the id %s", user,
+                    organization.id)
+        logger.debug("Organization created by user %s: %s", user,
+                     Truncated(organization))
         return create_http_response(
             http_status=HTTPStatus.CREATED,
             # Return parsed
@@ -85,6 +106,190 @@ async def create_organization(
         return exception_to_http_response(exception)
 
 
+# Declared before "/organization/{id}", which would otherwise match it
+@router.get(
+    "/organization/export",
+    tags=["organization"],
+    summary="Exports the Organizations' inventory",
+    description="This operation streams the organizations, their party " +
+    "characteristics, time periods or authorized users as an Arrow IPC " +
+    "stream or a Parquet file.",
+)
+async def export_organizations(
+    table: str = Query(
+        default="organizations",
+        regex="^(" + "|".join(crud.EXPORTABLE_TABLES.keys()) + ")$"
+    ),
+    format: str = Query(
+        default=ColumnarExport.ARROW,
+        regex="^(" + "|".join(ColumnarExport.EXPORT_FORMATS) + ")$"
+    ),
+    db: Session = Depends(get_db),
+    user=Depends(idp.get_current_user(required_roles=[IDP_ADMIN_USER]))
+):
+    try:
+        logger.info("User %s is exporting the %s table as %s...", user,
+                    table, format)
+
+        ColumnarExport.check_columnar_export_available()
+
+        # Response
+        file_name = f"{table}.{ColumnarExport.EXPORT_FILE_EXTENSIONS[format]}"
+        return StreamingResponse(
+            ColumnarExport.iter_export(db, table, format),
+            media_type=ColumnarExport.EXPORT_MEDIA_TYPES[format],
+            headers={
+                "Content-Disposition": f'attachment; filename="{file_name}"'
+            }
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
+
+
+@router.post(
+    "/organization/batch-get",
+    tags=["organization"],
+    summary="Obtains several Organizations at once",
+    description="This operation obtains the Organizations with the given " +
+    "ids, and reports which of them don't exist or can't be accessed by " +
+    "the user.",
+    response_model=OrganizationsBatchSchemas.OrganizationsBatchGetResult,
+)
+async def batch_get_organizations(
+    batch_get: OrganizationsBatchSchemas.OrganizationsBatchGet,
+    fields: Optional[str] = Query(
+        default=None,
+        regex="^(("
+        + '|'.join(TMF632Schemas.Organization.__fields__.keys())
+        + ")(,)?)+$"
+    ),
+    db: Session = Depends(get_db),
+    user=Depends(idp.get_current_user(required_roles=[IDP_TESTBED_ADMIN_USER]))
+):
+    try:
+        logger.info("User %s is trying to obtain information regarding " +
+                    "organizations with ids=%s...", user,
+                    Truncated(batch_get.ids))
+
+        fields = fields.split(",") if fields else None
+        batch_access = crud.get_organizations_for_user(
+            db=db,
+            ids=batch_get.ids,
+            user_id=user.sub,
+            is_admin=IDP_ADMIN_USER in user.roles
+        )
+
+        logger.info("User %s obtained information regarding %d " +
+                    "organizations (not found: %s, forbidden: %s)", user,
+                    len(batch_access.organizations),
+                    Truncated(batch_access.not_found),
+                    Truncated(batch_access.forbidden))
+
+        # Response
+        return create_http_response(
+            http_status=HTTPStatus.OK,
+            content={
+                "organizations": [
+                    filter_organization_fields(
+                        fields,
+                        jsonable_encoder(
+                            organization_to_organization_schema(organization)
+                        )
+                    )
+                    for organization in batch_access.organizations
+                ],
+                "notFound": batch_access.not_found,
+                "forbidden": batch_access.forbidden,
+            }
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
+
+
+@router.get(
+    "/organization/changes",
+    tags=["organization"],
+    summary="Follows the changes of the Organizations",
+    description="This operation pushes a notification whenever one of " +
+    "the organizations the user can access changes. Clients accepting " +
+    "'text/event-stream' get a Server-Sent Events stream. Other clients " +
+    "are answered, in JSON, as soon as there are changes, or after the " +
+    "timeout (long polling). The stream's Last-Event-ID, or the response's " +
+    "lastEventId, resumes the feed where it was left. When changes were " +
+    "missed, a 'reset' event (or flag) tells the client to fetch the " +
+    "organizations again.",
+)
+async def get_organization_changes(
+    request: Request,
+    id: Optional[str] = Query(
+        default=None,
+        regex="^[0-9]+(,[0-9]+)*$",
+        description="Comma separated ids of the organizations to follow. " +
+        "All the organizations the user can access are followed by default"
+    ),
+    lastEventId: Optional[str] = Query(
+        default=None,
+        description="Only notify the changes after this one. Event ids " +
+        "are opaque, and only valid for the process that sent them: other " +
+        "ids get a reset"
+    ),
+    timeout: Optional[int] = Query(
+        default=30,
+        ge=0,
+        le=60,
+        description="For how long, in seconds, a long polling request " +
+        "waits for changes"
+    ),
+    last_event_id: Optional[str] = Header(default=None),
+    accept: Optional[str] = Header(default=""),
+    db: Session = Depends(get_db),
+    user=Depends(idp.get_current_user(required_roles=[IDP_TESTBED_ADMIN_USER]))
+):
+    try:
+        logger.info("User %s is following the changes of the " +
+                    "organizations with ids=%s...", user, id or "all")
+
+        organization_ids = {int(i) for i in id.split(",")} if id else None
+        is_admin = IDP_ADMIN_USER in user.roles
+        if not is_admin:
+            authorized_organization_ids = \
+                crud.get_authorized_organization_ids(db, user.sub)
+            if organization_ids is None:
+                organization_ids = authorized_organization_ids
+            else:
+                check_change_feed_access(
+                    organization_ids,
+                    authorized_organization_ids
+                )
+        # The connection may stay open for long. It doesn't need the session
+        db.close()
+
+        subscriber = ChangeFeed.ChangeSubscriber(
+            organization_ids=organization_ids,
+            user_id=user.sub,
+            follows_authorizations=not is_admin and id is None,
+            last_event_id=last_event_id
+            if last_event_id is not None else lastEventId
+        )
+
+        # Response
+        if ChangeFeed.SSE_MEDIA_TYPE in accept:
+            return StreamingResponse(
+                ChangeFeed.iter_sse(request, subscriber),
+                media_type=ChangeFeed.SSE_MEDIA_TYPE,
+                headers={
+                    "Cache-Control": "no-cache",
+                    "X-Accel-Buffering": "no",
+                }
+            )
+        return create_http_response(
+            http_status=HTTPStatus.OK,
+            content=await ChangeFeed.poll(subscriber, timeout)
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
+
+
 @router.get(
     "/organization/",
     tags=["organization"],
@@ -92,6 +297,13 @@ async def create_organization(
     description="This operation list or find Organization entities.",
     response_model=list[TMF632Schemas.Organization],
 )
+@router.head(
+    "/organization/",
+    tags=["organization"],
+    summary="Count Organization objects",
+    description="This operation returns the number of Organization " +
+    "entities matching the filters in the X-Total-Count header.",
+)
 @router.get(
     "/organization/{id}",
     tags=["organization"],
@@ -100,6 +312,7 @@ async def create_organization(
     response_model=list[TMF632Schemas.Organization],
 )
 async def get_organization(
+    request: Request,
     id: Optional[int] = None,
     fields: Optional[str] = Query(
         default=None,
@@ -107,6 +320,61 @@ async def get_organization(
         + '|'.join(TMF632Schemas.Organization.__fields__.keys())
         + ")(,)?)+$"
     ),
+    authorizedFor: Optional[str] = Query(
+        default=None,
+        regex="^me$",
+        description="Only list the organizations the requester is " +
+        "authorized to access"
+    ),
+    offset: Optional[int] = Query(
+        default=None,
+        ge=0,
+        description="Requested index for start of resources to be provided " +
+        "in response"
+    ),
+    limit: Optional[int] = Query(
+        default=None,
+        ge=1,
+        description="Requested number of resources to be provided in response"
+    ),
+    q: Optional[str] = Query(
+        default=None,
+        min_length=1,
+        description="Full-text search over the organizations' name and " +
+        "tradingName. Results are ranked by relevance"
+    ),
+    sort: Optional[str] = Query(
+        default=None,
+        regex="^(-?(" + "|".join(SORTABLE_FIELDS.keys()) + ")(,)?)+$",
+        description="Comma separated attributes to sort by. Prefix an " +
+        "attribute with '-' to sort in descending order"
+    ),
+    activeAt: Optional[str] = Query(
+        default=None,
+        description="Only list the organizations that exist at this " +
+        "datetime, according to their existsDuring period"
+    ),
+    activeBetween: Optional[str] = Query(
+        default=None,
+        description="Two comma separated datetimes. Only list the " +
+        "organizations whose existsDuring period overlaps this one"
+    ),
+    countOnly: Optional[bool] = Query(
+        default=False,
+        description="Only count the organizations matching the filters"
+    ),
+    cachedCount: Optional[bool] = Query(
+        default=False,
+        description="Allow the count to be served from a short-lived cache"
+    ),
+    since: Optional[int] = Query(
+        default=None,
+        ge=0,
+        description="Incremental sync. Only list the organizations changed " +
+        "after this value of the change sequence, and the ones deleted " +
+        "since then. Other filters are ignored. The value to sync from " +
+        "next time is returned in changeSeq"
+    ),
     filter: GetOrganizationFilters = Depends(),
     db: Session = Depends(get_db),
     user=Depends(idp.get_current_user(required_roles=[IDP_TESTBED_ADMIN_USER]))
@@ -115,14 +383,43 @@ async def get_organization(
         # Parse all query parameters
         fields = fields.split(",") if fields else None
         filter_dict = parse_organization_query_filters(filter)
+        operator_filters = parse_organization_query_operator_filters(
+            request.query_params
+        )
+        characteristic_filter = \
+            parse_organization_query_characteristic_filter(filter)
+        active_period = parse_active_period(activeAt, activeBetween)
 
         # Operations for when the client requests a specific organization
         # These operations ignore all query filters, since the organization is
         # already 'filtered' using its id
         if id:
-            logger.info(f"User {user} is trying to obtain information " +
-                        f"regarding  organization with id={id}...")
-            organizations = [crud.get_organization_by_id(db, id)]
+            logger.info("User %s is trying to obtain information " +
+                        "regarding  organization with id=%s...", user, id)
+
+            # Serve the precomputed document, if there is one
+            document_access = crud.get_organization_document_for_user(
+                db=db,
+                id=id,
+                user_id=user.sub,
+                is_admin=IDP_ADMIN_USER in user.roles
+            )
+            if document_access is not None:
+                check_organization_access(document_access)
+                logger.info("User %s obtained information regarding " +
+                            "organization with id=%s", user, id)
+                return create_organization_document_http_response(
+                    document=document_access.document,
+                    fields=fields
+                )
+
+            organization_access = crud.get_organization_for_user(
+                db=db,
+                id=id,
+                user_id=user.sub,
+                is_admin=IDP_ADMIN_USER in user.roles
+            )
+            organizations = [organization_access.organization]
             if not organizations[0]:
                 organizations[0] = {}
             else:
@@ -131,16 +428,69 @@ async def get_organization(
                 # If the user doesn't possess the needed permissions, this
                 # function will raise an exception and the method will return a
                 # 403 FORBIDDEN
-                check_if_user_is_authorized_to_access_an_organization(
-                    user=user,
-                    organization=organizations[0]
-                )
+                check_organization_access(organization_access)
 
         # Operations for when the client requests all organization
         else:
-            logger.info(f"User {user} is trying to obtain information " +
-                        "regarding all organizations...")
-            organizations = crud.get_all_organizations(db, filter_dict)
+            logger.info("User %s is trying to obtain information " +
+                        "regarding all organizations...", user)
+            # Non-admin users may only list the organizations they are
+            # authorized to access. This is enforced by the database query
+            # itself, so that pagination only accounts for those
+            authorized_user_id = None
+            if authorizedFor or IDP_ADMIN_USER not in user.roles:
+                authorized_user_id = user.sub
+
+            # Incremental sync mode. Only the changed organizations are loaded
+            if since is not None:
+                organization_changes = crud.get_organization_changes(
+                    db=db,
+                    since=since,
+                    limit=limit,
+                    authorized_user_id=authorized_user_id
+                )
+                logger.info(
+                    "User %s obtained the changes since %s: %d " +
+                    "organizations changed and %d deleted", user, since,
+                    len(organization_changes.organizations),
+                    len(organization_changes.deleted_ids)
+                )
+                return create_organization_changes_http_response(
+                    organization_changes=organization_changes,
+                    fields=fields
+                )
+
+            # Count-only mode. No organization is loaded
+            if countOnly or request.method == "HEAD":
+                total_count = crud.count_organizations(
+                    db=db,
+                    filters=filter_dict,
+                    authorized_user_id=authorized_user_id,
+                    operator_filters=operator_filters,
+                    characteristic_filter=characteristic_filter,
+                    search=q,
+                    active_period=active_period,
+                    cached=cachedCount
+                )
+                logger.info("User %s counted %d organizations", user,
+                            total_count)
+                return create_count_http_response(
+                    total_count=total_count,
+                    include_body=request.method != "HEAD"
+                )
+
+            organizations = crud.get_all_organizations(
+                db=db,
+                filters=filter_dict,
+                authorized_user_id=authorized_user_id,
+                offset=offset,
+                limit=limit,
+                operator_filters=operator_filters,
+                characteristic_filter=characteristic_filter,
+                search=q,
+                sort=sort,
+                active_period=active_period
+            )
 
         # Parse to Pydantic Model
         tmf632_organizations = []
@@ -152,8 +502,12 @@ async def get_organization(
             else:
                 tmf632_organizations.append(organization)
 
-        logger.info(f"User {user} obtained information regarding the " +
-                    f"following organizations {tmf632_organizations}")
+        # Only the number of organizations is logged at INFO. Their
+        # contents, which may be large, are only formatted at DEBUG
+        logger.info("User %s obtained information regarding %d " +
+                    "organizations", user, len(tmf632_organizations))
+        logger.debug("Organizations obtained by user %s: %s", user,
+                     Truncated(tmf632_organizations))
 
         # Apply 'fields' filter and encode/parse to dict
         encoded_organizations = [
@@ -176,6 +530,49 @@ async def get_organization(
         return exception_to_http_response(exception)
 
 
+@router.get(
+    "/users/{sub}/organizations",
+    tags=["authorized users"],
+    summary="Lists the Organizations a User is authorized to access",
+    description="This operation lists all Organizations for which the user " +
+    "is an Authorized User.",
+    response_model=list[TMF632Schemas.Organization],
+)
+async def get_user_authorized_organizations(
+    sub: str,
+    db: Session = Depends(get_db),
+    user=Depends(idp.get_current_user(required_roles=[IDP_TESTBED_ADMIN_USER]))
+):
+    try:
+        logger.info(f"User {user} is trying to obtain the organizations " +
+                    f"user {sub} is authorized to access...")
+
+        # Only admins may inspect the organizations of other users
+        check_if_user_is_authorized_to_access_user_organizations(
+            user=user,
+            sub=sub
+        )
+
+        organizations = crud.get_authorized_organizations_for_user(db, sub)
+
+        logger.info(f"User {user} obtained the {len(organizations)} " +
+                    f"organizations user {sub} is authorized to access")
+
+        # Response
+        return create_http_response(
+                http_status=HTTPStatus.OK,
+                content=[
+                    jsonable_encoder(
+                        organization_to_organization_schema(organization)
+                    )
+                    for organization
+                    in organizations
+                ]
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
+
+
 @router.delete(
     "/organization/{id}",
     tags=["organization"],
@@ -219,22 +616,32 @@ async def update_organization(
         logger.info(f"User {user} is trying to patch the organization with " +
                     f"the id {id}...")
 
-        current_organization = crud.get_organization_by_id(db, id)
+        # Get the organization and the user's permissions over it
+        organization_access = crud.get_organization_for_user(
+            db=db,
+            id=id,
+            user_id=user.sub,
+            is_admin=IDP_ADMIN_USER in user.roles
+        )
         # If the user is not also an admin user, we have to verify if
         # it has the permissions to get the organization he requested
         # If the user doesn't possess the needed permissions, this
         # function will raise an exception and the method will return a
         # 403 FORBIDDEN
+        if organization_access.organization:
+            check_organization_access(organization_access)
 
-        check_if_user_is_authorized_to_access_an_organization(
-            user=user,
-            organization=current_organization
+        updated_organization = crud.update_organization(
+            db=db,
+            organization_id=id,
+            organization=organization,
+            db_organization=organization_access.organization
         )
 
-        updated_organization = crud.update_organization(db, id, organization)
-
-        logger.info(f"User {user} is patched the organization with the id " +
-                    f"{id}. Updated organization: {updated_organization}")
+        logger.info("User %s patched the organization with the id %s",
+                    user, id)
+        logger.debug("Organization patched by user %s: %s", user,
+                     Truncated(updated_organization))
         # Response
         return create_http_response(
                 http_status=HTTPStatus.OK,
@@ -267,9 +674,15 @@ async def get_organization_authorized_users(
         logger.info(f"User {user} is trying to get the authorized users for " +
                     f"the organization with the id {id}...")
 
-        # Get the organization, if it exists. Else, raise exception
-        organization = crud.get_organization_by_id(db, id)
-        if not organization:
+        # Get the organization, its authorized users and the user's
+        # permissions over it, if it exists. Else, raise exception
+        organization_access = crud.get_organization_for_user(
+            db=db,
+            id=id,
+            user_id=user.sub,
+            is_admin=IDP_ADMIN_USER in user.roles
+        )
+        if not organization_access.organization:
             raise CRUDExceptions.EntityDoesNotExist(
                 entity_type="Organization",
                 reason="The requested organization doesn't exist."
@@ -280,10 +693,7 @@ async def get_organization_authorized_users(
         # If the user doesn't possess the needed permissions, this
         # function will raise an exception and the method will return a
         # 403 FORBIDDEN
-        check_if_user_is_authorized_to_access_an_organization(
-            user=user,
-            organization=organization
-        )
+        check_organization_access(organization_access)
 
         logger.info(f"User {user} retrieved the authorized users for " +
                     f"the organization with the id {id}.")
@@ -292,8 +702,10 @@ async def get_organization_authorized_users(
         return create_http_response(
                 http_status=HTTPStatus.OK,
                 content=jsonable_encoder(
-                    organization_authorized_users_to_schema(
-                        organization=organization
+                    authorized_user_ids_to_schema(
+                        organization_id=id,
+                        authorized_user_ids=organization_access
+                        .authorized_user_ids
                     )
                 )
             )
@@ -323,9 +735,15 @@ async def create_organization_authorized_user(
         logger.info(f"User {user} is trying to create an authorized users " +
                     f"for the organization with the id {id}...")
 
-        # Get the organization, if it exists. Else, raise exception
-        organization = crud.get_organization_by_id(db, id)
-        if not organization:
+        # Get the organization, its authorized users and the user's
+        # permissions over it, if it exists. Else, raise exception
+        organization_access = crud.get_organization_for_user(
+            db=db,
+            id=id,
+            user_id=auth_user.sub,
+            is_admin=IDP_ADMIN_USER in auth_user.roles
+        )
+        if not organization_access.organization:
             raise CRUDExceptions.EntityDoesNotExist(
                 entity_type="Organization",
                 reason="The requested organization doesn't exist."
@@ -336,10 +754,7 @@ async def create_organization_authorized_user(
         # If the user doesn't possess the needed permissions, this
         # function will raise an exception and the method will return a
         # 403 FORBIDDEN
-        check_if_user_is_authorized_to_access_an_organization(
-            user=auth_user,
-            organization=organization
-        )
+        check_organization_access(organization_access)
 
         # Create Authorized User
         authorized_user = crud.create_authorized_user(
@@ -356,8 +771,10 @@ async def create_organization_authorized_user(
         return create_http_response(
                 http_status=HTTPStatus.OK,
                 content=jsonable_encoder(
-                    organization_authorized_users_to_schema(
-                        organization=organization
+                    authorized_user_ids_to_schema(
+                        organization_id=id,
+                        authorized_user_ids=organization_access
+                        .authorized_user_ids + [authorized_user.user_id]
                     )
                 )
             )
@@ -386,9 +803,15 @@ async def delete_organization_authorized_user(
         logger.info(f"User {auth_user} is trying to delete an authorized " +
                     f"user of the organization with the id {id}...")
 
-        # Get the organization, if it exists. Else, raise exception
-        organization = crud.get_organization_by_id(db, id)
-        if not organization:
+        # Get the organization, its authorized users and the user's
+        # permissions over it, if it exists. Else, raise exception
+        organization_access = crud.get_organization_for_user(
+            db=db,
+            id=id,
+            user_id=auth_user.sub,
+            is_admin=IDP_ADMIN_USER in auth_user.roles
+        )
+        if not organization_access.organization:
             raise CRUDExceptions.EntityDoesNotExist(
                 entity_type="Organization",
                 reason="The requested organization doesn't exist."
@@ -399,10 +822,7 @@ async def delete_organization_authorized_user(
         # If the user doesn't possess the needed permissions, this
         # function will raise an exception and the method will return a
         # 403 FORBIDDEN
-        check_if_user_is_authorized_to_access_an_organization(
-            user=auth_user,
-            organization=organization
-        )
+        check_organization_access(organization_access)
 
         crud.delete_authorized_user_for_organization(
             db=db,
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 10:37:19
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 12:36:45
+
+# generic imports
+from fastapi import (
+    APIRouter,
+    Depends,
+    Query,
+)
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+import logging
+
+# custom imports
+from idp.idp import idp
+from profiling.sampler import (
+    DEFAULT_INTERVAL,
+    MAX_DURATION,
+    MAX_INTERVAL,
+    MIN_INTERVAL,
+    format_collapsed,
+    sampling_profiler,
+)
+from routers.aux import exception_to_http_response
+from aux.constants import IDP_ADMIN_USER
+
+# Logger
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get(
+    "/profile",
+    tags=["profiling"],
+    summary="Profile the worker",
+    description="Samples the stacks of the worker's threads for the given " +
+    "number of seconds, while it keeps handling requests, and returns how " +
+    "many times each stack was seen, in the collapsed format of " +
+    "flamegraph.pl and speedscope. Only one profile runs at a time. " +
+    "A single request is profiled by adding '__profile=1' to its query.",
+    response_class=PlainTextResponse,
+)
+async def profile_worker(
+    seconds: float = Query(
+        default=10,
+        gt=0,
+        le=MAX_DURATION,
+        description="How long to profile the worker for"
+    ),
+    interval: float = Query(
+        default=DEFAULT_INTERVAL,
+        ge=MIN_INTERVAL,
+        le=MAX_INTERVAL,
+        description="Seconds between samples"
+    ),
+    user=Depends(idp.get_current_user(required_roles=[IDP_ADMIN_USER]))
+):
+    try:
+        logger.info("User %s is profiling the worker for %ss...",
+                    user, seconds)
+        # Sampled from the threadpool, so that the event loop keeps handling
+        # the requests being profiled
+        stacks = await run_in_threadpool(
+            sampling_profiler.profile,
+            seconds,
+            interval
+        )
+        return PlainTextResponse(
+            format_collapsed(stacks),
+            headers={
+                "Content-Disposition":
+                    'attachment; filename="profile.collapsed"'
+            }
+        )
+    except Exception as exception:
+        return exception_to_http_response(exception)
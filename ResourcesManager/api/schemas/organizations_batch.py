@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-30 11:20:47
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-30 15:02:13
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+from pydantic import BaseModel, Field, conlist
+
+# Kept below SQLite's default limit of bound parameters per statement
+BATCH_GET_MAX_IDS = 500
+
+
+class OrganizationsBatchGet(BaseModel):
+    ids: conlist(int, min_items=1, max_items=BATCH_GET_MAX_IDS) = Field(
+        ...,
+        description='Ids of the Organizations to obtain'
+    )
+
+
+class OrganizationsBatchGetResult(BaseModel):
+    organizations: List[Dict[str, Any]] = Field(
+        [], description='Organizations the user is authorized to access'
+    )
+    notFound: List[int] = Field(
+        [], description='Ids of the Organizations that do not exist'
+    )
+    forbidden: List[int] = Field(
+        [],
+        description='Ids of the Organizations the user is not authorized ' +
+        'to access'
+    )
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-30 15:10:26
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-30 16:41:05
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+    MockOIDCUser
+)
+from aux.constants import (
+    IDP_TESTBED_ADMIN_USER,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+# Tests
+def test_batch_get_organizations_by_testbed_admin():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+
+    db_organizations = [
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_url",
+                        value=f"http://{trading_name}:8080/",
+                        valueType="URL",
+                    ),
+                ]
+            )
+        )
+        for trading_name in ["XXX", "YYY", "ZZZ"]
+    ]
+    for db_organization in db_organizations[1:]:
+        crud.create_authorized_user(
+            db=database,
+            user_id=user_id,
+            organization_id=db_organization.id
+        )
+
+    ids = [
+        db_organizations[2].id,
+        db_organizations[0].id,
+        1000,
+        db_organizations[1].id,
+    ]
+    response = test_client.post(
+        "/organization/batch-get?fields=id,tradingName,partyCharacteristic",
+        json={"ids": ids}
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert [o["tradingName"] for o in response.json()["organizations"]]\
+        == ["ZZZ", "YYY"]
+    assert response.json()["organizations"][0]["partyCharacteristic"][0][
+        "value"
+    ] == "http://ZZZ:8080/"
+    assert set(response.json()["organizations"][0].keys())\
+        == {"id", "tradingName", "partyCharacteristic"}
+    assert response.json()["notFound"] == [1000]
+    assert response.json()["forbidden"] == [db_organizations[0].id]
+
+
+def test_batch_get_organizations_by_admin():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    db_organizations = [
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+            )
+        )
+        for trading_name in ["XXX", "YYY"]
+    ]
+    crud.delete_organization(database, db_organizations[1].id)
+
+    response = test_client.post(
+        "/organization/batch-get",
+        json={"ids": [db_organizations[0].id, db_organizations[1].id]}
+    )
+    response_empty = test_client.post(
+        "/organization/batch-get",
+        json={"ids": []}
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert [o["tradingName"] for o in response.json()["organizations"]]\
+        == ["XXX"]
+    assert response.json()["notFound"] == [db_organizations[1].id]
+    assert response.json()["forbidden"] == []
+    assert response_empty.status_code == 400
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-23 14:40:26
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-23 16:22:08
+
+# general imports
+import pytest
+import msgpack
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+# Tests
+def test_create_organization_with_msgpack():
+
+    # Make request using a VPilot Admin and Testbed Admin Role
+    inject_admin_user()
+
+    response = test_client.post(
+        "/organization/",
+        data=msgpack.packb({
+            "tradingName": "XXX",
+            "partyCharacteristic": [
+                {"name": "ci_cd_agent_url", "value": "http://10.0.0.1/"}
+            ]
+        }),
+        headers={
+            "Content-Type": "application/msgpack",
+            "Accept": "application/msgpack",
+        }
+    )
+    organization = msgpack.unpackb(response.content)
+
+    # Test
+    assert response.status_code == 201
+    assert response.headers["content-type"] == "application/msgpack"
+    assert organization["tradingName"] == "XXX"
+    assert organization["partyCharacteristic"][0]["value"]\
+        == "http://10.0.0.1/"
+
+
+def test_get_organizations_with_msgpack_and_json():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+
+    response_msgpack = test_client.get(
+        "/organization/",
+        headers={"Accept": "application/msgpack, application/json;q=0.5"}
+    )
+    response_json = test_client.get(
+        "/organization/",
+        headers={"Accept": "application/xml, */*"}
+    )
+
+    # Test
+    assert response_msgpack.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response_msgpack.content) == response_json.json()
+    assert response_json.headers["content-type"] == "application/json"
+
+
+def test_invalid_msgpack_payload():
+
+    # Prepare Test
+    inject_admin_user()
+
+    response = test_client.post(
+        "/organization/",
+        data=b"\xc1",
+        headers={"Content-Type": "application/msgpack"}
+    )
+    invalid_schema_response = test_client.post(
+        "/organization/",
+        data=msgpack.packb({"name": "XXX"}),
+        headers={"Content-Type": "application/msgpack"}
+    )
+
+    # Test
+    assert response.status_code == 400
+    assert "payload_location=body" in response.json()["reason"]
+    assert invalid_schema_response.status_code == 400
+    assert "payload_location=body/tradingName"\
+        in invalid_schema_response.json()["reason"]
+
+
+def test_create_organization_with_cbor():
+
+    # Prepare Test
+    cbor2 = pytest.importorskip("cbor2")
+    inject_admin_user()
+
+    response = test_client.post(
+        "/organization/",
+        data=cbor2.dumps({"tradingName": "YYY"}),
+        headers={
+            "Content-Type": "application/cbor",
+            "Accept": "application/cbor",
+        }
+    )
+
+    # Test
+    assert response.status_code == 201
+    assert cbor2.loads(response.content)["tradingName"] == "YYY"
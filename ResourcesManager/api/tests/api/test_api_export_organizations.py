@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-24 15:10:33
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-24 16:47:09
+
+# general imports
+import io
+import pytest
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from aux import columnar_export as ColumnarExport
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+    MockOIDCUser
+)
+from aux.constants import (
+    IDP_ADMIN_USER,
+    IDP_TESTBED_ADMIN_USER,
+)
+
+pyarrow = pytest.importorskip("pyarrow")
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def create_organizations(database, n_organizations):
+    for i in range(n_organizations):
+        db_organization = crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=f"Testbed {i}",
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime="2015-10-22T08:31:52.026Z",
+                ),
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_url",
+                        value=f"http://10.0.0.{i}/",
+                    ),
+                ]
+            )
+        )
+        crud.create_authorized_user(
+            db=database,
+            user_id=f"user-{i}",
+            organization_id=db_organization.id
+        )
+
+
+# Tests
+def test_export_organizations_as_arrow_stream():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+    create_organizations(database, 3)
+    crud.delete_organization(database, 3)
+
+    response = test_client.get("/organization/export")
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+
+    # Test
+    assert response.status_code == 200
+    assert response.headers["content-type"]\
+        == "application/vnd.apache.arrow.stream"
+    assert table.num_rows == 2
+    assert table.column("tradingName").to_pylist()\
+        == ["Testbed 0", "Testbed 1"]
+
+
+def test_export_characteristics_as_parquet():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+    create_organizations(database, 3)
+
+    response = test_client.get(
+        "/organization/export?table=characteristics&format=parquet"
+    )
+    table = pyarrow.parquet.read_table(io.BytesIO(response.content))
+
+    # Test
+    assert response.status_code == 200
+    assert table.num_rows == 3
+    assert table.column("value").to_pylist()[2] == "http://10.0.0.2/"
+
+
+def test_export_in_batches_to_directory(tmp_path):
+
+    # Prepare Test
+    database = next(override_get_db())
+    create_organizations(database, 5)
+
+    paths = ColumnarExport.export_to_directory(
+        db=database,
+        output_dir=str(tmp_path),
+        export_format=ColumnarExport.PARQUET,
+        batch_size=2
+    )
+    organizations = pyarrow.parquet.ParquetFile(
+        str(tmp_path / "organizations.parquet")
+    )
+    authorized_users = pyarrow.parquet.read_table(
+        str(tmp_path / "authorizedUsers.parquet")
+    )
+
+    # Test
+    assert len(paths) == 4
+    assert organizations.metadata.num_rows == 5
+    assert organizations.metadata.num_row_groups == 3
+    assert authorized_users.column("user_id").to_pylist()[4] == "user-4"
+
+
+def test_export_without_required_roles():
+
+    # Prepare Test
+    MockOIDCUser().inject_mocked_oidc_user(
+        id="1111-1111-1111-1111",
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    response = test_client.get("/organization/export")
+
+    # Test
+    assert response.status_code == 403
+    assert response.json()['reason'] == f'Role "{IDP_ADMIN_USER}" is '\
+        'required to perform this action'
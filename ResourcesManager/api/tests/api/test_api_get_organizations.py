@@ -10,10 +10,15 @@ import datetime
 
 # custom imports
 from database.crud import crud
+from database.models import models
 import schemas.tmf632_party_mgmt as TMF632Schemas
 from tests.configure_test_idp import (
     inject_admin_user,
     setup_test_idp,
+    MockOIDCUser
+)
+from aux.constants import (
+    IDP_TESTBED_ADMIN_USER,
 )
 
 
@@ -258,3 +263,405 @@ def test_get_filtered_organizations():
     assert response_organizations_3.json()[3]["tradingName"] == "YYY"
     assert response_organizations_3.json()[3]["name"] == "YYY's Testbed2"
     assert response_organizations_3.json()[3]["organizationType"] == "Testbed2"
+
+
+def test_get_organizations_by_unauthorized_testbed_admin():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+
+    db_organizations = [
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+            )
+        )
+        for trading_name in ["XXX", "YYY", "ZZZ", "WWW"]
+    ]
+    for db_organization in db_organizations[1:]:
+        crud.create_authorized_user(
+            db=database,
+            user_id=user_id,
+            organization_id=db_organization.id
+        )
+    crud.create_authorized_user(
+        db=database,
+        user_id="2222-2222-2222-2222",
+        organization_id=db_organizations[0].id
+    )
+
+    response = test_client.get("/organization/")
+    response_page = test_client.get("/organization/?offset=1&limit=1")
+
+    # Test
+    assert response.status_code == 200
+    assert [o["tradingName"] for o in response.json()]\
+        == ["YYY", "ZZZ", "WWW"]
+    assert response_page.status_code == 200
+    assert [o["tradingName"] for o in response_page.json()] == ["ZZZ"]
+
+
+def test_get_paginated_organizations_by_global_admin():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name in ["XXX", "YYY", "ZZZ"]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+            )
+        )
+
+    response_page_1 = test_client.get("/organization/?offset=0&limit=2")
+    response_page_2 = test_client.get("/organization/?offset=2&limit=2")
+    response_invalid_limit = test_client.get("/organization/?limit=0")
+
+    # Test
+    assert [o["tradingName"] for o in response_page_1.json()]\
+        == ["XXX", "YYY"]
+    assert [o["tradingName"] for o in response_page_2.json()] == ["ZZZ"]
+    assert response_invalid_limit.status_code == 400
+
+
+def test_get_organizations_with_operator_filters():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name, name, status, start_date_time in [
+        ("XXX", "XXX's Testbed", "initialized", "2015-10-22T08:31:52.026Z"),
+        ("YYY", "YYY's Testbed", "validated", "2016-10-22T08:31:52.026Z"),
+        ("ZZZ", "ZZZ's Testbed", "closed", "2017-10-22T08:31:52.026Z"),
+        ("WWW", "XXX's Lab", "validated", "2018-10-22T08:31:52.026Z"),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                name=name,
+                status=status,
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime=start_date_time,
+                ),
+            )
+        )
+
+    response_like = test_client.get("/organization/?name.like=XXX%25")
+    response_in = test_client.get(
+        "/organization/?status.in=initialized,validated&tradingName.ne=WWW"
+    )
+    response_range = test_client.get(
+        "/organization/?existsDuring.startDateTime.gt=2016-01-01T00:00:00Z" +
+        "&existsDuring.startDateTime.lte=2017-10-22T08:31:52.026Z"
+    )
+    response_full_scan = test_client.get("/organization/?name.like=%25Lab")
+    response_ne_only = test_client.get("/organization/?status.ne=closed")
+
+    # Test
+    assert response_like.status_code == 200
+    assert [o["tradingName"] for o in response_like.json()]\
+        == ["XXX", "WWW"]
+    assert response_in.status_code == 200
+    assert [o["tradingName"] for o in response_in.json()]\
+        == ["XXX", "YYY"]
+    assert response_range.status_code == 200
+    assert [o["tradingName"] for o in response_range.json()]\
+        == ["YYY", "ZZZ"]
+    assert response_full_scan.status_code == 400
+    assert "name.like" in response_full_scan.json()["reason"]
+    assert response_ne_only.status_code == 400
+
+
+def test_get_organizations_by_party_characteristic():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name, agent_url in [
+        ("XXX", "http://192.168.1.200:8080/"),
+        ("YYY", "http://192.168.1.201:8080/"),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_url",
+                        value=agent_url,
+                        valueType="URL",
+                    ),
+                ]
+            )
+        )
+
+    response = test_client.get(
+        "/organization/?partyCharacteristic.name=ci_cd_agent_url" +
+        "&partyCharacteristic.value=http://192.168.1.200:8080/"
+    )
+    response_value_only = test_client.get(
+        "/organization/?partyCharacteristic.value=http://192.168.1.200:8080/"
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert [o["tradingName"] for o in response.json()] == ["XXX"]
+    assert response_value_only.status_code == 400
+
+
+def test_search_organizations():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name, name in [
+        ("Testbed", "Aveiro"),
+        ("Aveiro", "Aveiro Testbed"),
+        ("Athens", "Athens Testbed"),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                name=name,
+            )
+        )
+
+    response = test_client.get("/organization/?q=aveiro testbed")
+    response_no_words = test_client.get("/organization/?q=%25%25")
+
+    # Test
+    assert response.status_code == 200
+    # Both match, the one mentioning 'aveiro' twice ranks first
+    assert [o["name"] for o in response.json()]\
+        == ["Aveiro Testbed", "Aveiro"]
+    assert response_no_words.status_code == 400
+
+
+def test_get_sorted_organizations():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name in ["YYY", "XXX", "ZZZ"]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+            )
+        )
+
+    response = test_client.get("/organization/?sort=-tradingName")
+    response_invalid = test_client.get("/organization/?sort=isHeadOffice")
+
+    # Test
+    assert response.status_code == 200
+    assert [o["tradingName"] for o in response.json()]\
+        == ["ZZZ", "YYY", "XXX"]
+    assert response_invalid.status_code == 400
+
+
+def test_count_organizations():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name, status in [
+        ("XXX", "validated"),
+        ("YYY", "validated"),
+        ("ZZZ", "initialized"),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                status=status,
+            )
+        )
+
+    response_head = test_client.head("/organization/?status=validated")
+    response_count = test_client.get(
+        "/organization/?countOnly=true&status.in=initialized,validated"
+    )
+    response_cached_count_1 = test_client.get(
+        "/organization/?countOnly=true&cachedCount=true"
+    )
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="WWW")
+    )
+    response_cached_count_2 = test_client.get(
+        "/organization/?countOnly=true&cachedCount=true"
+    )
+
+    # Test
+    assert response_head.status_code == 200
+    assert response_head.headers["X-Total-Count"] == "2"
+    assert response_head.content == b""
+    assert response_count.status_code == 200
+    assert response_count.headers["X-Total-Count"] == "3"
+    assert response_count.json() == {"totalCount": 3}
+    assert response_cached_count_1.json() == {"totalCount": 3}
+    # Writes invalidate the cached counts
+    assert response_cached_count_2.json() == {"totalCount": 4}
+
+
+def test_get_active_organizations():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    for trading_name, start_date_time, end_date_time in [
+        ("XXX", "2015-01-01T00:00:00Z", "2016-01-01T00:00:00Z"),
+        ("YYY", "2016-01-01T00:00:00Z", None),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime=start_date_time,
+                    endDateTime=end_date_time,
+                ),
+            )
+        )
+
+    response_active_at = test_client.get(
+        "/organization/?activeAt=2020-01-01T00:00:00Z"
+    )
+    response_active_between = test_client.get(
+        "/organization/?activeBetween=2014-01-01T00:00:00Z," +
+        "2016-06-01T00:00:00Z&existsDuring.endDateTime.lt=2017-01-01T00:00:00Z"
+    )
+    response_invalid = test_client.get("/organization/?activeAt=yesterday")
+
+    # Test
+    assert response_active_at.status_code == 200
+    assert [o["tradingName"] for o in response_active_at.json()] == ["YYY"]
+    assert response_active_between.status_code == 200
+    assert [o["tradingName"] for o in response_active_between.json()]\
+        == ["XXX"]
+    assert response_invalid.status_code == 400
+
+
+def test_get_organization_from_precomputed_document():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="XXX",
+            existsDuring=TMF632Schemas.TimePeriod(
+                startDateTime="2015-10-22T08:31:52.026Z",
+                endDateTime="2016-10-22T08:31:52.026Z",
+            ),
+            partyCharacteristic=[
+                TMF632Schemas.Characteristic(
+                    name="ci_cd_agent_url",
+                    value="http://192.168.1.200:8080/",
+                    valueType="URL",
+                ),
+            ]
+        )
+    )
+
+    response_document = test_client.get(
+        f"/organization/{db_organization.id}"
+    )
+    response_fields = test_client.get(
+        f"/organization/{db_organization.id}?fields=tradingName"
+    )
+    # Without a precomputed document, the organization is loaded
+    database.query(models.OrganizationDocument).delete()
+    database.commit()
+    response_loaded = test_client.get(f"/organization/{db_organization.id}")
+
+    # Test
+    assert response_document.status_code == 200
+    assert response_document.json() == response_loaded.json()
+    assert response_fields.json() == {"tradingName": "XXX"}
+
+
+def test_get_organizations_changed_since():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+
+    db_organizations = [
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name
+            )
+        )
+        for trading_name in ["XXX", "YYY", "ZZZ"]
+    ]
+    for db_organization in db_organizations[:2]:
+        crud.create_authorized_user(
+            db=database,
+            user_id=user_id,
+            organization_id=db_organization.id
+        )
+
+    response_full = test_client.get("/organization/?since=0&fields=id")
+    crud.delete_organization(database, db_organizations[1].id)
+    response_changes = test_client.get(
+        "/organization/?since=" + response_full.headers["X-Change-Seq"]
+    )
+
+    inject_admin_user()
+    response_admin = test_client.get("/organization/?since=0&limit=2")
+
+    # Test
+    assert response_full.status_code == 200
+    assert response_full.json() == {
+        "organizations": [
+            {"id": str(db_organizations[0].id)},
+            {"id": str(db_organizations[1].id)},
+        ],
+        "deleted": [],
+        "changeSeq": 5,
+    }
+    assert response_changes.status_code == 200
+    assert response_changes.json()["organizations"] == []
+    assert response_changes.json()["deleted"]\
+        == [str(db_organizations[1].id)]
+    assert response_changes.headers["X-Change-Seq"] == "6"
+    assert [o["tradingName"] for o in response_admin.json()["organizations"]]\
+        == ["ZZZ", "XXX"]
+    assert response_admin.json()["changeSeq"] == 4
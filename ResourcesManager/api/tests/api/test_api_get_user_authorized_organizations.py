@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-20 10:12:41
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-20 11:02:17
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+    MockOIDCUser
+)
+from aux.constants import (
+    IDP_TESTBED_ADMIN_USER,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def create_organizations(database):
+    organizations = []
+    for trading_name in ["XXX", "YYY", "ZZZ"]:
+        organizations.append(
+            crud.create_organization(
+                db=database,
+                organization=TMF632Schemas.OrganizationCreate(
+                    tradingName=trading_name,
+                    organizationType="Testbed",
+                    existsDuring=TMF632Schemas.TimePeriod(
+                        startDateTime="2015-10-22T08:31:52.026Z",
+                    ),
+                    partyCharacteristic=[
+                        TMF632Schemas.Characteristic(
+                            name="ci_cd_agent_url",
+                            value=f"http://{trading_name}.example.org/",
+                        ),
+                    ]
+                )
+            )
+        )
+    return organizations
+
+
+# Tests
+def test_get_own_authorized_organizations():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+    organizations = create_organizations(database)
+    for organization in organizations[:2]:
+        crud.create_authorized_user(
+            db=database,
+            user_id=user_id,
+            organization_id=organization.id
+        )
+
+    response = test_client.get(f"/users/{user_id}/organizations")
+
+    # Test
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.json()[0]["tradingName"] == "XXX"
+    assert response.json()[1]["tradingName"] == "YYY"
+    assert response.json()[1]["existsDuring"]["startDateTime"]\
+        .startswith("2015-10-22T08:31:52")
+    assert response.json()[1]["partyCharacteristic"][0]["value"]\
+        == "http://YYY.example.org/"
+
+
+def test_get_other_user_authorized_organizations_without_permissions():
+
+    # Prepare Test
+    MockOIDCUser().inject_mocked_oidc_user(
+        id="1111-1111-1111-1111",
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    response = test_client.get("/users/2222-2222-2222-2222/organizations")
+
+    # Test
+    assert response.status_code == 403
+    assert response.json()['reason'] == 'User not authorized to access '\
+        'the organizations of user 2222-2222-2222-2222'
+
+
+def test_get_other_user_authorized_organizations_by_global_admin():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+    organizations = create_organizations(database)
+    crud.create_authorized_user(
+        db=database,
+        user_id="2222-2222-2222-2222",
+        organization_id=organizations[2].id
+    )
+
+    response = test_client.get("/users/2222-2222-2222-2222/organizations")
+
+    # Test
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.json()[0]["tradingName"] == "ZZZ"
+
+
+def test_get_organizations_authorized_for_me():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+    organizations = create_organizations(database)
+    crud.create_authorized_user(
+        db=database,
+        user_id=user_id,
+        organization_id=organizations[1].id
+    )
+    crud.delete_organization(database, organizations[0].id)
+
+    response = test_client.get("/organization/?authorizedFor=me")
+
+    # Test
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.json()[0]["tradingName"] == "YYY"
+    assert response.json()[0]["partyCharacteristic"][0]["name"]\
+        == "ci_cd_agent_url"
+
+
+def test_get_organizations_authorized_for_me_with_filters():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+    organizations = create_organizations(database)
+    for organization in organizations[:2]:
+        crud.create_authorized_user(
+            db=database,
+            user_id=user_id,
+            organization_id=organization.id
+        )
+
+    response = test_client.get(
+        "/organization/?authorizedFor=me&tradingName=YYY" +
+        "&organizationType=Testbed"
+    )
+    response_not_authorized = test_client.get(
+        "/organization/?authorizedFor=me&tradingName=ZZZ"
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert [
+        organization["tradingName"] for organization in response.json()
+    ] == ["YYY"]
+    assert response_not_authorized.status_code == 200
+    assert response_not_authorized.json() == []
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-04 16:47:08
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-04 18:02:35
+
+# general imports
+import json
+import pytest
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from events import dispatcher as Dispatcher
+from events import organization_events as OrganizationEvents
+from events.outbox import OutboxRelay
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+    MockOIDCUser
+)
+from tests.unit.test_event_dispatcher import MockSession
+from aux.constants import (
+    IDP_TESTBED_ADMIN_USER,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db,
+        TestingSessionLocal as imported_testing_session_local
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+    global TestingSessionLocal
+    TestingSessionLocal = imported_testing_session_local
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    OrganizationEvents.subscriptions_cache.invalidate()
+    yield
+    Base.metadata.drop_all(bind=engine)
+    OrganizationEvents.subscriptions_cache.invalidate()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = MockSession()
+    dispatcher = Dispatcher.EventDispatcher(
+        workers=2,
+        session_factory=lambda: session
+    )
+    monkeypatch.setattr(Dispatcher, "event_dispatcher", dispatcher)
+    yield session
+    dispatcher.stop()
+
+
+def relay_events():
+    return OutboxRelay(session_factory=TestingSessionLocal).relay_pending()
+
+
+# Tests
+def test_hub_notifies_organization_events(session):
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    response_all = test_client.post(
+        "/hub",
+        json={"callback": "http://listener/all"}
+    )
+    response_deletes = test_client.post(
+        "/hub",
+        json={
+            "callback": "http://listener/deletes",
+            "query": "eventType=OrganizationDeleteEvent"
+        }
+    )
+
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+    crud.update_organization(
+        db=database,
+        organization_id=db_organization.id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="YYY",
+            status="validated"
+        )
+    )
+    crud.delete_organization(database, db_organization.id)
+    relay_events()
+
+    notifications = [
+        (url, json.loads(body)) for url, body in session.posts
+    ]
+
+    # Test
+    assert response_all.status_code == 201
+    assert response_all.json()["callback"] == "http://listener/all"
+    assert response_deletes.status_code == 201
+    assert [
+        notification["eventType"]
+        for url, notification in notifications
+        if url == "http://listener/all"
+    ] == [
+        "OrganizationCreateEvent",
+        "OrganizationAttributeValueChangeEvent",
+        "OrganizationStateChangeEvent",
+        "OrganizationDeleteEvent",
+    ]
+    assert [
+        (notification["eventType"],
+         notification["event"]["organization"]["tradingName"])
+        for url, notification in notifications
+        if url == "http://listener/deletes"
+    ] == [("OrganizationDeleteEvent", "YYY")]
+
+
+def test_hub_unregister_listener(session):
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    response_register = test_client.post(
+        "/hub",
+        json={"callback": "http://listener/all"}
+    )
+    response_unregister = test_client.delete(
+        f"/hub/{response_register.json()['id']}"
+    )
+    response_unregister_again = test_client.delete(
+        f"/hub/{response_register.json()['id']}"
+    )
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+    relay_events()
+
+    # Test
+    assert response_unregister.status_code == 204
+    assert response_unregister_again.status_code == 400
+    assert session.posts == []
+
+
+def test_hub_invalid_subscriptions(session):
+
+    # Prepare Test
+    inject_admin_user()
+
+    response_unknown_event = test_client.post(
+        "/hub",
+        json={
+            "callback": "http://listener/all",
+            "query": "eventType=IndividualCreateEvent"
+        }
+    )
+
+    MockOIDCUser().inject_mocked_oidc_user(
+        id="1111-1111-1111-1111",
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+    response_unauthorized = test_client.post(
+        "/hub",
+        json={"callback": "http://listener/all"}
+    )
+
+    # Test
+    assert response_unknown_event.status_code == 400
+    assert response_unauthorized.status_code in [401, 403]
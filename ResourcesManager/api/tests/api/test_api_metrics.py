@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 16:11:52
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:58:19
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+from middleware.metrics import MetricsMiddleware
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+    from main import app as imported_app
+    global app
+    app = imported_app
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def get_metrics():
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    metrics = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            metrics[name] = float(value)
+    return metrics
+
+
+def metric(metrics: dict, name: str):
+    return metrics.get(name, 0)
+
+
+# Tests
+def test_metrics_of_routes_and_database():
+
+    # Prepare Test
+    inject_admin_user()
+    database = next(override_get_db())
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+
+    route_labels = "method=\"GET\",route=\"/organization/{id}\""
+    responses_ok = f"http_responses_total{{{route_labels},status=\"200\"}}"
+    requests = f"http_request_duration_seconds_count{{{route_labels}}}"
+    request_queries = f"http_request_sql_queries_sum{{{route_labels}}}"
+    document_hits = "cache_hits_total{cache=\"organization_documents\"}"
+    document_misses = \
+        "cache_misses_total{cache=\"organization_documents\"}"
+
+    metrics_before = get_metrics()
+    for _ in range(2):
+        test_client.get(f"/organization/{db_organization.id}")
+    test_client.get(f"/organization/{db_organization.id + 1}")
+    metrics = get_metrics()
+
+    # Test
+    # Requests are labelled by the route's template, not their path
+    assert metric(metrics, responses_ok) \
+        - metric(metrics_before, responses_ok) == 3
+    assert metric(metrics, requests) - metric(metrics_before, requests) == 3
+    assert metric(metrics, request_queries) \
+        > metric(metrics_before, request_queries)
+    assert metric(metrics, document_hits) \
+        - metric(metrics_before, document_hits) == 2
+    # The missing organization has no precomputed document
+    assert metric(metrics, document_misses) \
+        - metric(metrics_before, document_misses) == 1
+    assert metric(metrics, "db_queries_total") \
+        > metric(metrics_before, "db_queries_total")
+    assert metric(metrics, "db_pool_checkout_wait_seconds_count") > 0
+    assert "cache_hit_ratio{cache=\"compressed_bodies\"}" in metrics
+    assert "outbox_pending_events" in metrics
+    assert "change_feed_subscribers" in metrics
+
+
+def test_metrics_of_unmatched_routes():
+
+    # Prepare Test
+    responses_not_found = "http_responses_total{method=\"GET\"," + \
+        "route=\"other\",status=\"404\"}"
+
+    metrics_before = get_metrics()
+    test_client.get("/does-not-exist/1")
+    test_client.get("/does-not-exist/2")
+    metrics = get_metrics()
+
+    # Test
+    assert metric(metrics, responses_not_found) \
+        - metric(metrics_before, responses_not_found) == 2
+
+
+def test_metrics_middleware_is_the_outermost():
+
+    # Test
+    # add_middleware inserts at the front, so the last added comes first
+    assert app.user_middleware[0].cls is MetricsMiddleware
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-06 16:03:44
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-06 18:20:19
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+from events.change_feed import change_broadcaster
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+    MockOIDCUser
+)
+from aux.constants import (
+    IDP_TESTBED_ADMIN_USER,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def changed_organizations(response):
+    return [
+        (change["eventType"], int(change["event"]["organization"]["id"]))
+        for change in response.json()["changes"]
+    ]
+
+
+# Tests
+def test_organization_changes_long_polling_by_admin():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+
+    last_event_id = \
+        change_broadcaster.event_id(change_broadcaster.sequence)
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+    crud.update_organization(
+        db=database,
+        organization_id=db_organization.id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="YYY",
+            status="initialized"
+        )
+    )
+
+    response = test_client.get(
+        f"/organization/changes?lastEventId={last_event_id}&timeout=0"
+    )
+    response_resumed = test_client.get(
+        "/organization/changes?timeout=0&lastEventId=" +
+        response.json()["lastEventId"]
+    )
+    response_other_organization = test_client.get(
+        "/organization/changes?timeout=0&id=1000&lastEventId=" +
+        f"{last_event_id}"
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert changed_organizations(response) == [
+        ("OrganizationCreateEvent", db_organization.id),
+        ("OrganizationAttributeValueChangeEvent", db_organization.id),
+    ]
+    assert response.json()["lastEventId"] == \
+        change_broadcaster.event_id(change_broadcaster.sequence)
+    assert response.json()["reset"] is False
+    assert response_resumed.status_code == 200
+    assert response_resumed.json()["changes"] == []
+    assert response_other_organization.json()["changes"] == []
+
+
+def test_organization_changes_long_polling_by_testbed_admin():
+
+    # Prepare Test
+    user_id = "1111-1111-1111-1111"
+    MockOIDCUser().inject_mocked_oidc_user(
+        id=user_id,
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+    database = next(override_get_db())
+
+    last_event_id = \
+        change_broadcaster.event_id(change_broadcaster.sequence)
+    db_organizations = [
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name
+            )
+        )
+        for trading_name in ["XXX", "YYY"]
+    ]
+    crud.create_authorized_user(
+        db=database,
+        user_id=user_id,
+        organization_id=db_organizations[1].id
+    )
+
+    response = test_client.get(
+        f"/organization/changes?lastEventId={last_event_id}&timeout=0"
+    )
+    response_forbidden = test_client.get(
+        f"/organization/changes?id={db_organizations[0].id}"
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert changed_organizations(response) == [
+        ("OrganizationCreateEvent", db_organizations[1].id),
+        ("OrganizationAuthorizedUserCreateEvent", db_organizations[1].id),
+    ]
+    assert response_forbidden.status_code == 403
+
+
+def test_organization_changes_reset_unknown_event_ids():
+
+    # Prepare Test
+    inject_admin_user()
+
+    database = next(override_get_db())
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+
+    # Ids of another worker, or from before a restart
+    response = test_client.get(
+        "/organization/changes?lastEventId=5000&timeout=0"
+    )
+    response_header = test_client.get(
+        "/organization/changes?timeout=0",
+        headers={"Last-Event-ID": "0123456789ab-5000"}
+    )
+
+    # Test
+    for response in [response, response_header]:
+        assert response.status_code == 200
+        assert response.json() == {
+            "changes": [],
+            "lastEventId":
+                change_broadcaster.event_id(change_broadcaster.sequence),
+            "reset": True,
+        }
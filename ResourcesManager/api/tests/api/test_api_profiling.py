@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 14:31:07
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 15:22:50
+
+# general imports
+import pytest
+from fastapi import HTTPException
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+    MockOIDCUser
+)
+from aux.constants import IDP_TESTBED_ADMIN_USER
+from profiling.sampler import sampling_profiler
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def inject_testbed_admin_user():
+    MockOIDCUser().inject_mocked_oidc_user(
+        id="1111-1111-1111-1111",
+        username="testbed-admin",
+        roles=[IDP_TESTBED_ADMIN_USER]
+    )
+
+
+def create_organization():
+    database = next(override_get_db())
+    return crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="ITAv")
+    )
+
+
+# Tests
+def test_admin_profiles_the_worker():
+
+    # Prepare Test
+    inject_admin_user()
+
+    response = test_client.get("/profile?seconds=0.1&interval=0.002")
+    lines = response.text.splitlines()
+
+    # Test
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "profile.collapsed" in response.headers["content-disposition"]
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert ";" in stack
+        assert int(count) > 0
+
+
+def test_only_admins_profile_the_worker():
+
+    # Prepare Test
+    inject_testbed_admin_user()
+
+    response = test_client.get("/profile?seconds=0.1")
+
+    # Test
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("query", ["seconds=0", "seconds=3600",
+                                   "interval=0"])
+def test_profile_limits(query):
+
+    # Prepare Test
+    inject_admin_user()
+
+    response = test_client.get(f"/profile?{query}")
+
+    # Test
+    assert response.status_code == 400
+
+
+def test_profiles_do_not_overlap():
+
+    # Prepare Test
+    inject_admin_user()
+
+    with sampling_profiler._lock:
+        response = test_client.get("/profile?seconds=0.1")
+
+    # Test
+    assert response.status_code == 409
+    assert response.json()["code"] == 409
+
+
+def test_admin_profiles_a_request():
+
+    # Prepare Test
+    inject_admin_user()
+    db_organization = create_organization()
+
+    response = test_client.get(
+        f"/organization/{db_organization.id}?fields=tradingName&__profile=1"
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.headers["x-profiled-status"] == "200"
+    assert "cumulative" in response.text
+    assert "get_organization" in response.text
+
+
+def test_other_users_requests_are_not_profiled(mocker):
+
+    # Prepare Test
+    inject_admin_user()
+    db_organization = create_organization()
+    inject_testbed_admin_user()
+    profile = mocker.patch("middleware.profiling.cProfile.Profile")
+
+    response = test_client.get(
+        f"/organization/{db_organization.id}?__profile=1"
+    )
+    unprofiled_response = test_client.get(
+        f"/organization/{db_organization.id}"
+    )
+
+    # Test
+    assert "x-profiled-status" not in response.headers
+    assert response.headers["content-type"].startswith("application/json")
+    assert response.status_code == unprofiled_response.status_code
+    assert response.json() == unprofiled_response.json()
+    profile.assert_not_called()
+
+
+def test_unauthenticated_requests_are_not_profiled(mocker):
+
+    # Prepare Test
+    inject_admin_user()
+    db_organization = create_organization()
+    profile = mocker.patch("middleware.profiling.cProfile.Profile")
+    # The admin dependency rejects the request's token
+    mocker.patch(
+        "middleware.profiling.solve_dependencies",
+        side_effect=HTTPException(status_code=401)
+    )
+
+    response = test_client.get(
+        f"/organization/{db_organization.id}?__profile=1"
+    )
+
+    # Test
+    assert "x-profiled-status" not in response.headers
+    profile.assert_not_called()
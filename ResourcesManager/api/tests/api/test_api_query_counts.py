@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-11 11:40:15
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-11 15:12:52
+
+# The endpoints must execute the same number of SQL statements, however many
+# organizations (and children of them) they return
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+)
+from tests.query_counter import assert_max_queries
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def create_organizations(n_organizations: int):
+    database = next(override_get_db())
+    for i in range(n_organizations):
+        db_organization = crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=f"Testbed {i}",
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime="2023-01-01T00:00:00"
+                ),
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_url",
+                        value=f"http://10.0.0.{i}:8080/"
+                    ),
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_username",
+                        value="admin"
+                    ),
+                ]
+            )
+        )
+        crud.create_authorized_user(database, "1111", db_organization.id)
+
+
+# Tests
+@pytest.mark.parametrize("n_organizations", [2, 20])
+@pytest.mark.parametrize(
+    "path,max_queries",
+    [
+        ("/organization/", 3),
+        ("/organization/?fields=id,partyCharacteristic", 3),
+        ("/organization/?countOnly=true", 1),
+        ("/organization/1", 1),
+        ("/organization/1/authorized-users", 1),
+        ("/users/1111/organizations", 3),
+    ]
+)
+def test_endpoints_query_count(n_organizations, path, max_queries):
+
+    # Prepare Test
+    inject_admin_user()
+    create_organizations(n_organizations)
+
+    # Test
+    with assert_max_queries(engine, max_queries):
+        response = test_client.get(path)
+
+    assert response.status_code == 200
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-12 15:47:03
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-12 17:40:18
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    inject_admin_user,
+    setup_test_idp,
+)
+from tracing.tracer import tracer
+from tracing.exporters import InMemorySpanExporter, SimpleSpanProcessor
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture()
+def exporter():
+    exporter = InMemorySpanExporter()
+    tracer.configure(SimpleSpanProcessor(exporter))
+    yield exporter
+    tracer.configure(None)
+
+
+# Tests
+def test_organization_update_is_traced(exporter):
+
+    # Prepare Test
+    inject_admin_user()
+    database = next(override_get_db())
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="ITAv")
+    )
+    # Outside of a request, nothing is traced
+    spans_before_request = exporter.get_finished_spans()
+
+    response = test_client.patch(
+        f"/organization/{db_organization.id}",
+        json={
+            "tradingName": "ITAv",
+            "partyCharacteristic": [
+                {
+                    "name": "ci_cd_agent_url",
+                    "value": "http://192.168.1.200:8080",
+                },
+            ],
+        },
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"}
+    )
+    spans = exporter.get_finished_spans()
+    spans_by_name = {span.name: span for span in spans}
+    request_span = spans_by_name["PATCH /organization/{id}"]
+
+    # Test
+    assert response.status_code == 200
+    assert spans_before_request == []
+    # The request continues the client's trace
+    assert {span.trace_id for span in spans} == {TRACE_ID}
+    assert request_span.parent_span_id == PARENT_SPAN_ID
+    assert request_span.attributes["http.status_code"] == 200
+    assert request_span.attributes["http.route"] == "/organization/{id}"
+    for name in [
+        "idp.get_current_user",
+        "crud.update_organization",
+        "crud.update_organization.characteristics",
+        "crud.update_organization.commit",
+        "encode",
+    ]:
+        assert name in spans_by_name
+    # Each statement is a span, child of the crud call executing it
+    update_span = spans_by_name["crud.update_organization"]
+    statement_spans = [
+        span for span in spans
+        if span.attributes.get("db.system") == "sqlite"
+    ]
+    assert {span.name for span in statement_spans} >= {"SELECT", "UPDATE"}
+    assert all(
+        "http://192.168.1.200:8080" not in span.attributes["db.statement"]
+        for span in statement_spans
+    )
+    assert any(
+        span.parent_span_id == update_span.span_id
+        for span in statement_spans
+    )
+    assert spans_by_name["crud.update_organization.commit"].parent_span_id \
+        == update_span.span_id
+
+
+def test_requests_without_traceparent_start_a_trace(exporter):
+
+    # Prepare Test
+    inject_admin_user()
+
+    response = test_client.get(
+        "/organization/",
+        headers={"traceparent": "00-invalid-01"}
+    )
+    request_span = [
+        span for span in exporter.get_finished_spans()
+        if span.name == "GET /organization/"
+    ][0]
+
+    # Test
+    assert response.status_code == 200
+    assert request_span.trace_id != TRACE_ID
+    assert request_span.parent_span_id is None
+
+
+def test_unsampled_requests_are_not_exported(exporter):
+
+    # Prepare Test
+    inject_admin_user()
+
+    response = test_client.get(
+        "/organization/",
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_SPAN_ID}-00"}
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert exporter.get_finished_spans() == []
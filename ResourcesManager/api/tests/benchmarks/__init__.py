@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-23 16:02:10
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-23 16:02:14
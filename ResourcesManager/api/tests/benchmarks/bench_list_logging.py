@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-07 15:44:09
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-07 17:02:35
+
+# Measures the time the organizations' list endpoint spends logging, per
+# request, with:
+#   - sync-eager: the log file written by the request's thread, and the
+#     organizations formatted in f-strings (the previous setup)
+#   - queue-eager: the log file written by a background thread, and the
+#     organizations still formatted in f-strings
+#   - queue-lazy: the log file written by a background thread, and only the
+#     number of organizations logged at INFO (the current setup)
+#
+# Usage:
+#   python -m tests.benchmarks.bench_list_logging [--organizations 100]
+#       [--characteristics 20] [--requests 200] [--output results.json]
+
+# general imports
+import argparse
+import json
+import logging
+import statistics
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+# custom imports
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from aux.log_utils import Truncated, setup_queue_logging
+from tests.benchmarks.bench_wire_formats import build_organizations
+
+USER = "OIDCUser(sub='1111', roles=['VPilot-Admin', 'Testbed-Admin'])"
+
+
+def log_eagerly(logger: logging.Logger, organizations: list):
+    logger.info(f"User {USER} is trying to obtain information " +
+                "regarding all organizations...")
+    logger.info(f"User {USER} obtained information regarding the " +
+                f"following organizations {organizations}")
+
+
+def log_lazily(logger: logging.Logger, organizations: list):
+    logger.info("User %s is trying to obtain information " +
+                "regarding all organizations...", USER)
+    logger.info("User %s obtained information regarding %d " +
+                "organizations", USER, len(organizations))
+    logger.debug("Organizations obtained by user %s: %s", USER,
+                 Truncated(organizations))
+
+
+def create_file_handler(directory: str):
+    handler = RotatingFileHandler(
+        filename=f"{directory}/server.log",
+        maxBytes=10485760,  # 10 MBytes
+        backupCount=5
+    )
+    handler.setFormatter(
+        logging.Formatter(
+            "%(asctime)s - %(module)s - %(funcName)s - line:%(lineno)d " +
+            "- %(levelname)s - %(message)s"
+        )
+    )
+    return handler
+
+
+def run_mode(mode: str, organizations: list, n_requests: int):
+    log = log_lazily if mode == "queue-lazy" else log_eagerly
+    logger = logging.getLogger(f"bench_list_logging.{mode}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = create_file_handler(directory)
+        listener = None
+        if mode == "sync-eager":
+            logger.addHandler(handler)
+        else:
+            listener = setup_queue_logging(logger, [handler])
+
+        timings = []
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            log(logger, organizations)
+            timings.append(time.perf_counter() - start)
+
+        # Time left for the background thread to write the queued records
+        start = time.perf_counter()
+        if listener is not None:
+            listener.stop()
+        drain_seconds = time.perf_counter() - start
+
+        logger.handlers = []
+        handler.close()
+
+    timings.sort()
+    return {
+        "mode": mode,
+        "organizations": len(organizations),
+        "requests": n_requests,
+        "mean_seconds": statistics.mean(timings),
+        "p50_seconds": timings[len(timings) // 2],
+        "p99_seconds": timings[min(len(timings) - 1,
+                                   int(len(timings) * 0.99))],
+        "drain_seconds": drain_seconds,
+    }
+
+
+def run(n_organizations: int, n_characteristics: int, n_requests: int):
+    organizations = [
+        TMF632Schemas.Organization(**organization)
+        for organization
+        in build_organizations(n_organizations, n_characteristics)
+    ]
+    return [
+        run_mode(mode, organizations, n_requests)
+        for mode in ["sync-eager", "queue-eager", "queue-lazy"]
+    ]
+
+
+def main(args: list = None):
+    parser = argparse.ArgumentParser(
+        description="Measures the logging overhead of the organizations' " +
+        "list endpoint"
+    )
+    parser.add_argument("--organizations", type=int, default=100)
+    parser.add_argument("--characteristics", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--output", default=None,
+                        help="Write the results as JSON to this file")
+    parsed_args = parser.parse_args(args)
+
+    results = run(
+        parsed_args.organizations,
+        parsed_args.characteristics,
+        parsed_args.requests
+    )
+
+    print(f"{'mode':<14}{'mean (ms)':>11}{'p50 (ms)':>11}{'p99 (ms)':>11}"
+          f"{'drain (ms)':>12}")
+    for result in results:
+        print(f"{result['mode']:<14}{result['mean_seconds'] * 1000:>11.3f}"
+              f"{result['p50_seconds'] * 1000:>11.3f}"
+              f"{result['p99_seconds'] * 1000:>11.3f}"
+              f"{result['drain_seconds'] * 1000:>12.1f}")
+
+    if parsed_args.output:
+        with open(parsed_args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
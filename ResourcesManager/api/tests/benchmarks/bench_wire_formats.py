@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-23 16:02:31
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-23 17:10:45
+
+# Compares the payload size and the encode/decode time of the wire formats
+# negotiated by the API, over TMF632 organization listings.
+#
+# Usage:
+#   python -m tests.benchmarks.bench_wire_formats [--organizations 1000]
+#       [--characteristics 20] [--repeat 20] [--output results.json]
+
+# general imports
+import argparse
+import json
+import random
+import time
+from fastapi.encoders import jsonable_encoder
+
+# custom imports
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from aux import media_types as MediaTypes
+
+
+def build_organizations(n_organizations: int, n_characteristics: int,
+                        seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        jsonable_encoder(
+            TMF632Schemas.Organization(
+                id=str(i),
+                tradingName=f"Testbed {i}",
+                name=f"Testbed {i} of the VPilot project",
+                organizationType="Testbed",
+                status="validated",
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime="2023-01-01T00:00:00",
+                    endDateTime="2024-01-01T00:00:00",
+                ),
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name=f"characteristic_{j}",
+                        valueType="str",
+                        value=f"http://10.{rng.randint(0, 255)}."
+                        f"{rng.randint(0, 255)}.{j}:8080/",
+                    )
+                    for j in range(n_characteristics)
+                ]
+            )
+        )
+        for i in range(n_organizations)
+    ]
+
+
+def best_of(repeat: int, function, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(n_organizations: int, n_characteristics: int, repeat: int):
+    document = build_organizations(n_organizations, n_characteristics)
+    results = []
+    for media_type in MediaTypes.supported_media_types():
+        payload = MediaTypes.encode(document, media_type)
+        assert MediaTypes.decode(payload, media_type) == document
+        results.append({
+            "media_type": media_type,
+            "organizations": n_organizations,
+            "characteristics_per_organization": n_characteristics,
+            "size_bytes": len(payload),
+            "encode_seconds": best_of(
+                repeat, MediaTypes.encode, document, media_type
+            ),
+            "decode_seconds": best_of(
+                repeat, MediaTypes.decode, payload, media_type
+            ),
+        })
+    return results
+
+
+def main(args: list = None):
+    parser = argparse.ArgumentParser(
+        description="Compares the JSON, MessagePack and CBOR encodings"
+    )
+    parser.add_argument("--organizations", type=int, default=1000)
+    parser.add_argument("--characteristics", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None,
+                        help="Write the results as JSON to this file")
+    parsed_args = parser.parse_args(args)
+
+    results = run(
+        parsed_args.organizations,
+        parsed_args.characteristics,
+        parsed_args.repeat
+    )
+
+    json_size = results[0]["size_bytes"]
+    print(f"{'media type':<22}{'size (B)':>12}{'vs JSON':>9}"
+          f"{'encode (ms)':>13}{'decode (ms)':>13}")
+    for result in results:
+        print(f"{result['media_type']:<22}{result['size_bytes']:>12}"
+              f"{result['size_bytes'] / json_size:>9.2f}"
+              f"{result['encode_seconds'] * 1000:>13.2f}"
+              f"{result['decode_seconds'] * 1000:>13.2f}")
+
+    if parsed_args.output:
+        with open(parsed_args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
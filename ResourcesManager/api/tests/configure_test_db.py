@@ -11,7 +11,8 @@ from fastapi.testclient import TestClient
 
 # custom imports
 from main import app, get_db
-from routers import organizations_router
+from routers import organizations_router, hub_router
+from database.instrumentation import instrument_engine
 
 engine = create_engine(
     url="sqlite:///./test.db",
@@ -24,6 +25,7 @@ TestingSessionLocal = sessionmaker(
     autoflush=False,
     bind=engine
 )
+instrument_engine(engine)
 
 
 def override_get_db():
@@ -36,4 +38,5 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 app.dependency_overrides[organizations_router.get_db] = override_get_db
+app.dependency_overrides[hub_router.get_db] = override_get_db
 test_client = TestClient(app)
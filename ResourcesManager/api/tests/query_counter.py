@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-11 10:22:47
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-11 15:06:31
+
+# Counts the SQL statements executed on an engine, e.g. to make sure that an
+# endpoint runs a bounded number of queries however many organizations it
+# returns:
+#
+#   with assert_max_queries(engine, 5):
+#       test_client.get("/organization/")
+#
+# Statements are counted on the engine, whatever the thread that executes
+# them, so that the requests made with the test client are counted too.
+
+# general imports
+from collections import Counter
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+class QueryCounter:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        # Kept, so that the same listener is removed
+        self._listener = self._count
+
+    def _count(self, conn, cursor, statement, parameters, context,
+               executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        event.listen(self.engine, "after_cursor_execute", self._listener)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "after_cursor_execute", self._listener)
+
+    # Statements, most repeated first
+    def report(self):
+        return "\n".join(
+            f"{executions}x {statement}"
+            for statement, executions
+            in Counter(self.statements).most_common()
+        )
+
+
+@contextmanager
+def assert_max_queries(engine, max_queries: int):
+    with QueryCounter(engine) as counter:
+        yield counter
+    assert counter.count <= max_queries, \
+        f"{counter.count} SQL statements were executed, expected at most " + \
+        f"{max_queries}:\n{counter.report()}"
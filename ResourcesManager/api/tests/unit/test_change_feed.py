@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-06 14:52:09
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-06 18:11:26
+
+# general imports
+import asyncio
+import json
+
+# custom imports
+from events import organization_events as OrganizationEvents
+from events.change_feed import (
+    ChangeBroadcaster,
+    ChangeSubscriber,
+    SSE_HEARTBEAT,
+    iter_sse,
+    poll,
+)
+
+UPDATE_EVENT = OrganizationEvents.ORGANIZATION_ATTRIBUTE_VALUE_CHANGE_EVENT
+
+
+class MockRequest:
+
+    async def is_disconnected(self):
+        return False
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def fan_out():
+    # Lets the fan-out task handle the published changes
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def queued_organizations(subscriber: ChangeSubscriber):
+    return [change.organization_id for change in subscriber.get_queued()]
+
+
+# Tests
+def test_change_broadcaster_fans_out_by_organization():
+
+    async def test():
+        broadcaster = ChangeBroadcaster()
+        subscriber_1 = ChangeSubscriber(organization_ids={1})
+        subscriber_2 = ChangeSubscriber(organization_ids={2, 3})
+        subscriber_all = ChangeSubscriber()
+        for subscriber in [subscriber_1, subscriber_2, subscriber_all]:
+            broadcaster.subscribe(subscriber)
+
+        for organization_id in [1, 2, 3, 4]:
+            broadcaster.publish(organization_id, UPDATE_EVENT)
+        await fan_out()
+
+        subscribers = broadcaster.subscribers
+        broadcaster.unsubscribe(subscriber_2)
+        broadcaster.publish(2, UPDATE_EVENT)
+        await fan_out()
+
+        return (
+            queued_organizations(subscriber_1),
+            queued_organizations(subscriber_2),
+            queued_organizations(subscriber_all),
+            subscribers,
+            broadcaster.subscribers
+        )
+
+    organizations_1, organizations_2, organizations_all, subscribers, \
+        subscribers_after_unsubscribe = run(test())
+
+    assert organizations_1 == [1]
+    assert organizations_2 == [2, 3]
+    assert organizations_all == [1, 2, 3, 4, 2]
+    assert subscribers == 3
+    assert subscribers_after_unsubscribe == 2
+
+
+def test_change_broadcaster_follows_authorizations():
+
+    async def test():
+        broadcaster = ChangeBroadcaster()
+        subscriber = ChangeSubscriber(
+            organization_ids=set(),
+            user_id="1111",
+            follows_authorizations=True
+        )
+        broadcaster.subscribe(subscriber)
+
+        broadcaster.publish(1, UPDATE_EVENT)
+        broadcaster.publish(
+            1,
+            OrganizationEvents.AUTHORIZED_USER_CREATE_EVENT,
+            "1111"
+        )
+        broadcaster.publish(1, UPDATE_EVENT)
+        broadcaster.publish(
+            1,
+            OrganizationEvents.AUTHORIZED_USER_DELETE_EVENT,
+            "1111"
+        )
+        broadcaster.publish(1, UPDATE_EVENT)
+        await fan_out()
+        return [
+            change.event_type for change in subscriber.get_queued()
+        ]
+
+    assert run(test()) == [
+        OrganizationEvents.AUTHORIZED_USER_CREATE_EVENT,
+        UPDATE_EVENT,
+        OrganizationEvents.AUTHORIZED_USER_DELETE_EVENT,
+    ]
+
+
+def test_change_broadcaster_replays_buffered_changes():
+
+    async def test():
+        broadcaster = ChangeBroadcaster(buffer_size=2)
+        for organization_id in [1, 2, 3]:
+            broadcaster.publish(organization_id, UPDATE_EVENT)
+
+        subscriber_resumed = ChangeSubscriber(
+            last_event_id=broadcaster.event_id(1)
+        )
+        subscriber_behind = ChangeSubscriber(
+            last_event_id=broadcaster.event_id(0)
+        )
+        subscriber_new = ChangeSubscriber()
+        return (
+            broadcaster.subscribe(subscriber_resumed),
+            queued_organizations(subscriber_resumed),
+            broadcaster.subscribe(subscriber_behind),
+            broadcaster.subscribe(subscriber_new),
+            queued_organizations(subscriber_new),
+            subscriber_new.last_sequence
+        )
+
+    assert run(test()) == (False, [2, 3], True, False, [], 3)
+
+
+def test_change_broadcaster_resets_unknown_event_ids():
+
+    broadcaster = ChangeBroadcaster()
+    # E.g. the worker restarted, or the client resumes on another worker
+    other_broadcaster = ChangeBroadcaster()
+    for _ in range(3):
+        other_broadcaster.publish(1, UPDATE_EVENT)
+
+    async def test():
+        broadcaster.publish(1, UPDATE_EVENT)
+        return [
+            await poll(
+                ChangeSubscriber(last_event_id=last_event_id),
+                timeout=0,
+                broadcaster=broadcaster
+            )
+            for last_event_id in [
+                other_broadcaster.event_id(3),
+                broadcaster.event_id(5000),
+                "5000",
+                broadcaster.event_id(0),
+            ]
+        ]
+
+    results = run(test())
+
+    for result in results[:3]:
+        assert result == {
+            "changes": [],
+            "lastEventId": broadcaster.event_id(1),
+            "reset": True,
+        }
+    assert results[3]["reset"] is False
+    assert [change["eventId"] for change in results[3]["changes"]] == \
+        [broadcaster.event_id(1)]
+
+
+def test_change_subscriber_overflow():
+
+    async def test():
+        broadcaster = ChangeBroadcaster()
+        subscriber = ChangeSubscriber(max_queue_size=2)
+        broadcaster.subscribe(subscriber)
+        for organization_id in [1, 2, 3, 4]:
+            broadcaster.publish(organization_id, UPDATE_EVENT)
+        await fan_out()
+        return await poll(subscriber, timeout=0, broadcaster=broadcaster)
+
+    result = run(test())
+
+    assert result["reset"] is True
+    assert [change["event"]["organization"]["id"]
+            for change in result["changes"]] == ["1", "2"]
+
+
+def test_change_feed_long_polling():
+
+    broadcaster = ChangeBroadcaster()
+
+    async def test():
+        empty_result = await poll(
+            ChangeSubscriber(),
+            timeout=0.01,
+            broadcaster=broadcaster
+        )
+
+        async def publish():
+            await asyncio.sleep(0.01)
+            broadcaster.publish(1, UPDATE_EVENT)
+            broadcaster.publish(2, UPDATE_EVENT)
+
+        publisher = asyncio.create_task(publish())
+        result = await poll(
+            ChangeSubscriber(),
+            timeout=5,
+            broadcaster=broadcaster
+        )
+        await publisher
+        return empty_result, result, broadcaster.subscribers
+
+    empty_result, result, subscribers = run(test())
+
+    assert empty_result == {
+        "changes": [],
+        "lastEventId": broadcaster.event_id(0),
+        "reset": False,
+    }
+    assert result == {
+        "changes": [
+            {
+                "eventId": broadcaster.event_id(1),
+                "eventType": UPDATE_EVENT,
+                "event": {"organization": {"id": "1"}},
+            },
+            {
+                "eventId": broadcaster.event_id(2),
+                "eventType": UPDATE_EVENT,
+                "event": {"organization": {"id": "2"}},
+            },
+        ],
+        "lastEventId": broadcaster.event_id(2),
+        "reset": False,
+    }
+    assert subscribers == 0
+
+
+def test_change_feed_server_sent_events():
+
+    broadcaster = ChangeBroadcaster()
+
+    async def test():
+        broadcaster.publish(1, UPDATE_EVENT)
+        stream = iter_sse(
+            MockRequest(),
+            ChangeSubscriber(last_event_id=broadcaster.event_id(0)),
+            broadcaster=broadcaster,
+            heartbeat_interval=0.01
+        )
+        messages = [await stream.__anext__(), await stream.__anext__()]
+        subscribers = broadcaster.subscribers
+        await stream.aclose()
+        return messages, subscribers, broadcaster.subscribers
+
+    messages, subscribers, subscribers_after_close = run(test())
+    lines = messages[0].decode().split("\n")
+
+    assert lines[:2] == [
+        f"id: {broadcaster.event_id(1)}",
+        f"event: {UPDATE_EVENT}"
+    ]
+    assert json.loads(lines[2][len("data: "):])["eventId"] == \
+        broadcaster.event_id(1)
+    assert lines[3:] == ["", ""]
+    assert messages[1] == SSE_HEARTBEAT
+    assert subscribers == 1
+    assert subscribers_after_close == 0
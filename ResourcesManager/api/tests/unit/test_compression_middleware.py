@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-22 14:12:50
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-22 15:02:11
+
+# general imports
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+# custom imports
+from middleware import compression
+from middleware.compression import (
+    CompressedBodyCache,
+    CompressionMiddleware,
+    select_encoding
+)
+
+DOCUMENT = [
+    {"name": "ci_cd_agent_url", "value": f"http://10.0.0.{i}:8080/"}
+    for i in range(100)
+]
+
+
+@pytest.fixture()
+def cache():
+    return CompressedBodyCache()
+
+
+@pytest.fixture()
+def client(cache):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500, cache=cache)
+
+    @app.get("/small")
+    def small():
+        return JSONResponse(content={"id": "1"})
+
+    @app.get("/large")
+    def large():
+        return JSONResponse(content=DOCUMENT)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(
+            (b'{"chunk": %d}\n' % i for i in range(100)),
+            media_type="application/x-ndjson"
+        )
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(
+            (b'data: {"chunk": %d}\n\n' % i for i in range(100)),
+            media_type="text/event-stream"
+        )
+
+    return TestClient(app)
+
+
+# Tests
+def test_encoding_negotiation(monkeypatch):
+
+    # Prepare Test
+    monkeypatch.setattr(compression, "brotli", None)
+
+    # Test
+    assert select_encoding("") == "identity"
+    assert select_encoding("gzip, deflate") == "gzip"
+    assert select_encoding("br;q=1.0, gzip;q=0.5") == "gzip"
+    assert select_encoding("gzip;q=0") == "identity"
+    assert select_encoding("*") == "gzip"
+
+
+def test_small_responses_are_not_compressed(client):
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"id": "1"}
+
+
+def test_large_responses_are_compressed_and_cached(client, cache):
+
+    # Prepare Test
+    response_1 = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    response_2 = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    response_3 = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    # Test
+    assert response_1.headers["content-encoding"] == "gzip"
+    assert response_1.headers["vary"] == "Accept-Encoding"
+    assert int(response_1.headers["content-length"]) \
+        < len(response_3.content)
+    assert response_1.json() == response_2.json() == DOCUMENT
+    assert "content-encoding" not in response_3.headers
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+def test_streaming_responses_are_compressed_incrementally(client):
+
+    # Prepare Test
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+    # Test
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content.splitlines()[-1] == b'{"chunk": 99}'
+
+
+def test_event_streams_are_not_compressed(client):
+
+    # Prepare Test
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+
+    # Test
+    assert "content-encoding" not in response.headers
+    assert response.content.splitlines()[-2] == b'data: {"chunk": 99}'
+
+
+def test_brotli_compression(client):
+
+    # Prepare Test
+    pytest.importorskip("brotli")
+    response = client.get("/large", headers={"Accept-Encoding": "br"})
+
+    # Test
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == DOCUMENT
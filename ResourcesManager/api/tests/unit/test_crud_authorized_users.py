@@ -210,3 +210,45 @@ def test_delete_of_authorized_user_for_an_organizations():
     assert len(db_user.authorizedOriganizations) == 1
     assert db_user.authorizedOriganizations[0].id == db_organization2.id
     assert db_user.authorizedOriganizations[0].tradingName == "YYY"
+
+
+def test_get_hydrated_organizations_for_user():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    for trading_name in ["XXX", "YYY"]:
+        db_organization = crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime="2015-10-22T08:31:52.026Z",
+                ),
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_url",
+                        value=f"http://{trading_name}.example.org/",
+                    ),
+                ]
+            )
+        )
+        crud.create_authorized_user(
+            db=database,
+            user_id="1111-2222-3333",
+            organization_id=db_organization.id
+        )
+
+    db_organizations = crud.get_authorized_organizations_for_user(
+        db=database,
+        user_id="1111-2222-3333",
+        batch_size=1
+    )
+
+    # Test
+    assert [o.tradingName for o in db_organizations] == ["XXX", "YYY"]
+    for db_organization in db_organizations:
+        assert db_organization.preloaded("partyCharacteristicParsed")[0]\
+            .value == f"http://{db_organization.tradingName}.example.org/"
+        assert db_organization.preloaded("existsDuringParsed").id\
+            == db_organization.existsDuring
@@ -88,3 +88,61 @@ def test_get_nonexistent_organization_from_database():
 
     # Test
     assert retrieved_organization is None
+
+
+def test_get_organization_for_user_from_database():
+
+    # Prepare Test
+    database = next(override_get_db())
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="XXX",
+        )
+    )
+    for user_id in ["1111", "2222", "3333"]:
+        crud.create_authorized_user(
+            db=database,
+            user_id=user_id,
+            organization_id=db_organization.id
+        )
+    crud.delete_authorized_user_for_organization(
+        db=database,
+        user_id="3333",
+        organization_id=db_organization.id
+    )
+
+    authorized_access = crud.get_organization_for_user(
+        db=database,
+        id=db_organization.id,
+        user_id="2222"
+    )
+    unauthorized_access = crud.get_organization_for_user(
+        db=database,
+        id=db_organization.id,
+        user_id="3333"
+    )
+    admin_access = crud.get_organization_for_user(
+        db=database,
+        id=db_organization.id,
+        user_id="4444",
+        is_admin=True
+    )
+    nonexistent_access = crud.get_organization_for_user(
+        db=database,
+        id=999,
+        user_id="1111"
+    )
+
+    # Test
+    assert authorized_access.organization.tradingName == "XXX"
+    assert authorized_access.authorized_user_ids == ["1111", "2222"]
+    assert authorized_access.is_authorized
+    assert not unauthorized_access.is_authorized
+    assert admin_access.is_authorized
+    assert [
+        user.user_id
+        for user in admin_access.organization.authorizedUsersParsed
+    ] == ["1111", "2222"]
+    assert nonexistent_access.organization is None
+    assert nonexistent_access.authorized_user_ids == []
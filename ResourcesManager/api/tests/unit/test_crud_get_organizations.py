@@ -10,6 +10,7 @@ import datetime
 
 # custom imports
 from database.crud import crud
+from database.crud.exceptions import InvalidQueryParameter
 from routers.aux import (
     parse_organization_query_filters,
     GetOrganizationFilters
@@ -210,3 +211,241 @@ def test_get_filtered_organizations_from_database():
     assert filtered_organizations_2[1].organizationType == "Testbed2"
     assert filtered_organizations_2[0].tradingName == "XXX"
     assert filtered_organizations_2[1].tradingName == "YYY"
+
+
+def test_get_organizations_by_party_characteristic_from_database():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    for trading_name, agent_url in [
+        ("XXX", "http://192.168.1.200:8080/"),
+        ("YYY", "http://192.168.1.201:8080/"),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                partyCharacteristic=[
+                    TMF632Schemas.Characteristic(
+                        name="ci_cd_agent_url",
+                        value=agent_url,
+                        valueType="URL",
+                    ),
+                ]
+            )
+        )
+
+    organizations_by_agent = crud.get_all_organizations(
+        database,
+        characteristic_filter={
+            "name": "ci_cd_agent_url",
+            "value": "http://192.168.1.201:8080/",
+        }
+    )
+    organizations_by_name = crud.get_all_organizations(
+        database,
+        characteristic_filter={"name": "ci_cd_agent_url"}
+    )
+    query_plan = database.execute(
+        "EXPLAIN QUERY PLAN " + str(
+            crud._organizations_query(
+                database,
+                characteristic_filter={
+                    "name": "ci_cd_agent_url",
+                    "value": "http://192.168.1.201:8080/",
+                }
+            ).statement.compile(compile_kwargs={"literal_binds": True})
+        )
+    ).fetchall()
+
+    # Test
+    assert [o.tradingName for o in organizations_by_agent] == ["YYY"]
+    assert [o.tradingName for o in organizations_by_name] == ["XXX", "YYY"]
+    assert any(
+        "ix_Characteristic_name_value_deleted_organization" in row[-1]
+        for row in query_plan
+    )
+
+
+def test_search_organizations_from_database():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    db_organizations = [
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                name=name,
+            )
+        )
+        for trading_name, name in [
+            ("Aveiro", "ITAv 5G Testbed"),
+            ("Athens", "Athens 5G Testbed"),
+            ("Aveiro", "Aveiro Edge Lab"),
+        ]
+    ]
+    crud.update_organization(
+        db=database,
+        organization_id=db_organizations[1].id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="Malaga",
+            name="Malaga 5G Testbed",
+        )
+    )
+    crud.delete_organization(database, db_organizations[2].id)
+
+    results_testbeds = crud.get_all_organizations(database, search="testb")
+    results_aveiro = crud.get_all_organizations(database, search="aveiro")
+    results_athens = crud.get_all_organizations(database, search="athens")
+    results_page = crud.get_all_organizations(
+        database,
+        search="5g testbed",
+        offset=1,
+        limit=1
+    )
+
+    # Test
+    assert len(results_testbeds) == 2
+    assert [o.name for o in results_aveiro] == ["ITAv 5G Testbed"]
+    assert results_athens == []
+    assert len(results_page) == 1
+
+
+def test_get_sorted_organizations_from_database():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    for trading_name, name in [
+        ("XXX", "B"),
+        ("YYY", "A"),
+        ("ZZZ", "B"),
+        ("WWW", "C"),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                name=name,
+            )
+        )
+
+    results_descending = crud.get_all_organizations(database, sort="-name")
+    results_tie_break = crud.get_all_organizations(database, sort="-name,id")
+    results_page = crud.get_all_organizations(
+        database,
+        sort="name",
+        offset=1,
+        limit=2
+    )
+    query_plan = database.execute(
+        "EXPLAIN QUERY PLAN " + str(
+            crud._organizations_query(database)
+            .order_by(*crud.QueryFilters.compile_sort("-name"))
+            .statement.compile(compile_kwargs={"literal_binds": True})
+        )
+    ).fetchall()
+
+    # Test
+    assert [o.tradingName for o in results_descending]\
+        == ["WWW", "ZZZ", "XXX", "YYY"]
+    assert [o.tradingName for o in results_tie_break]\
+        == ["WWW", "XXX", "ZZZ", "YYY"]
+    assert [o.tradingName for o in results_page] == ["XXX", "ZZZ"]
+    assert not any("TEMP B-TREE" in row[-1] for row in query_plan)
+    with pytest.raises(InvalidQueryParameter):
+        crud.get_all_organizations(database, sort="isHeadOffice")
+
+
+def test_count_organizations_from_database():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    for trading_name in ["XXX", "YYY", "XXX"]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+            )
+        )
+    cache = crud.CountCache(ttl=60)
+
+    count_1 = crud.count_organizations(database)
+    count_2 = crud.count_organizations(
+        database,
+        filters={"tradingName": "XXX"}
+    )
+    cached_count_1 = cache.get_or_count("all", lambda: 3)
+    cached_count_2 = cache.get_or_count("all", lambda: 4)
+
+    # Test
+    assert count_1 == 3
+    assert count_2 == 2
+    assert cached_count_1 == cached_count_2 == 3
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_get_active_organizations_from_database():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    for trading_name, start_date_time, end_date_time in [
+        ("XXX", "2015-01-01T00:00:00Z", "2016-01-01T00:00:00Z"),
+        ("YYY", "2016-01-01T00:00:00Z", "2018-01-01T00:00:00Z"),
+        ("ZZZ", "2017-01-01T00:00:00Z", None),
+    ]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+                existsDuring=TMF632Schemas.TimePeriod(
+                    startDateTime=start_date_time,
+                    endDateTime=end_date_time,
+                ),
+            )
+        )
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="WWW")
+    )
+
+    active_period = crud.QueryFilters.parse_active_period(
+        active_at="2017-06-01T00:00:00Z"
+    )
+    results_active_at = crud.get_all_organizations(
+        database,
+        active_period=active_period
+    )
+    results_active_between = crud.get_all_organizations(
+        database,
+        active_period=crud.QueryFilters.parse_active_period(
+            active_between="2015-06-01T00:00:00Z,2016-06-01T00:00:00Z"
+        )
+    )
+    query_plan = database.execute(
+        "EXPLAIN QUERY PLAN " + str(
+            crud._organizations_query(database, active_period=active_period)
+            .statement.compile(compile_kwargs={"literal_binds": True})
+        )
+    ).fetchall()
+
+    # Test
+    assert [o.tradingName for o in results_active_at] == ["YYY", "ZZZ"]
+    assert [o.tradingName for o in results_active_between]\
+        == ["XXX", "YYY"]
+    assert crud.count_organizations(database, active_period=active_period)\
+        == 2
+    assert any(
+        "ix_TimePeriod_startDateTime_endDateTime" in row[-1]
+        for row in query_plan
+    )
+    with pytest.raises(InvalidQueryParameter):
+        crud.QueryFilters.parse_active_period(
+            active_between="2016-06-01T00:00:00Z,2015-06-01T00:00:00Z"
+        )
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-07 10:14:52
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-07 12:48:30
+
+# general imports
+import pytest
+
+# custom imports
+from database.crud import crud
+from database.models import models
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    setup_test_idp,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+def create_organization(database, trading_name: str):
+    return crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName=trading_name,
+            status="initialized"
+        )
+    )
+
+
+# Tests
+def test_changes_are_stamped_with_a_monotonic_sequence():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    db_organization_1 = create_organization(database, "XXX")
+    db_organization_2 = create_organization(database, "YYY")
+    change_seqs = [db_organization_1.changeSeq, db_organization_2.changeSeq]
+
+    crud.update_organization(
+        db=database,
+        organization_id=db_organization_1.id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="ZZZ",
+            status="initialized"
+        )
+    )
+    change_seqs.append(crud.get_organization_by_id(database, 1).changeSeq)
+
+    crud.create_authorized_user(database, "1111", db_organization_2.id)
+    change_seqs.append(crud.get_organization_by_id(database, 2).changeSeq)
+
+    crud.delete_organization(database, db_organization_1.id)
+    change_seqs.append(database.get(models.Organization, 1).changeSeq)
+
+    # Test
+    assert change_seqs == [1, 2, 3, 4, 5]
+    assert crud.get_change_seq(database) == 5
+
+
+def test_get_organization_changes_since():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    db_organizations = [
+        create_organization(database, trading_name)
+        for trading_name in ["XXX", "YYY", "ZZZ", "WWW"]
+    ]
+    since = crud.get_change_seq(database)
+
+    crud.update_organization(
+        db=database,
+        organization_id=db_organizations[2].id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="VVV",
+            status="initialized"
+        )
+    )
+    crud.delete_organization(database, db_organizations[0].id)
+
+    changes = crud.get_organization_changes(database, since)
+    changes_page = crud.get_organization_changes(database, since, limit=1)
+    changes_next_page = crud.get_organization_changes(
+        database,
+        changes_page.change_seq
+    )
+    no_changes = crud.get_organization_changes(database, changes.change_seq)
+    query_plan = database.execute(
+        "EXPLAIN QUERY PLAN " + str(
+            crud._organization_changes_query(database, since)
+            .statement.compile(compile_kwargs={"literal_binds": True})
+        )
+    ).fetchall()
+
+    # Test
+    assert [o.tradingName for o in changes.organizations] == ["VVV"]
+    assert changes.deleted_ids == [db_organizations[0].id]
+    assert changes.change_seq == since + 2
+    assert [o.tradingName for o in changes_page.organizations] == ["VVV"]
+    assert changes_page.change_seq == since + 1
+    assert changes_next_page.deleted_ids == [db_organizations[0].id]
+    assert no_changes.organizations == no_changes.deleted_ids == []
+    assert no_changes.change_seq == changes.change_seq
+    assert any(
+        "ix_Organization_changeSeq" in row[-1] for row in query_plan
+    )
+
+
+def test_get_organization_changes_for_authorized_user():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    db_organizations = [
+        create_organization(database, trading_name)
+        for trading_name in ["XXX", "YYY", "ZZZ"]
+    ]
+    for db_organization in db_organizations[:2]:
+        crud.create_authorized_user(database, "1111", db_organization.id)
+
+    changes_initial = crud.get_organization_changes(
+        database,
+        0,
+        authorized_user_id="1111"
+    )
+
+    crud.delete_authorized_user_for_organization(
+        database,
+        "1111",
+        db_organizations[0].id
+    )
+    crud.update_organization(
+        db=database,
+        organization_id=db_organizations[2].id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="WWW",
+            status="initialized"
+        )
+    )
+    changes = crud.get_organization_changes(
+        database,
+        changes_initial.change_seq,
+        authorized_user_id="1111"
+    )
+
+    # Test
+    # The user never had access to the third organization, and lost access
+    # to the first one
+    assert [o.tradingName for o in changes_initial.organizations]\
+        == ["XXX", "YYY"]
+    assert changes_initial.deleted_ids == []
+    assert changes.organizations == []
+    assert changes.deleted_ids == [db_organizations[0].id]
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-31 14:26:11
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-31 17:02:39
+
+# general imports
+import json
+import pytest
+
+# custom imports
+from database.crud import crud
+from database.models import models
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from tests.configure_test_idp import (
+    setup_test_idp,
+)
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+# Tests
+def test_organization_documents_follow_writes():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="XXX",
+            existsDuring=TMF632Schemas.TimePeriod(
+                startDateTime="2015-10-22T08:31:52.026Z",
+            ),
+            partyCharacteristic=[
+                TMF632Schemas.Characteristic(
+                    name="ci_cd_agent_url",
+                    value="http://192.168.1.200:8080/",
+                    valueType="URL",
+                ),
+            ]
+        )
+    )
+    organization_id = db_organization.id
+
+    def get_document():
+        document_access = crud.get_organization_document_for_user(
+            db=database,
+            id=organization_id,
+            user_id="1111-1111-1111-1111"
+        )
+        if document_access is None:
+            return None
+        return json.loads(document_access.document)
+
+    created_document = get_document()
+    crud.update_organization(
+        db=database,
+        organization_id=organization_id,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="YYY")
+    )
+    updated_document = get_document()
+    crud.delete_organization(database, organization_id)
+    deleted_document = get_document()
+
+    # Test
+    assert created_document["tradingName"] == "XXX"
+    assert created_document["existsDuring"]["startDateTime"]\
+        == "2015-10-22T08:31:52.026000"
+    assert created_document["partyCharacteristic"][0]["value"]\
+        == "http://192.168.1.200:8080/"
+    assert updated_document["tradingName"] == "YYY"
+    assert updated_document["existsDuring"] is None
+    # Characteristics are kept, unless new ones are given
+    assert updated_document["partyCharacteristic"]\
+        == created_document["partyCharacteristic"]
+    assert deleted_document is None
+
+
+def test_rebuild_organization_documents():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    for trading_name in ["XXX", "YYY", "ZZZ"]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name,
+            )
+        )
+    database.query(models.OrganizationDocument).delete()
+    database.commit()
+
+    rebuilt = crud.rebuild_organization_documents(database, batch_size=2)
+    documents = [
+        json.loads(document.document)
+        for document in database
+        .query(models.OrganizationDocument)
+        .order_by(models.OrganizationDocument.organization)
+    ]
+
+    # Test
+    assert rebuilt == 3
+    assert [document["tradingName"] for document in documents]\
+        == ["XXX", "YYY", "ZZZ"]
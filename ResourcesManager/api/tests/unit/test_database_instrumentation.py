@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-11 13:58:09
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-11 15:19:44
+
+# general imports
+import logging
+import pytest
+
+# custom imports
+from database import instrumentation as Instrumentation
+from database.instrumentation import QueryStats, redact_parameters
+from database.models import models
+from tests.configure_test_idp import (
+    setup_test_idp,
+)
+from tests.query_counter import assert_max_queries
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        override_get_db as imported_override_get_db
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global override_get_db
+    override_get_db = imported_override_get_db
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture()
+def query_stats():
+    query_stats = QueryStats("GET", "/organization/")
+    token = Instrumentation.current_query_stats.set(query_stats)
+    yield query_stats
+    Instrumentation.current_query_stats.reset(token)
+
+
+def query_by_trading_name(database, trading_name: str):
+    return database\
+        .query(models.Organization)\
+        .filter(models.Organization.tradingName == trading_name)\
+        .first()
+
+
+# Tests
+def test_redact_parameters():
+    assert redact_parameters(("secret", 1)) == "(<str>, <int>)"
+    assert redact_parameters({"name": "secret"}) == "{name: <str>}"
+    assert redact_parameters([("a",), ("b",)], executemany=True) \
+        == "2 parameter sets"
+
+
+def test_slow_queries_are_logged_without_their_parameters(
+    monkeypatch, caplog, query_stats
+):
+
+    # Prepare Test
+    monkeypatch.setattr(Instrumentation, "SLOW_QUERY_THRESHOLD", 0)
+    database = next(override_get_db())
+
+    with caplog.at_level(logging.WARNING, logger=Instrumentation.__name__):
+        query_by_trading_name(database, "secret trading name")
+
+    # Test
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert message.startswith("Slow SQL statement")
+    assert "executed by GET /organization/" in message
+    assert "[parameters: (<str>, <int>, <int>)]" in message
+    assert "secret" not in message
+
+
+def test_repeated_statements_are_flagged_once(
+    monkeypatch, caplog, query_stats
+):
+
+    # Prepare Test
+    monkeypatch.setattr(Instrumentation, "REPEATED_STATEMENT_THRESHOLD", 3)
+    database = next(override_get_db())
+
+    with caplog.at_level(logging.WARNING, logger=Instrumentation.__name__):
+        for i in range(5):
+            query_by_trading_name(database, f"{i}")
+
+    # Test
+    assert [record.getMessage()[:43] for record in caplog.records] == [
+        "SQL statement executed 3 times by GET /orga",
+    ]
+    assert query_stats.queries == 5
+    assert list(query_stats.repeated_statements(threshold=3).values()) \
+        == [5]
+
+
+def test_assert_max_queries():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    with assert_max_queries(engine, 2) as counter:
+        query_by_trading_name(database, "XXX")
+        query_by_trading_name(database, "YYY")
+
+    # Test
+    assert counter.count == 2
+    with pytest.raises(AssertionError, match="3 SQL statements"):
+        with assert_max_queries(engine, 2):
+            for trading_name in ["XXX", "YYY", "ZZZ"]:
+                query_by_trading_name(database, trading_name)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-17 10:12:33
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-17 10:48:20
+
+# general imports
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+# custom imports
+from database.crud import crud
+from database.models import models
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/upgrade.db")
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table_name: str):
+    return {index["name"] for index in inspect(engine).get_indexes(table_name)}
+
+
+# Tests
+def test_missing_indexes_are_created_on_existing_tables(engine):
+    models.Base.metadata.create_all(bind=engine)
+    # As in a database created before the indexes were added
+    with engine.begin() as connection:
+        for index_name in [
+            "ix_OrganizationAuthorizedUsers_user_id_deleted_organization",
+            "ix_Characteristic_name_value_deleted_organization",
+            "ix_TimePeriod_startDateTime_endDateTime",
+            "ix_Organization_name",
+        ]:
+            connection.exec_driver_sql(f"DROP INDEX \"{index_name}\"")
+        # Along with a table added later, created by create_all
+        connection.exec_driver_sql("DROP TABLE \"OutboxRelayLease\"")
+
+    models.Base.metadata.create_all(bind=engine)
+
+    for table in models.Base.metadata.sorted_tables:
+        assert {index.name for index in table.indexes} \
+            <= index_names(engine, table.name)
+
+
+def test_organization_change_seq_is_added_to_existing_databases(engine):
+    models.Base.metadata.create_all(bind=engine)
+    # As in a database created before the change sequence existed
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX \"ix_Organization_changeSeq\"")
+        connection.exec_driver_sql(
+            "ALTER TABLE \"Organization\" DROP COLUMN \"changeSeq\""
+        )
+        connection.exec_driver_sql("DROP TABLE \"ChangeSequence\"")
+        for trading_name in ["XXX", "YYY"]:
+            connection.exec_driver_sql(
+                "INSERT INTO \"Organization\" (\"tradingName\", deleted) " +
+                f"VALUES ('{trading_name}', 0)"
+            )
+
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        organizations = crud.get_all_organizations(db)
+        change_seq = crud.get_change_seq(db)
+        changes = crud.get_organization_changes(db, since=1)
+        next_change_seq = crud.next_change_seq(db)
+    finally:
+        db.close()
+
+    assert [
+        (organization.tradingName, organization.changeSeq)
+        for organization in organizations
+    ] == [("XXX", 1), ("YYY", 2)]
+    assert change_seq == 2
+    assert [
+        organization.tradingName for organization in changes.organizations
+    ] == ["YYY"]
+    assert next_change_seq == 3
+    assert "ix_Organization_changeSeq" in index_names(engine, "Organization")
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-04 15:02:51
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-04 16:40:17
+
+# general imports
+import threading
+import requests
+
+# custom imports
+from events.dispatcher import EventDispatcher, Notification
+
+
+class MockResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+# Records the notifications it receives, answering with the given statuses
+class MockSession:
+
+    def __init__(self, statuses=None):
+        self.statuses = list(statuses or [])
+        self.posts = []
+        self.lock = threading.Lock()
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        with self.lock:
+            self.posts.append((url, data))
+            status = self.statuses.pop(0) if self.statuses else 201
+        if status is None:
+            raise requests.ConnectionError("Connection refused")
+        return MockResponse(status)
+
+    def close(self):
+        pass
+
+
+# Tests
+def test_event_dispatcher_delivers_in_order_per_key():
+
+    # Prepare Test
+    session = MockSession()
+    dispatcher = EventDispatcher(
+        workers=2,
+        session_factory=lambda: session
+    )
+
+    # Test
+    for i in range(10):
+        dispatcher.publish(
+            Notification("http://listener/a", str(i).encode(), key=1)
+        )
+    dispatcher.join()
+    dispatcher.stop()
+
+    assert [body for _, body in session.posts]\
+        == [str(i).encode() for i in range(10)]
+    assert dispatcher.delivered == 10
+    assert dispatcher.failed == 0
+
+
+def test_event_dispatcher_retries_with_backoff():
+
+    # Prepare Test
+    session = MockSession(statuses=[None, 503, 201, 400])
+    dispatcher = EventDispatcher(
+        workers=1,
+        backoff=0.001,
+        session_factory=lambda: session
+    )
+
+    # Test
+    dispatcher.publish(Notification("http://listener/a", b"1", key=1))
+    dispatcher.publish(Notification("http://listener/a", b"2", key=1))
+    dispatcher.join()
+    dispatcher.stop()
+
+    # The first notification succeeds on the third attempt. The second one
+    # isn't retried, since the listener rejected it
+    assert [body for _, body in session.posts] == [b"1", b"1", b"1", b"2"]
+    assert dispatcher.delivered == 1
+    assert dispatcher.failed == 1
+
+
+def test_event_dispatcher_never_blocks_publishers():
+
+    # Prepare Test
+    release = threading.Event()
+
+    class BlockedSession(MockSession):
+        def post(self, *args, **kwargs):
+            release.wait()
+            return super().post(*args, **kwargs)
+
+    session = BlockedSession()
+    dispatcher = EventDispatcher(
+        workers=1,
+        max_queue_size=2,
+        session_factory=lambda: session
+    )
+
+    # Test
+    published = [
+        dispatcher.publish(
+            Notification("http://listener/a", str(i).encode(), key=1)
+        )
+        for i in range(5)
+    ]
+    release.set()
+    dispatcher.join()
+    dispatcher.stop()
+
+    # The worker may already have taken the first notification
+    assert published.count(False) == dispatcher.dropped
+    assert dispatcher.dropped >= 2
+    assert dispatcher.delivered == 5 - dispatcher.dropped
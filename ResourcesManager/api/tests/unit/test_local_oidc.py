@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-03-21 16:20:02
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-03-21 17:41:55
+
+# general imports
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from fastapi_keycloak import api as fastapi_keycloak_api
+from jose import jwt
+
+# custom imports
+from idp.local_oidc import (
+    LocalOIDCIssuer,
+    jwk_thumbprint,
+    load_or_create_private_key,
+)
+from aux.constants import IDP_ADMIN_USER, IDP_TESTBED_ADMIN_USER
+
+
+@pytest.fixture(scope="module")
+def issuer():
+    return LocalOIDCIssuer(
+        issuer_url="http://local-oidc",
+        private_key_pem=load_or_create_private_key(key_bits=1024)
+    )
+
+
+# Real FastAPIKeycloak instance, whose HTTP calls are routed to the local
+# issuer
+@pytest.fixture()
+def keycloak(issuer, monkeypatch):
+    client = TestClient(issuer.create_app(), base_url="http://local-oidc")
+    monkeypatch.setattr(fastapi_keycloak_api.requests, "get", client.get)
+    monkeypatch.setattr(fastapi_keycloak_api.requests, "post", client.post)
+    return fastapi_keycloak_api.FastAPIKeycloak(
+        server_url="http://local-oidc",
+        client_id="vpilot",
+        client_secret="secret",
+        admin_client_secret="secret",
+        realm=issuer.realm,
+        callback_uri="http://localhost/callback"
+    )
+
+
+# Tests
+def test_local_oidc_tokens_are_verified_by_fastapi_keycloak(issuer, keycloak):
+
+    # Prepare Test
+    admin_token = keycloak.user_login("admin", "any-password").access_token
+    current_user = keycloak.get_current_user(required_roles=[IDP_ADMIN_USER])
+
+    # Test
+    user = current_user(token=admin_token)
+    assert user.sub == issuer.user_id("admin")
+    assert user.preferred_username == "admin"
+    assert IDP_ADMIN_USER in user.roles
+    assert IDP_TESTBED_ADMIN_USER in user.roles
+
+
+def test_local_oidc_tokens_with_configured_roles(issuer, keycloak):
+
+    # Prepare Test
+    token = issuer.issue_token("testbed-admin")
+    current_user = keycloak.get_current_user(required_roles=[IDP_ADMIN_USER])
+
+    # Test
+    with pytest.raises(HTTPException) as exception:
+        current_user(token=token)
+    assert exception.value.status_code == 403
+    assert keycloak.get_current_user(
+        required_roles=[IDP_TESTBED_ADMIN_USER]
+    )(token=token).roles == [IDP_TESTBED_ADMIN_USER]
+
+
+def test_local_oidc_jwks(issuer):
+
+    # Prepare Test
+    client = TestClient(issuer.create_app())
+
+    response = client.get(
+        f"/realms/{issuer.realm}/protocol/openid-connect/certs"
+    )
+    unknown_user_response = client.post(
+        f"/realms/{issuer.realm}/protocol/openid-connect/token",
+        data={"grant_type": "password", "username": "x", "password": "x"}
+    )
+
+    # Test
+    assert response.status_code == 200
+    assert response.json()["keys"][0]["kid"] == issuer.key_id
+    assert response.json()["keys"][0]["kty"] == "RSA"
+    assert unknown_user_response.status_code == 401
+
+
+def test_local_oidc_key_id_is_derived_from_the_key(issuer):
+
+    # Prepare Test
+    # e.g. the issuer served, and the one of a CLI run minting a token
+    other_issuer = LocalOIDCIssuer(private_key_pem=issuer.private_key_pem)
+    token = other_issuer.issue_token("admin")
+
+    # Test
+    assert other_issuer.key_id == issuer.key_id
+    assert jwt.get_unverified_header(token)["kid"] == \
+        issuer.jwks["keys"][0]["kid"]
+
+
+def test_jwk_thumbprint():
+
+    # Test
+    # Example of RFC 7638, section 3.1
+    assert jwk_thumbprint({
+        "kty": "RSA",
+        "n": "0vx7agoebGcQSuuPiLJXZptN9nndrQmbXEps2aiAFbWhM78LhWx4cbbfAAt" +
+             "VT86zwu1RK7aPFFxuhDR1L6tSoc_BJECPebWKRXjBZCiFV4n3oknjhMstn6" +
+             "4tZ_2W-5JsGY4Hc5n9yBXArwl93lqt7_RN5w6Cf0h4QyQ5v-65YGjQR0_FD" +
+             "W2QvzqY368QQMicAtaSqzs8KJZgnYb9c7d0zgdAZHzu6qMQvRL5hajrn1n9" +
+             "1CbOpbISD08qNLyrdkt-bFTWhAI4vMQFh6WeZu0fM4lFd2NcRwr3XPksINH" +
+             "aQ-G_xBniIqbw0Ls1jF44-csFCur-kEgU8awapJzKnqDKgw",
+        "e": "AQAB",
+        "alg": "RS256",
+        "kid": "2011-04-29",
+    }) == "NzbLsXh8uDCcd-6MNwXF4W_7noWXFZAfHkxZsRGC9Xs"
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-07 14:02:16
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-07 15:21:48
+
+# general imports
+import logging
+import threading
+
+# custom imports
+from aux.log_utils import Truncated, setup_queue_logging
+
+
+class CountingValue:
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "value"
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.threads = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.threads.append(threading.current_thread())
+
+
+def isolated_logger(name: str, level: int):
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.handlers = []
+    return logger
+
+
+# Tests
+def test_truncated_caps_long_values():
+    assert str(Truncated("x" * 10, max_length=20)) == "x" * 10
+    assert str(Truncated("x" * 30, max_length=20)) == \
+        "x" * 20 + "... (10 more characters)"
+
+
+def test_truncated_formats_sequences_up_to_the_maximum_length():
+    values = [CountingValue() for _ in range(1000)]
+
+    text = str(Truncated(values, max_length=20))
+
+    # Each item takes 7 characters ("value, "), so 3 are enough
+    assert text == "[value, value, value, ... (1000 items)]"
+    assert sum(value.formatted for value in values) == 3
+    assert str(Truncated([1, 2, 3])) == "[1, 2, 3]"
+
+
+def test_truncated_is_only_formatted_when_emitted():
+    logger = isolated_logger("tests.log_utils.lazy", logging.INFO)
+    handler = RecordingHandler()
+    logger.addHandler(handler)
+    value = CountingValue()
+
+    logger.debug("Value: %s", Truncated(value))
+    formatted_at_debug = value.formatted
+    logger.info("Value: %s", Truncated(value))
+
+    assert formatted_at_debug == 0
+    assert value.formatted == 1
+    assert handler.messages == ["Value: value"]
+
+
+def test_queue_logging_writes_on_a_background_thread():
+    logger = isolated_logger("tests.log_utils.queue", logging.INFO)
+    handler = RecordingHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+
+    listener = setup_queue_logging(logger, [handler])
+    for i in range(3):
+        logger.info("Record %d", i)
+    listener.stop()
+
+    assert handler.messages == [
+        "INFO - Record 0",
+        "INFO - Record 1",
+        "INFO - Record 2",
+    ]
+    assert threading.current_thread() not in handler.threads
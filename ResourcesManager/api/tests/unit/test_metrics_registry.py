@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-10 16:03:27
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-10 16:55:41
+
+# general imports
+import pytest
+
+# custom imports
+from metrics.registry import Counter, Gauge, Histogram, Registry
+
+
+def rendered_lines(registry: Registry):
+    return registry.render().decode().splitlines()
+
+
+# Tests
+def test_counter_children_are_bound_once():
+    registry = Registry()
+    counter = Counter("requests_total", "Requests", ("route",),
+                      registry=registry)
+
+    child = counter.labels("/organization/{id}")
+    child.inc()
+    child.inc(2)
+
+    assert counter.labels("/organization/{id}") is child
+    assert rendered_lines(registry) == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        "requests_total{route=\"/organization/{id}\"} 3",
+    ]
+    with pytest.raises(ValueError):
+        counter.labels("/organization/{id}", "GET")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = Histogram("duration_seconds", "Duration",
+                          buckets=(0.1, 1), registry=registry)
+
+    for value in [0.05, 0.1, 0.5, 2]:
+        histogram.observe(value)
+
+    assert rendered_lines(registry)[2:] == [
+        "duration_seconds_bucket{le=\"0.1\"} 2",
+        "duration_seconds_bucket{le=\"1.0\"} 3",
+        "duration_seconds_bucket{le=\"+Inf\"} 4",
+        "duration_seconds_sum 2.65",
+        "duration_seconds_count 4",
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    gauge = Gauge("value", "Value", ("name",), registry=registry)
+
+    gauge.labels("a \"quoted\"\nvalue\\").set(1.5)
+
+    assert rendered_lines(registry)[2] == \
+        "value{name=\"a \\\"quoted\\\"\\nvalue\\\\\"} 1.5"
+
+
+def test_collectors_are_called_on_each_scrape():
+    registry = Registry()
+    scrapes = []
+
+    def collect():
+        scrapes.append(None)
+        gauge = Gauge("scrapes", "Scrapes", registry=None)
+        gauge.set(len(scrapes))
+        return [gauge]
+
+    registry.register_collector(collect)
+
+    assert rendered_lines(registry)[2] == "scrapes 1"
+    assert rendered_lines(registry)[2] == "scrapes 2"
@@ -8,10 +8,14 @@
 import pytest
 
 # custom imports
+from starlette.datastructures import QueryParams
 from routers.aux import (
     GetOrganizationFilters,
-    parse_organization_query_filters
+    parse_organization_query_filters,
+    parse_organization_query_operator_filters
 )
+from database.crud import query_filters as QueryFilters
+from database.crud.exceptions import InvalidQueryParameter
 from tests.configure_test_idp import (
     setup_test_idp,
 )
@@ -69,3 +73,54 @@ def test_organization_fields_filtering():
     assert results1.get("organizationType") == "Testbed"
     assert results1.get("tradingName") is None
     assert results1.get("existDuring") is None
+
+
+def test_organization_operator_filters_parsing():
+
+    # Prepare Test
+    query_params = QueryParams(
+        "name.like=XXX%&status.in=initialized,validated" +
+        "&existsDuring.startDateTime.gt=2015-10-22T08:31:52Z" +
+        "&existsDuring.id=1&limit=2"
+    )
+
+    # Test
+    results = parse_organization_query_operator_filters(query_params)
+
+    assert results == [
+        QueryFilters.OperatorFilter("name", "like", "XXX%"),
+        QueryFilters.OperatorFilter(
+            "status", "in", "initialized,validated"
+        ),
+        QueryFilters.OperatorFilter(
+            "existsDuring.startDateTime", "gt", "2015-10-22T08:31:52Z"
+        ),
+    ]
+
+
+@pytest.mark.parametrize("operator_filters", [
+    # Leading wildcard
+    [QueryFilters.OperatorFilter("name", "like", "%XXX")],
+    # Non-indexed attribute
+    [QueryFilters.OperatorFilter("isHeadOffice", "eq", "true")],
+    # Unknown attribute
+    [QueryFilters.OperatorFilter("contactMedium", "eq", "1")],
+    # Only non-sargable predicates
+    [QueryFilters.OperatorFilter("status", "ne", "closed")],
+    # Invalid value
+    [QueryFilters.OperatorFilter("existsDuring.endDateTime", "lt", "X")],
+])
+def test_organization_operator_filters_requiring_full_scan(operator_filters):
+    with pytest.raises(InvalidQueryParameter):
+        QueryFilters.compile_filters(operator_filters)
+
+
+def test_organization_operator_filters_with_ne_and_sargable_predicate():
+
+    # Test
+    results = QueryFilters.compile_filters([
+        QueryFilters.OperatorFilter("status", "ne", "closed"),
+        QueryFilters.OperatorFilter("name", "like", "XXX%"),
+    ])
+
+    assert len(results) == 2
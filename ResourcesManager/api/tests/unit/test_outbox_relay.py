@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-05 14:20:37
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-05 17:51:12
+
+# general imports
+import json
+import pytest
+from datetime import datetime, timedelta
+
+# custom imports
+from database.crud import crud
+from database.crud.exceptions import EntityDoesNotExist
+from database.models import models
+import schemas.tmf632_party_mgmt as TMF632Schemas
+from events import organization_events as OrganizationEvents
+from events.dispatcher import EventDispatcher
+from events.outbox import OutboxRelay
+from tests.configure_test_idp import (
+    setup_test_idp,
+)
+from tests.unit.test_event_dispatcher import MockSession
+
+
+def import_modules():
+    # additional custom imports
+    from tests.configure_test_db import (
+        engine as imported_engine,
+        test_client as imported_test_client,
+        override_get_db as imported_override_get_db,
+        TestingSessionLocal as imported_testing_session_local
+    )
+    from database.database import Base as imported_base
+    global engine
+    engine = imported_engine
+    global Base
+    Base = imported_base
+    global test_client
+    test_client = imported_test_client
+    global override_get_db
+    override_get_db = imported_override_get_db
+    global TestingSessionLocal
+    TestingSessionLocal = imported_testing_session_local
+
+
+# Create the DB and IDP before each test and delete it afterwards
+@pytest.fixture(autouse=True)
+def setup(monkeypatch, mocker):
+    # Setup Test IDP.
+    # This is required before loading the other modules
+    setup_test_idp(monkeypatch, mocker)
+    import_modules()
+    Base.metadata.create_all(bind=engine)
+    OrganizationEvents.subscriptions_cache.invalidate()
+    yield
+    Base.metadata.drop_all(bind=engine)
+    OrganizationEvents.subscriptions_cache.invalidate()
+
+
+def create_relay(session: MockSession, **kwargs):
+    # A single worker, without retries, so that deliveries are sequential
+    dispatcher = EventDispatcher(
+        workers=1,
+        max_retries=0,
+        session_factory=lambda: session
+    )
+    return OutboxRelay(
+        session_factory=TestingSessionLocal,
+        dispatcher=dispatcher,
+        **kwargs
+    )
+
+
+def delivered_events(session: MockSession):
+    return [
+        (
+            json.loads(body)["eventType"],
+            json.loads(body)["event"]["organization"]["tradingName"]
+        )
+        for _, body in session.posts
+    ]
+
+
+def subscribe(database):
+    crud.create_event_subscription(
+        database,
+        TMF632Schemas.EventSubscriptionInput(callback="http://listener/all")
+    )
+
+
+# Tests
+def test_outbox_events_are_written_with_the_mutation():
+
+    # Prepare Test
+    database = next(override_get_db())
+
+    db_organization = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+    crud.create_authorized_user(database, "1111", db_organization.id)
+    crud.delete_authorized_user_for_organization(
+        database,
+        "1111",
+        db_organization.id
+    )
+    with pytest.raises(EntityDoesNotExist):
+        crud.update_organization(
+            db=database,
+            organization_id=db_organization.id + 1,
+            organization=TMF632Schemas.OrganizationCreate(tradingName="YYY")
+        )
+
+    outbox_events = database\
+        .query(models.OutboxEvent)\
+        .order_by(models.OutboxEvent.id)\
+        .all()
+
+    # Test
+    # The failed update left no event behind
+    assert [
+        (outbox_event.eventType, outbox_event.organization)
+        for outbox_event in outbox_events
+    ] == [
+        ("OrganizationCreateEvent", db_organization.id),
+        ("OrganizationAuthorizedUserCreateEvent", db_organization.id),
+        ("OrganizationAuthorizedUserDeleteEvent", db_organization.id),
+    ]
+    assert json.loads(outbox_events[1].body)["event"] == {
+        "authorizedUser": {
+            "userId": "1111",
+            "organization": db_organization.id,
+        }
+    }
+
+
+def test_outbox_relay_keeps_organization_order_on_failures():
+
+    # Prepare Test
+    database = next(override_get_db())
+    subscribe(database)
+
+    db_organization_1 = crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="YYY")
+    )
+    crud.update_organization(
+        db=database,
+        organization_id=db_organization_1.id,
+        organization=TMF632Schemas.OrganizationCreate(
+            tradingName="ZZZ",
+            status="initialized"
+        )
+    )
+
+    # The first delivery, the creation of the first organization, fails
+    session = MockSession(statuses=[503])
+    relay = create_relay(session)
+
+    relayed_first = relay.relay_pending()
+    delivered_first = delivered_events(session)
+    lag_first = relay.update_lag()
+    attempts_first = [
+        outbox_event.attempts
+        for outbox_event in database
+        .query(models.OutboxEvent)
+        .order_by(models.OutboxEvent.id)
+    ]
+
+    session.posts = []
+    relayed_second = relay.relay_pending()
+    lag_second = relay.update_lag()
+
+    # Test
+    # The update of the first organization was held back, since its creation
+    # wasn't delivered. The second organization's events weren't
+    assert relayed_first == 1
+    assert delivered_first == [
+        ("OrganizationCreateEvent", "XXX"),
+        ("OrganizationCreateEvent", "YYY"),
+    ]
+    assert attempts_first == [1, 0]
+    assert lag_first.pending == 2
+    assert lag_first.oldest_pending_age >= 0
+    assert relayed_second == 2
+    assert delivered_events(session) == [
+        ("OrganizationCreateEvent", "XXX"),
+        ("OrganizationAttributeValueChangeEvent", "ZZZ"),
+    ]
+    assert lag_second.as_dict() == {"pending": 0, "oldestPendingAge": 0}
+    assert relay.relayed == 3
+    assert relay.failed == 1
+
+
+def test_outbox_relay_discards_events_failing_too_often():
+
+    # Prepare Test
+    database = next(override_get_db())
+    subscribe(database)
+
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+
+    session = MockSession(statuses=[400, 400])
+    relay = create_relay(session, max_attempts=2)
+
+    relayed = [relay.relay_pending() for _ in range(3)]
+
+    # Test
+    assert relayed == [0, 0, 0]
+    assert len(session.posts) == 2
+    assert relay.discarded == 1
+    assert database.query(models.OutboxEvent).count() == 0
+
+
+def test_outbox_relay_drains_in_batches():
+
+    # Prepare Test
+    database = next(override_get_db())
+    subscribe(database)
+
+    for i in range(5):
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(tradingName=f"{i}")
+        )
+    # Events without listeners are relayed as well
+    database.query(models.OutboxEvent)\
+        .filter(models.OutboxEvent.organization == 1)\
+        .update({"eventType": "OrganizationAuthorizedUserCreateEvent"})
+    crud.delete_event_subscription(database, 1)
+    crud.create_event_subscription(
+        database,
+        TMF632Schemas.EventSubscriptionInput(
+            callback="http://listener/all",
+            query="eventType=OrganizationCreateEvent"
+        )
+    )
+    database.query(models.OutboxEvent)\
+        .update({"createdAt": datetime.utcnow() - timedelta(minutes=5)})
+    database.commit()
+
+    session = MockSession()
+    relay = create_relay(session, batch_size=2)
+    lag_before = relay.update_lag()
+    relayed = relay.relay_pending()
+
+    # Test
+    assert lag_before.pending == 5
+    assert lag_before.oldest_pending_age >= 300
+    assert relayed == 5
+    assert [name for _, name in delivered_events(session)] \
+        == ["1", "2", "3", "4"]
+
+
+class StoppedDispatcher:
+
+    def __init__(self):
+        self.notifications = []
+
+    # Queued, but never handled
+    def publish(self, notification):
+        self.notifications.append(notification)
+        return True
+
+
+def test_outbox_is_relayed_by_the_lease_holder_only():
+
+    # Prepare Test
+    database = next(override_get_db())
+    subscribe(database)
+    crud.create_organization(
+        db=database,
+        organization=TMF632Schemas.OrganizationCreate(tradingName="XXX")
+    )
+
+    session = MockSession()
+    relay = create_relay(session)
+    other_relay = create_relay(session)
+    other_relay.acquire_lease(database)
+
+    relayed_while_leased = relay.relay_pending()
+    # The holder died, and its lease expired
+    database.query(models.OutboxRelayLease)\
+        .update({"expiresAt": datetime.utcnow() - timedelta(seconds=1)})
+    database.commit()
+    relayed_after_expiry = relay.relay_pending()
+    lease = database.query(models.OutboxRelayLease).one()
+    database.refresh(lease)
+
+    # Test
+    assert relayed_while_leased == 0
+    assert relayed_after_expiry == 1
+    assert delivered_events(session) == [("OrganizationCreateEvent", "XXX")]
+    # Released once the outbox was drained
+    assert lease.owner is None
+    assert other_relay.acquire_lease(database)
+
+
+def test_outbox_relay_retries_timed_out_batches():
+
+    # Prepare Test
+    database = next(override_get_db())
+    subscribe(database)
+    for trading_name in ["XXX", "YYY"]:
+        crud.create_organization(
+            db=database,
+            organization=TMF632Schemas.OrganizationCreate(
+                tradingName=trading_name
+            )
+        )
+
+    dispatcher = StoppedDispatcher()
+    relay = OutboxRelay(
+        session_factory=TestingSessionLocal,
+        dispatcher=dispatcher,
+        batch_timeout=0.1
+    )
+
+    relayed_first = relay.relay_pending()
+    attempts = [
+        outbox_event.attempts
+        for outbox_event in database.query(models.OutboxEvent)
+    ]
+
+    session = MockSession()
+    relay_second = create_relay(session)
+    relayed_second = relay_second.relay_pending()
+
+    # Test
+    assert relayed_first == 0
+    assert attempts == [0, 0]
+    assert relay.failed == 0
+    # The notifications of the timed out batch aren't delivered later on
+    assert all(
+        notification.is_cancelled()
+        for notification in dispatcher.notifications
+    )
+    assert relayed_second == 2
+    assert [name for _, name in delivered_events(session)] == ["XXX", "YYY"]
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-13 14:02:41
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-13 15:10:12
+
+# general imports
+import asyncio
+import cProfile
+import threading
+import pytest
+
+# custom imports
+from profiling.exceptions import ProfilerBusy
+from profiling.sampler import (
+    SamplingProfiler,
+    format_collapsed,
+    short_filename,
+)
+from profiling.request_profiler import format_call_tree
+from middleware.profiling import ProfilingMiddleware
+
+
+def busy_function(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture()
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=busy_function,
+        args=(stop,),
+        name="busy-thread"
+    )
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+# Tests
+def test_sampling_profiler_collapses_the_stacks(busy_thread):
+    stacks = SamplingProfiler().profile(0.2, interval=0.002)
+    busy_stacks = [
+        (stack, count) for stack, count in stacks.items()
+        if stack.startswith("busy-thread;")
+    ]
+
+    assert busy_stacks
+    assert sum(count for _, count in busy_stacks) > 1
+    # From the root to the leaf
+    for stack, _ in busy_stacks:
+        frames = stack.split(";")
+        assert frames[1].startswith("_bootstrap (threading.py:")
+        assert any(
+            frame.startswith("busy_function (tests/unit/test_profiling.py:")
+            for frame in frames
+        )
+    # The sampler doesn't sample itself
+    assert all(
+        "SamplingProfiler._sample" not in stack and "_sample (" not in stack
+        for stack in stacks
+    )
+
+
+def test_only_one_profile_runs_at_a_time():
+    profiler = SamplingProfiler()
+    profiling = threading.Thread(target=profiler.profile, args=(0.3,))
+    profiling.start()
+    while not profiler._lock.locked():
+        pass
+
+    with pytest.raises(ProfilerBusy):
+        profiler.profile(0.01)
+    profiling.join()
+    assert profiler.profile(0.01) is not None
+
+
+def test_format_collapsed():
+    assert format_collapsed({"main;b": 1, "main;a;c": 3}) == \
+        "main;a;c 3\nmain;b 1\n"
+
+
+def test_short_filename():
+    paths = ["/usr/lib/python3", "/usr/lib/python3/site-packages", ""]
+
+    assert short_filename(
+        "/usr/lib/python3/site-packages/sqlalchemy/orm/query.py", paths
+    ) == "sqlalchemy/orm/query.py"
+    assert short_filename("/usr/lib/python3/threading.py", paths) == \
+        "threading.py"
+    assert short_filename("database/crud/crud.py", paths) == \
+        "database/crud/crud.py"
+    assert short_filename("/opt/other.py", ["/usr/lib"]) == "/opt/other.py"
+
+
+def test_format_call_tree():
+    profile = cProfile.Profile()
+    profile.enable()
+    sorted([3, 2, 1])
+    profile.disable()
+    call_tree = format_call_tree(profile)
+
+    assert "cumulative" in call_tree
+    assert "sorted" in call_tree
+    assert "called..." in call_tree
+
+
+def admin_user():
+    return "admin"
+
+
+def run_profiled(app, middleware):
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"__profile=1",
+        "headers": [],
+    }
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def test_profiled_responses_are_not_held_in_memory():
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/csv")]})
+        for _ in range(3):
+            await send({"type": "http.response.body", "body": b"x" * 1000,
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = run_profiled(app, ProfilingMiddleware(app, admin_user))
+    headers = dict(sent[0]["headers"])
+
+    assert headers[b"x-profiled-status"] == b"200"
+    assert headers[b"content-type"].startswith(b"text/plain")
+    assert b"x" * 1000 not in b"".join(
+        message.get("body", b"") for message in sent
+    )
+
+
+def test_streamed_responses_are_not_profiled():
+
+    profiling_while_streaming = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        profiling_while_streaming.append(middleware._profiling)
+        await send({"type": "http.response.body", "body": b"data: 1\n\n",
+                    "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = ProfilingMiddleware(app, admin_user)
+    sent = run_profiled(app, middleware)
+
+    assert profiling_while_streaming == [False]
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b"data: 1\n\n"
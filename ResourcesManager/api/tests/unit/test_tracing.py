@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-12 16:20:44
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-12 17:44:59
+
+# general imports
+import asyncio
+import json
+import pytest
+
+# custom imports
+from tracing.tracer import (
+    NOOP_SPAN,
+    Tracer,
+    parse_traceparent,
+)
+from tracing.exporters import (
+    BatchSpanProcessor,
+    FileSpanExporter,
+    InMemorySpanExporter,
+    OTLPSpanExporter,
+    SimpleSpanProcessor,
+    create_span_processor,
+)
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class MockResponse:
+
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class MockSession:
+
+    def __init__(self):
+        self.posts = []
+
+    def post(self, url, data, headers, timeout):
+        self.posts.append((url, json.loads(data), headers))
+        return MockResponse(200)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture()
+def exporter():
+    return InMemorySpanExporter()
+
+
+@pytest.fixture()
+def tracer(exporter):
+    return Tracer(SimpleSpanProcessor(exporter))
+
+
+# Tests
+@pytest.mark.parametrize(
+    "traceparent,expected",
+    [
+        (TRACEPARENT, ("4bf92f3577b34da6a3ce929d0e0e4736",
+                       "00f067aa0ba902b7", True)),
+        (TRACEPARENT[:-2] + "00", ("4bf92f3577b34da6a3ce929d0e0e4736",
+                                   "00f067aa0ba902b7", False)),
+        # Later versions may add fields
+        ("01" + TRACEPARENT[2:] + "-extra",
+         ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True)),
+        (TRACEPARENT + "-extra", None),
+        ("ff" + TRACEPARENT[2:], None),
+        ("00-" + "0" * 32 + "-00f067aa0ba902b7-01", None),
+        ("00-4bf92f3577b34da6a3ce929d0e0e4736-" + "0" * 16 + "-01", None),
+        ("00-xyz-00f067aa0ba902b7-01", None),
+        (None, None),
+    ]
+)
+def test_parse_traceparent(traceparent, expected):
+    trace_context = parse_traceparent(traceparent)
+    if expected is None:
+        assert trace_context is None
+    else:
+        assert (trace_context.trace_id, trace_context.span_id,
+                trace_context.sampled) == expected
+
+
+def test_unsampled_traces_are_not_exported(tracer, exporter):
+
+    unsampled_context = parse_traceparent(TRACEPARENT[:-2] + "00")
+    with tracer.span("request", trace_context=unsampled_context) \
+            as request_span:
+        with tracer.span("child") as child_span:
+            pass
+
+    # Test
+    assert exporter.get_finished_spans() == []
+    # The decision is propagated to the children, and downstream
+    assert not child_span.sampled
+    assert request_span.traceparent.endswith("-00")
+
+
+def test_spans_are_nested(tracer, exporter):
+
+    @tracer.traced("sync")
+    def sync_function():
+        return 1
+
+    @tracer.traced("async")
+    async def async_function():
+        return 2
+
+    with tracer.span("request", trace_context=parse_traceparent(TRACEPARENT)) \
+            as request_span:
+        results = [sync_function(), asyncio.run(async_function())]
+        with pytest.raises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError("failed")
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+
+    assert results == [1, 2]
+    assert request_span.traceparent.startswith(TRACEPARENT[:36])
+    assert spans["request"].parent_span_id == "00f067aa0ba902b7"
+    for name in ["sync", "async", "failing"]:
+        assert spans[name].trace_id == request_span.trace_id
+        assert spans[name].parent_span_id == request_span.span_id
+    assert spans["failing"].status == "ERROR"
+    assert spans["failing"].status_message == "failed"
+    assert spans["request"].duration >= spans["sync"].duration
+
+
+def test_spans_are_only_started_within_a_trace(tracer, exporter):
+
+    @tracer.traced()
+    def function():
+        return tracer.start_span("child")
+
+    assert function() is NOOP_SPAN
+    assert Tracer().start_span("span", root=True) is NOOP_SPAN
+    assert exporter.get_finished_spans() == []
+
+
+def test_batch_span_processor_flushes_on_shutdown(tmp_path):
+    filename = str(tmp_path / "traces.jsonl")
+    # Not exported before the shutdown, given the delay
+    processor = BatchSpanProcessor(
+        FileSpanExporter(filename),
+        max_export_batch_size=2,
+        schedule_delay=60
+    )
+    tracer = Tracer(processor)
+
+    with tracer.span("request", root=True):
+        for i in range(3):
+            with tracer.span(f"child {i}"):
+                pass
+    processor.shutdown(timeout=5)
+
+    with open(filename) as f:
+        spans = [json.loads(line) for line in f]
+
+    assert [span["name"] for span in spans] == \
+        ["child 0", "child 1", "child 2", "request"]
+    assert len({span["traceId"] for span in spans}) == 1
+
+
+def test_otlp_span_exporter(tracer, exporter):
+    session = MockSession()
+    otlp_exporter = OTLPSpanExporter(
+        endpoint="http://collector:4318/v1/traces",
+        session=session
+    )
+
+    with tracer.span("request", {"http.status_code": 200}, root=True):
+        with tracer.span("child"):
+            pass
+    otlp_exporter.export(exporter.get_finished_spans())
+
+    url, request, headers = session.posts[0]
+    resource_spans = request["resourceSpans"][0]
+    child, parent = resource_spans["scopeSpans"][0]["spans"]
+
+    assert url == "http://collector:4318/v1/traces"
+    assert headers["Content-Type"] == "application/json"
+    assert resource_spans["resource"]["attributes"][0]["key"] \
+        == "service.name"
+    assert child["parentSpanId"] == parent["spanId"]
+    assert "parentSpanId" not in parent
+    assert parent["attributes"] == [
+        {"key": "http.status_code", "value": {"intValue": "200"}}
+    ]
+    assert parent["status"] == {"code": 1}
+    assert int(parent["endTimeUnixNano"]) >= int(parent["startTimeUnixNano"])
+
+
+def test_create_span_processor():
+    assert create_span_processor({}) is None
+    assert create_span_processor({"TRACING_EXPORTER": "unknown"}) is None
+    assert isinstance(
+        create_span_processor({"TRACING_EXPORTER": "memory"}).exporter,
+        InMemorySpanExporter
+    )
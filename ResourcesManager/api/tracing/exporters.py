@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-12 11:02:51
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-12 17:31:40
+
+# Span processors and exporters.
+#
+# Processors get the spans as they end: the SimpleSpanProcessor exports them
+# right away, the BatchSpanProcessor queues them and exports them in batches
+# from a background thread, dropping them if the queue is full.
+#
+# Exporters write the spans: to an OTLP/HTTP collector (JSON encoding), to a
+# file, one JSON span per line, for offline analysis, or to memory.
+#
+# The exporter is chosen with the TRACING_EXPORTER environment variable
+# ('otlp', 'file' or 'memory'). Tracing is disabled without it.
+
+# general imports
+import json
+import logging
+import os
+import queue
+import threading
+import requests
+
+# custom imports
+from tracing.tracer import Span, ERROR
+
+# Logger
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "vpilot-resources-manager"
+INSTRUMENTATION_SCOPE = "vpilot.resources_manager"
+
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318/v1/traces"
+DEFAULT_TRACING_FILE = "./traces.jsonl"
+DEFAULT_MAX_QUEUE_SIZE = 2048
+DEFAULT_MAX_EXPORT_BATCH_SIZE = 512
+DEFAULT_SCHEDULE_DELAY = 5  # seconds
+DEFAULT_TIMEOUT = 10  # seconds
+
+# OTLP span kinds and status codes
+OTLP_SPAN_KINDS = {
+    "INTERNAL": 1,
+    "SERVER": 2,
+    "CLIENT": 3,
+}
+OTLP_STATUS_OK = 1
+OTLP_STATUS_ERROR = 2
+
+
+class InMemorySpanExporter:
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: list):
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter:
+
+    def __init__(self, filename: str = DEFAULT_TRACING_FILE):
+        self.filename = filename
+        self._lock = threading.Lock()
+
+    def export(self, spans: list):
+        lines = "".join(
+            json.dumps(span.as_dict(), default=str) + "\n" for span in spans
+        )
+        with self._lock:
+            with open(self.filename, "a") as f:
+                f.write(lines)
+
+    def shutdown(self):
+        pass
+
+
+def otlp_attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64 bit integers are encoded as strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_attributes(attributes: dict):
+    return [
+        {"key": key, "value": otlp_attribute_value(value)}
+        for key, value in attributes.items()
+    ]
+
+
+def otlp_span(span: Span):
+    otlp_span = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": OTLP_SPAN_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time),
+        "attributes": otlp_attributes(span.attributes),
+        "status": {
+            "code": OTLP_STATUS_ERROR if span.status == ERROR
+            else OTLP_STATUS_OK
+        },
+    }
+    if span.parent_span_id:
+        otlp_span["parentSpanId"] = span.parent_span_id
+    if span.status_message:
+        otlp_span["status"]["message"] = span.status_message
+    return otlp_span
+
+
+# ExportTraceServiceRequest of OTLP, in its JSON encoding
+def otlp_request(spans: list, service_name: str = SERVICE_NAME):
+    return {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": otlp_attributes({"service.name": service_name})
+            },
+            "scopeSpans": [{
+                "scope": {"name": INSTRUMENTATION_SCOPE},
+                "spans": [otlp_span(span) for span in spans],
+            }],
+        }]
+    }
+
+
+class OTLPSpanExporter:
+
+    def __init__(self, endpoint: str = DEFAULT_OTLP_ENDPOINT,
+                 headers: dict = None, timeout: float = DEFAULT_TIMEOUT,
+                 service_name: str = SERVICE_NAME, session=None):
+        self.endpoint = endpoint
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+        self.service_name = service_name
+        self.session = session or requests.Session()
+
+    def export(self, spans: list):
+        try:
+            response = self.session.post(
+                self.endpoint,
+                data=json.dumps(otlp_request(spans, self.service_name)),
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            if response.status_code >= 300:
+                logger.error("Impossible to export %d spans to %s: " +
+                             "HTTP %s", len(spans), self.endpoint,
+                             response.status_code)
+        except requests.RequestException as exception:
+            logger.error("Impossible to export %d spans to %s: %s",
+                         len(spans), self.endpoint, exception)
+
+    def shutdown(self):
+        self.session.close()
+
+
+class SimpleSpanProcessor:
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def on_end(self, span: Span):
+        self.exporter.export([span])
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+
+class BatchSpanProcessor:
+
+    def __init__(self, exporter,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 max_export_batch_size: int = DEFAULT_MAX_EXPORT_BATCH_SIZE,
+                 schedule_delay: float = DEFAULT_SCHEDULE_DELAY):
+        self.exporter = exporter
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay = schedule_delay
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="span-exporter",
+            daemon=True
+        )
+        self._thread.start()
+
+    def on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    # None is queued on shutdown, to wake the thread up
+    def _next_batch(self, timeout: float):
+        batch = []
+        try:
+            span = self._queue.get(timeout=timeout)
+            while True:
+                if span is not None:
+                    batch.append(span)
+                if len(batch) >= self.max_export_batch_size:
+                    break
+                span = self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        return batch
+
+    def _export(self, batch: list):
+        try:
+            self.exporter.export(batch)
+        except Exception as exception:
+            logger.error("Impossible to export %d spans: %s", len(batch),
+                         exception)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch(self.schedule_delay)
+            if batch:
+                self._export(batch)
+        # Flush the spans still queued
+        batch = self._next_batch(0)
+        while batch:
+            self._export(batch)
+            batch = self._next_batch(0)
+
+    def shutdown(self, timeout: float = None):
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self.exporter.shutdown()
+
+
+# Span processor for the TRACING_* environment variables, or None if tracing
+# is disabled
+def create_span_processor(environ: dict = os.environ):
+    exporter_name = environ.get("TRACING_EXPORTER", "").lower()
+    if not exporter_name or exporter_name == "none":
+        return None
+    if exporter_name == "otlp":
+        exporter = OTLPSpanExporter(
+            endpoint=environ.get(
+                "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT",
+                DEFAULT_OTLP_ENDPOINT
+            )
+        )
+    elif exporter_name == "file":
+        exporter = FileSpanExporter(
+            environ.get("TRACING_FILE", DEFAULT_TRACING_FILE)
+        )
+    elif exporter_name == "memory":
+        return SimpleSpanProcessor(InMemorySpanExporter())
+    else:
+        logger.error("Unknown tracing exporter '%s'. Tracing is disabled",
+                     exporter_name)
+        return None
+    return BatchSpanProcessor(exporter)
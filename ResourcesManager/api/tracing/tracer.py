@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# @Author: Rafael Direito
+# @Date:   2023-04-12 09:18:35
+# @Last Modified by:   Rafael Direito
+# @Last Modified time: 2023-04-12 17:26:02
+
+# Tracing of the requests.
+#
+# The TracingMiddleware starts a span for each request, continuing the trace
+# of the client's W3C traceparent header, if any. The IdP dependency, the
+# crud functions, the SQL statements and the encoding of the responses start
+# child spans of it. Spans are only started within a request: background
+# threads (e.g. the outbox relay) aren't traced.
+#
+# Finished spans are handed to a span processor, which exports them (see
+# tracing/exporters.py), unless the client's traceparent marked the trace as
+# not sampled. Without one, which is the default, tracing is
+# disabled and starting a span costs nothing but a check.
+
+# general imports
+import functools
+import inspect
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+INTERNAL = "INTERNAL"
+SERVER = "SERVER"
+CLIENT = "CLIENT"
+
+OK = "OK"
+ERROR = "ERROR"
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_REGEX = re.compile(
+    r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$"
+)
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+
+
+def new_trace_id():
+    return f"{random.getrandbits(128):032x}"
+
+
+def new_span_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+class TraceContext:
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool = True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+# Parses a W3C traceparent header. Returns None if it is missing or invalid,
+# in which case a new trace is started
+def parse_traceparent(traceparent: str):
+    if not traceparent:
+        return None
+    match = TRACEPARENT_REGEX.match(traceparent.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, span_id, flags, rest = match.groups()
+    # Version 00 has no further fields. Later versions may add some
+    if version == "ff" or (version == "00" and rest) \
+            or trace_id == INVALID_TRACE_ID or span_id == INVALID_SPAN_ID:
+        return None
+    return TraceContext(trace_id, span_id, bool(int(flags, 16) & 0x01))
+
+
+class Span:
+
+    def __init__(self, processor, name: str, trace_id: str,
+                 parent_span_id: str = None, kind: str = INTERNAL,
+                 attributes: dict = None, sampled: bool = True):
+        self._processor = processor
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = attributes if attributes is not None else {}
+        self.sampled = sampled
+        self.status = OK
+        self.status_message = None
+        self.start_time = time.time_ns()
+        self.end_time = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, exception: BaseException):
+        self.status = ERROR
+        self.status_message = str(exception)
+        self.attributes["exception.type"] = type(exception).__name__
+
+    def end(self):
+        if self.end_time is not None:
+            return
+        self.end_time = time.time_ns()
+        # Spans of traces their caller didn't sample (trace-flags 00) are
+        # still propagated, but not exported
+        if self.sampled:
+            self._processor.on_end(self)
+
+    @property
+    def duration(self):
+        return (self.end_time - self.start_time) / 1e9 \
+            if self.end_time is not None else None
+
+    @property
+    def traceparent(self):
+        flags = "01" if self.sampled else "00"
+        return f"00-{self.trace_id}-{self.span_id}-{flags}"
+
+    def as_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTime": self.start_time,
+            "endTime": self.end_time,
+            "attributes": self.attributes,
+            "status": self.status,
+            "statusMessage": self.status_message,
+        }
+
+
+# Returned when tracing is disabled, or outside of a request
+class NoopSpan:
+
+    name = None
+    trace_id = INVALID_TRACE_ID
+    span_id = INVALID_SPAN_ID
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, exception: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+current_span = ContextVar("current_span", default=None)
+
+
+class Tracer:
+
+    def __init__(self, processor=None):
+        self.processor = processor
+
+    @property
+    def enabled(self):
+        return self.processor is not None
+
+    def configure(self, processor):
+        previous_processor, self.processor = self.processor, processor
+        if previous_processor is not None:
+            previous_processor.shutdown()
+
+    def shutdown(self):
+        if self.processor is not None:
+            self.processor.shutdown()
+
+    # Starts a span, child of the current one. Without a current span, only
+    # spans continuing a trace context, or explicitly starting a new trace
+    # (root), are started
+    def start_span(self, name: str, attributes: dict = None,
+                   kind: str = INTERNAL, trace_context: TraceContext = None,
+                   root: bool = False):
+        processor = self.processor
+        if processor is None:
+            return NOOP_SPAN
+        parent = current_span.get()
+        if parent is not None:
+            return Span(processor, name, parent.trace_id, parent.span_id,
+                        kind, attributes, parent.sampled)
+        if trace_context is not None:
+            return Span(processor, name, trace_context.trace_id,
+                        trace_context.span_id, kind, attributes,
+                        trace_context.sampled)
+        if root:
+            return Span(processor, name, new_trace_id(), None, kind,
+                        attributes)
+        return NOOP_SPAN
+
+    # Runs the block in a span, which becomes the current one
+    @contextmanager
+    def span(self, name: str, attributes: dict = None, **kwargs):
+        span = self.start_span(name, attributes, **kwargs)
+        if span is NOOP_SPAN:
+            yield span
+            return
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as exception:
+            span.set_error(exception)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    # Decorator running each call of the function in a span. The wrapper
+    # keeps the function's signature, e.g. for FastAPI's dependencies
+    def traced(self, name: str = None):
+
+        def decorator(function):
+            span_name = name or function.__qualname__
+
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    if self.processor is None:
+                        return await function(*args, **kwargs)
+                    with self.span(span_name):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if self.processor is None:
+                    return function(*args, **kwargs)
+                with self.span(span_name):
+                    return function(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+
+tracer = Tracer()
+
+
+# Wraps the public functions defined in the module's namespace, so that each
+# call to them is traced as '<prefix>.<function name>'. Generators are left
+# as they are, since their work happens after the call returns
+def trace_module_functions(namespace: dict, prefix: str,
+                           tracer: Tracer = tracer):
+    for name, value in list(namespace.items()):
+        if name.startswith("_") or not inspect.isfunction(value) \
+                or value.__module__ != namespace["__name__"] \
+                or inspect.isgeneratorfunction(value):
+            continue
+        namespace[name] = tracer.traced(f"{prefix}.{name}")(value)